@@ -1,6 +1,8 @@
 let map;
 let heatLayer;
+let staticTileLayer;
 let crimeData = null;
+let tileIndex = null;
 
 const MONTHS = [
     'January', 'February', 'March', 'April', 'May', 'June',
@@ -13,6 +15,9 @@ let intensitySlider;
 let maxCrimeCount = 100;
 let currentWardData = [];
 let maxAvailableDate = { year: 0, month: 0 };
+// ?api: query the local aggregate server (src/dashboard_server.py) instead of loading every point
+const apiMode = new URLSearchParams(window.location.search).has('api');
+let filterRequestId = 0;
 
 async function init() {
     map = L.map('map', {
@@ -26,27 +31,38 @@ async function init() {
     }).addTo(map);
 
     try {
-        const response = await fetch(`data/crime_data.json?v=${new Date().getTime()}`);
-        crimeData = await response.json();
+        if (apiMode) {
+            const response = await fetch('api/meta');
+            // The server reports the latest month and busiest cell so no points are needed here
+            crimeData = { ...(await response.json()), p: [] };
+            maxAvailableDate = { year: crimeData.md[0], month: crimeData.md[1] };
+            maxCrimeCount = crimeData.mc;
+        } else {
+            const response = await fetch(`data/crime_data.json?v=${new Date().getTime()}`);
+            crimeData = await response.json();
+        }
 
         loadWardBoundaries();
-
-        const locationCounts = {};
-        maxCrimeCount = 0;
-        maxAvailableDate = { year: 0, month: 0 };
-
-        crimeData.p.forEach(p => {
-            // Track max date
-            if (p[3] > maxAvailableDate.year || (p[3] === maxAvailableDate.year && p[4] > maxAvailableDate.month)) {
-                maxAvailableDate.year = p[3];
-                maxAvailableDate.month = p[4];
-            }
-
-            const key = `${p[0]},${p[1]}`;
-            const newCount = (locationCounts[key] || 0) + p[5];
-            locationCounts[key] = newCount;
-            if (newCount > maxCrimeCount) maxCrimeCount = newCount;
-        });
+        loadTileIndex();
+
+        if (!apiMode) {
+            const locationCounts = {};
+            maxCrimeCount = 0;
+            maxAvailableDate = { year: 0, month: 0 };
+
+            crimeData.p.forEach(p => {
+                // Track max date
+                if (p[3] > maxAvailableDate.year || (p[3] === maxAvailableDate.year && p[4] > maxAvailableDate.month)) {
+                    maxAvailableDate.year = p[3];
+                    maxAvailableDate.month = p[4];
+                }
+
+                const key = `${p[0]},${p[1]}`;
+                const newCount = (locationCounts[key] || 0) + p[5];
+                locationCounts[key] = newCount;
+                if (newCount > maxCrimeCount) maxCrimeCount = newCount;
+            });
+        }
 
         if (maxCrimeCount < 100) maxCrimeCount = 100;
         if (maxCrimeCount > 5000) maxCrimeCount = 5000;
@@ -222,15 +238,45 @@ function filterPoints(params) {
     });
 }
 
+function apiQuery(params) {
+    const query = new URLSearchParams({
+        type: params.crimeType,
+        from: `${params.yearStart}-${String(params.monthStart).padStart(2, '0')}`,
+        to: `${params.yearEnd}-${String(params.monthEnd).padStart(2, '0')}`,
+        exclude_cc: params.excludeCityCentre ? '1' : '0'
+    });
+    return query.toString();
+}
 
+// Points in the local [lat, lon, type, year, month, count, isCityCentre, distIdx, wardIdx] layout:
+// cellPoints feed the heatmap, wardPoints the choropleth, stats and ward chart
+async function fetchFilteredPoints(params) {
+    if (!apiMode) {
+        const points = filterPoints(params);
+        return { cellPoints: points, wardPoints: points };
+    }
 
-function applyFilters() {
+    const query = apiQuery(params);
+    const [cells, wards] = await Promise.all([
+        fetch(`api/cells?${query}`).then(r => r.json()),
+        fetch(`api/wards?${query}`).then(r => r.json())
+    ]);
+    return {
+        cellPoints: cells.map(([lat, lon, count]) => [lat, lon, -1, 0, 0, count]),
+        wardPoints: wards.map(([wardIdx, typeIdx, count]) => [0, 0, typeIdx, 0, 0, count, 0, -1, wardIdx])
+    };
+}
+
+async function applyFilters() {
     const params = getFilterParams();
-    const filteredPoints = filterPoints(params);
+    const requestId = ++filterRequestId;
+    const { cellPoints, wardPoints } = await fetchFilteredPoints(params);
+    // A newer filter change started while this one was waiting on the server
+    if (requestId !== filterRequestId) return;
 
     const aggregated = {};
 
-    filteredPoints.forEach(point => {
+    cellPoints.forEach(point => {
         const [lat, lon, pType, pYear, pMonth, count] = point;
         const key = `${lat},${lon}`;
         if (!aggregated[key]) {
@@ -274,34 +320,95 @@ function applyFilters() {
         if (heatLayer) {
             map.removeLayer(heatLayer);
         }
+        if (staticTileLayer) {
+            map.removeLayer(staticTileLayer);
+            staticTileLayer = null;
+        }
 
-        heatLayer = L.heatLayer(heatPoints, {
-            radius: 25,
-            blur: 35,
-            maxZoom: 15,
-            max: saturationPoint > 0 ? saturationPoint : 1,
-            gradient: {
-                0.0: '#0d0887',
-                0.2: '#5302a3',
-                0.4: '#8b0aa5',
-                0.6: '#db5c68',
-                0.8: '#febd2a',
-                1.0: '#f0f921'
-            }
-        }).addTo(map);
+        const tileUrl = getStaticTileUrl(params);
+        if (tileUrl) {
+            staticTileLayer = L.tileLayer(tileUrl, {
+                minNativeZoom: tileIndex.minZoom,
+                maxNativeZoom: tileIndex.maxZoom,
+                bounds: tileIndex.bounds,
+                opacity: 0.85
+            }).addTo(map);
+            heatLayer = null;
+        } else {
+            heatLayer = L.heatLayer(heatPoints, {
+                radius: 25,
+                blur: 35,
+                maxZoom: 15,
+                max: saturationPoint > 0 ? saturationPoint : 1,
+                gradient: {
+                    0.0: '#0d0887',
+                    0.2: '#5302a3',
+                    0.4: '#8b0aa5',
+                    0.6: '#db5c68',
+                    0.8: '#febd2a',
+                    1.0: '#f0f921'
+                }
+            }).addTo(map);
+        }
     } else {
         if (heatLayer) map.removeLayer(heatLayer);
-        updateChoropleth(filteredPoints);
+        if (staticTileLayer) map.removeLayer(staticTileLayer);
+        updateChoropleth(wardPoints);
     }
 
-    updateStats(filteredPoints, params);
-    updateWardChart(filteredPoints);
+    updateStats(wardPoints, params);
+    updateWardChart(wardPoints);
+}
+
+async function loadTileIndex() {
+    // Pre-rendered tiles are optional; fall back to the client-side heatmap without them.
+    try {
+        const response = await fetch('tiles/index.json');
+        if (response.ok) tileIndex = await response.json();
+    } catch (e) {
+        tileIndex = null;
+    }
+}
+
+function getStaticTileUrl(params) {
+    if (!tileIndex || tileIndex.format !== 'png' || params.excludeCityCentre) return null;
+    if (params.yearStart !== params.yearEnd || params.monthStart !== 1) return null;
+
+    const lastMonth = params.yearEnd === maxAvailableDate.year ? maxAvailableDate.month : 12;
+    if (params.monthEnd !== lastMonth) return null;
+    if (!tileIndex.years.includes(params.yearStart)) return null;
+
+    let slug = 'all';
+    if (params.crimeType !== 'all') {
+        slug = Object.keys(tileIndex.types).find(s => tileIndex.types[s] === params.crimeType);
+        if (!slug) return null;
+    }
+
+    return `tiles/${params.yearStart}/${slug}/{z}/{x}/{y}.png`;
 }
 
 let wardGeoJsonData = null;
 let geoJsonLayer = null;
+let boundaryIndex = null;
+let boundaryLevel = null;
+const boundaryCache = {};
 
 async function loadWardBoundaries() {
+    // Prefer the quantised TopoJSON levels; fall back to the full-precision GeoJSON.
+    try {
+        if (typeof topojson !== 'undefined') {
+            const response = await fetch('data/leeds_boundaries.index.json');
+            if (response.ok) {
+                boundaryIndex = await response.json();
+                map.on('zoomend', updateBoundaryLevel);
+                await updateBoundaryLevel();
+                return;
+            }
+        }
+    } catch (e) {
+        boundaryIndex = null;
+    }
+
     try {
         const response = await fetch('data/leeds_wards.geojson');
         wardGeoJsonData = await response.json();
@@ -310,6 +417,26 @@ async function loadWardBoundaries() {
     }
 }
 
+async function updateBoundaryLevel() {
+    const zoom = map.getZoom();
+    const level = boundaryIndex.levels.find(l => zoom <= l.maxZoom)
+        || boundaryIndex.levels[boundaryIndex.levels.length - 1];
+    if (level.name === boundaryLevel) return;
+
+    if (!boundaryCache[level.name]) {
+        const response = await fetch(`data/${level.file}`);
+        const topology = await response.json();
+        boundaryCache[level.name] = {
+            wards: topojson.feature(topology, topology.objects.wards),
+            pollingDistricts: topojson.feature(topology, topology.objects.polling_districts)
+        };
+    }
+
+    boundaryLevel = level.name;
+    wardGeoJsonData = boundaryCache[level.name].wards;
+    if (currentMapMode === 'wards' && crimeData) applyFilters();
+}
+
 function updateChoropleth(points) {
     if (!wardGeoJsonData) return;
 
@@ -598,6 +725,7 @@ function setMapMode(mode) {
         viewWardsBtn.classList.add('active');
         viewHeatmapBtn.classList.remove('active');
         if (heatLayer) map.removeLayer(heatLayer);
+        if (staticTileLayer) map.removeLayer(staticTileLayer);
         intensityControl.style.display = 'none';
         if (!window.infoControlAdded) {
             info.addTo(map);
@@ -610,14 +738,15 @@ function setMapMode(mode) {
 
 
 // Ward Details Logic
-function showWardDetails(wardName) {
-    const wardIdx = crimeData.w.indexOf(wardName);
-    if (wardIdx === -1) return;
+async function fetchWardMonthlyCounts(wardIdx, crimeType) {
+    if (apiMode) {
+        const query = new URLSearchParams({ ward: crimeData.w[wardIdx], type: crimeType });
+        const response = await fetch(`api/ward_series?${query}`);
+        return response.json();
+    }
 
     // Filter points for this ward only, ignoring current map filters for accurate history
-    const typeIndex = document.getElementById('crime-type').value === 'all'
-        ? -1
-        : crimeData.t.indexOf(document.getElementById('crime-type').value);
+    const typeIndex = crimeType === 'all' ? -1 : crimeData.t.indexOf(crimeType);
 
     // Get strictly this ward's data, optionally filtered by crime type
     // Ignore date filters to show full history trend
@@ -634,6 +763,14 @@ function showWardDetails(wardName) {
         const key = `${year}-${String(month).padStart(2, '0')}`;
         monthlyCounts[key] = (monthlyCounts[key] || 0) + count;
     });
+    return monthlyCounts;
+}
+
+async function showWardDetails(wardName) {
+    const wardIdx = crimeData.w.indexOf(wardName);
+    if (wardIdx === -1) return;
+
+    const monthlyCounts = await fetchWardMonthlyCounts(wardIdx, document.getElementById('crime-type').value);
 
     // Sort by date YYYY-MM
     const sortedMonths = Object.keys(monthlyCounts).sort();
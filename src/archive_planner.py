@@ -0,0 +1,202 @@
+"""
+Archive edition planner.
+
+Every police.uk archive edition (YYYY-MM.zip) holds the rolling EDITION_MONTHS
+months up to and including its own month, so downloading one zip per month
+fetches each month up to 36 times. Given a target month range, the planner:
+
+- skips months already extracted under data/archive/YYYY-MM/
+- covers what it can from edition zips already on disk
+- picks the fewest remaining editions from the archive index, always the newest
+  edition that still covers the earliest uncovered month (optimal for
+  fixed-length windows, and newest editions carry the latest corrections)
+- extracts only the files of the requested forces (West Yorkshire by default,
+  or every force of the --region profiles) for the months each edition was chosen
+  for, and records month -> edition provenance in data/archive/manifest.json,
+  which combine_leeds_data reads
+
+    python src/archive_planner.py --from 2018-01 --to 2022-10 --dry-run
+"""
+
+import argparse
+import json
+import os
+import re
+import zipfile
+
+import pandas as pd
+
+import download_archives
+from download_archives import download_archive, load_checksums
+from regions import by_force, parse_regions
+
+EDITION_MONTHS = 36
+FORCE = "west-yorkshire"
+DATASETS = ("street", "outcomes", "stop-and-search")
+MANIFEST_NAME = "manifest.json"
+EDITION_FILE = re.compile(r"^(\d{4}-\d{2})\.zip$")
+
+
+def month_index(month):
+    year, mon = month.split("-")
+    return int(year) * 12 + int(mon) - 1
+
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def edition_months(edition):
+    """Months contained in an archive edition, oldest first."""
+    end = month_index(edition)
+    return [month_label(i) for i in range(end - EDITION_MONTHS + 1, end + 1)]
+
+
+def manifest_path(archive_dir=None):
+    return os.path.join(archive_dir or download_archives.ARCHIVE_DIR, MANIFEST_NAME)
+
+
+def load_manifest(archive_dir=None):
+    path = manifest_path(archive_dir)
+    if not os.path.exists(path):
+        return {"months": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, archive_dir=None):
+    path = manifest_path(archive_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def street_file(month, archive_dir=None, force=FORCE):
+    return os.path.join(archive_dir or download_archives.ARCHIVE_DIR, month, f"{month}-{force}-street.csv")
+
+
+def local_editions(archive_dir=None):
+    archive_dir = archive_dir or download_archives.ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(m.group(1) for m in map(EDITION_FILE.match, os.listdir(archive_dir)) if m)
+
+
+def cover(months, editions):
+    """
+    Assign each month to the newest edition in editions containing it, using as
+    few editions as possible. Returns ({month: edition}, [months no edition covers]).
+    """
+    available = sorted(month_index(e) for e in editions)
+    chosen = []
+    uncovered = []
+    covered_until = -1
+    for first in sorted(month_index(m) for m in months):
+        if first <= covered_until:
+            continue
+        # Newest edition whose window still starts at or before this month
+        candidates = [e for e in available if first <= e < first + EDITION_MONTHS]
+        if not candidates:
+            uncovered.append(month_label(first))
+            continue
+        chosen.append(candidates[-1])
+        covered_until = candidates[-1]
+
+    assignment = {}
+    for month in months:
+        index = month_index(month)
+        containing = [e for e in chosen if e - EDITION_MONTHS < index <= e]
+        if containing:
+            assignment[month] = month_label(max(containing))
+    return assignment, uncovered
+
+
+def plan_archives(start, end, available=None, archive_dir=None, forces=(FORCE,)):
+    """
+    Work out what to fetch for the months start..end. A month is present once
+    every force in forces has been extracted for it.
+
+    Returns a dict with 'present' (months already extracted), 'local'
+    ({month: edition zip already on disk}), 'download' ({month: edition to
+    fetch}) and 'missing' (months no listed edition covers).
+    """
+    months = pd.date_range(start=start, end=end, freq='MS').strftime("%Y-%m").tolist()
+    present = [m for m in months if all(os.path.exists(street_file(m, archive_dir, f)) for f in forces)]
+    needed = set(months) - set(present)
+
+    local, _ = cover(needed, local_editions(archive_dir))
+    needed -= set(local)
+
+    if available is None:
+        available = [name[:-len(".zip")] for name in load_checksums() if EDITION_FILE.match(name)]
+    download, missing = cover(needed, available)
+
+    return {'present': present, 'local': local, 'download': download, 'missing': missing}
+
+
+def extract_months(zip_path, months, archive_dir=None, forces=(FORCE,)):
+    """Extract only the forces' files for months from an edition zip. Returns {month: [files]}."""
+    archive_dir = archive_dir or download_archives.ARCHIVE_DIR
+    wanted = {f"{month}/{month}-{force}-{dataset}.csv": month
+              for month in months for force in forces for dataset in DATASETS}
+    extracted = {month: [] for month in months}
+
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.namelist():
+            month = wanted.get(member)
+            if month is not None:
+                archive.extract(member, archive_dir)
+                extracted[month].append(os.path.basename(member))
+    return extracted
+
+
+def fetch_archive_months(start, end, keep_zips=False, dry_run=False, regions=None, **download_kwargs):
+    """Download and extract the fewest archive editions covering start..end for the regions' forces."""
+    archive_dir = download_archives.ARCHIVE_DIR
+    forces = tuple(by_force(regions)) if regions else (FORCE,)
+    plan = plan_archives(start, end, forces=forces)
+    editions = sorted(set(plan['download'].values()))
+    print(f"{len(plan['present'])} month(s) already extracted, "
+          f"{len(plan['local'])} from zips on disk, {len(plan['download'])} to download "
+          f"from {len(editions)} edition(s): {', '.join(editions) or 'none'}")
+    if plan['missing']:
+        print(f"Warning: no listed edition covers {', '.join(plan['missing'])}")
+    if dry_run:
+        return plan
+
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir)
+    by_edition = {}
+    for month, edition in {**plan['local'], **plan['download']}.items():
+        by_edition.setdefault(edition, []).append(month)
+
+    for edition, months in sorted(by_edition.items()):
+        year, mon = map(int, edition.split("-"))
+        downloaded = edition not in local_editions(archive_dir)
+        if downloaded and not download_archive(year, mon, **download_kwargs):
+            print(f"Skipping {len(months)} month(s) planned from {edition}.zip")
+            continue
+
+        zip_path = os.path.join(archive_dir, f"{edition}.zip")
+        for month, files in extract_months(zip_path, months, archive_dir, forces).items():
+            manifest['months'][month] = {'edition': edition, 'files': sorted(files)}
+        print(f"Extracted {len(months)} month(s) from {edition}.zip")
+        save_manifest(manifest, archive_dir)
+
+        if downloaded and not keep_zips:
+            os.remove(zip_path)
+
+    return plan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the fewest archive editions covering a month range")
+    parser.add_argument("--from", dest="start", default="2018-01", help="First month (YYYY-MM)")
+    parser.add_argument("--to", dest="end", default="2022-10", help="Last month (YYYY-MM)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the plan")
+    parser.add_argument("--keep-zips", action="store_true", help="Keep downloaded edition zips after extracting")
+    parser.add_argument("--region", default="leeds", help="Comma-separated region keys whose forces to extract")
+    args = parser.parse_args()
+
+    fetch_archive_months(args.start, args.end, keep_zips=args.keep_zips, dry_run=args.dry_run,
+                         regions=parse_regions(args.region))
@@ -7,16 +7,23 @@ from shapely.geometry import shape, Point
 from shapely.prepared import prep
 from tqdm import tqdm
 
+from delta_store import baseline, save_changes
+from metrics import STAGE_ROWS
+from regions import get_region, lsoa_file, lsoa_url
+from schema import add_categories, read_dataset
+
 def assign_lsoa():
     file_path = "data/processed/leeds_street_combined.csv"
-    lsoa_geojson_path = "data/raw/leeds_lsoa_2011.geojson"
+    leeds = get_region("leeds")
+    lsoa_geojson_path = lsoa_file(leeds)
     
     print(f"Loading {file_path}...")
-    df = pd.read_csv(file_path, low_memory=False)
+    df = read_dataset(file_path)
+    before = baseline(df, ['LSOA code', 'LSOA name'])
     
     if not os.path.exists(lsoa_geojson_path):
         print("Fetching Leeds LSOA 2011 boundaries from ONS API...")
-        url = "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/LSOA_Dec_2011_Boundaries_Generalised_Clipped_BGC_EW_V3/FeatureServer/0/query?where=LSOA11NM%20like%20%27Leeds%25%27&outFields=*&f=geojson"
+        url = lsoa_url(leeds)
         
         try:
             resp = requests.get(url, timeout=30)
@@ -64,6 +71,7 @@ def assign_lsoa():
     unmatched_count = 0
     
     for idx, row in tqdm(unique_coords.iterrows(), total=len(unique_coords)):
+        STAGE_ROWS.inc(stage="assign_lsoa")
         lat = row['Latitude']
         lon = row['Longitude']
         point = Point(lon, lat)
@@ -105,19 +113,16 @@ def assign_lsoa():
             new_codes_list.append("E01000000")
             new_names_list.append("Leeds (Unmatched)")
 
+    df['LSOA code'] = add_categories(df['LSOA code'], new_codes_list)
+    df['LSOA name'] = add_categories(df['LSOA name'], new_names_list)
     df.loc[target_indices, 'LSOA code'] = new_codes_list
     df.loc[target_indices, 'LSOA name'] = new_names_list
     
-    temp_path = file_path + ".tmp"
     try:
-        df.to_csv(temp_path, index=False)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        os.rename(temp_path, file_path)
+        save_changes(file_path, df, before, note="assign_lsoa")
         print(f"Saved updated data to {file_path}")
     except Exception as e:
         print(f"Error saving file: {e}")
-        print(f"Data saved to {temp_path} instead.")
 
 if __name__ == "__main__":
     assign_lsoa()
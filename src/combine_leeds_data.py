@@ -1,29 +1,37 @@
+import argparse
 import pandas as pd
 import os
 import glob
 
-def combine_leeds_data():
+from archive_planner import load_manifest
+from regions import by_force, data_file, get_region, in_bbox, parse_regions
+from schema import concat_datasets, read_dataset, report_memory, write_dataset
+
+START_DATE = "2018-01"
+END_DATE = "2022-10"
+
+def combine_leeds_data(regions=None):
+    """
+    Extract each region's records from the archive months. Every force file is
+    parsed once and split between all the regions inside that force.
+    """
+    regions = regions or [get_region()]
     base_dir = "data/archive"
     output_dir = "data/processed"
     
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         
-    start_date = "2018-01"
-    end_date = "2022-10"
+    start_date = START_DATE
+    end_date = END_DATE
     
     dates = pd.date_range(start=start_date, end=end_date, freq='MS').strftime("%Y-%m").tolist()
+    # Which archive edition each month was extracted from (written by archive_planner)
+    provenance = load_manifest(base_dir)['months']
     
-    MIN_LAT = 53.69
-    MAX_LAT = 53.96
-    MIN_LON = -1.80
-    MAX_LON = -1.29
-    
-    street_dfs = []
-    outcomes_dfs = []
-    stop_search_dfs = []
+    frames = {region['key']: {'street': [], 'outcomes': [], 'stop-and-search': []} for region in regions}
     
-    print(f"Processing data from {start_date} to {end_date}...")
+    print(f"Processing data from {start_date} to {end_date} for {', '.join(r['name'] for r in regions)}...")
     
     for date in dates:
         month_dir = os.path.join(base_dir, date)
@@ -32,71 +40,59 @@ def combine_leeds_data():
             print(f"Warning: Directory {month_dir} does not exist.")
             continue
             
-        print(f"Processing {date}...")
+        edition = provenance.get(date, {}).get('edition')
+        print(f"Processing {date}" + (f" (from {edition}.zip)..." if edition else "..."))
         
-        street_file = os.path.join(month_dir, f"{date}-west-yorkshire-street.csv")
-        if os.path.exists(street_file):
-            try:
-                df = pd.read_csv(street_file)
-                if 'LSOA name' in df.columns:
-                    leeds_df = df[df['LSOA name'].str.contains('Leeds', case=False, na=False)]
-                    street_dfs.append(leeds_df)
-            except Exception as e:
-                print(f"Error reading {street_file}: {e}")
+        for force, force_regions in by_force(regions).items():
+            for dataset in ('street', 'outcomes'):
+                path = os.path.join(month_dir, f"{date}-{force}-{dataset}.csv")
+                if not os.path.exists(path):
+                    continue
+                try:
+                    df = read_dataset(path, report=False)
+                    if 'LSOA name' in df.columns:
+                        for region in force_regions:
+                            in_region = df['LSOA name'].str.startswith(region['lsoa_prefix'], na=False)
+                            frames[region['key']][dataset].append(df[in_region])
+                except Exception as e:
+                    print(f"Error reading {path}: {e}")
 
-        outcomes_file = os.path.join(month_dir, f"{date}-west-yorkshire-outcomes.csv")
-        if os.path.exists(outcomes_file):
-            try:
-                df = pd.read_csv(outcomes_file)
-                if 'LSOA name' in df.columns:
-                    leeds_df = df[df['LSOA name'].str.contains('Leeds', case=False, na=False)]
-                    outcomes_dfs.append(leeds_df)
-            except Exception as e:
-                print(f"Error reading {outcomes_file}: {e}")
-                
-        stop_search_file = os.path.join(month_dir, f"{date}-west-yorkshire-stop-and-search.csv")
-        if os.path.exists(stop_search_file):
-            try:
-                df = pd.read_csv(stop_search_file)
-                if 'Latitude' in df.columns and 'Longitude' in df.columns:
-                    df = df.dropna(subset=['Latitude', 'Longitude'])
-                    
-                    mask = (
-                        (df['Latitude'] >= MIN_LAT) & 
-                        (df['Latitude'] <= MAX_LAT) & 
-                        (df['Longitude'] >= MIN_LON) & 
-                        (df['Longitude'] <= MAX_LON)
-                    )
-                    leeds_df = df[mask]
-                    stop_search_dfs.append(leeds_df)
-            except Exception as e:
-                 print(f"Error reading {stop_search_file}: {e}")
+            path = os.path.join(month_dir, f"{date}-{force}-stop-and-search.csv")
+            if os.path.exists(path):
+                try:
+                    df = read_dataset(path, report=False)
+                    if 'Latitude' in df.columns and 'Longitude' in df.columns:
+                        df = df.dropna(subset=['Latitude', 'Longitude'])
+                        for region in force_regions:
+                            frames[region['key']]['stop-and-search'].append(
+                                df[in_bbox(region, df['Latitude'], df['Longitude'])])
+                except Exception as e:
+                     print(f"Error reading {path}: {e}")
 
     print("Combining and saving files...")
     
-    if street_dfs:
-        combined_street = pd.concat(street_dfs, ignore_index=True)
-        output_path = os.path.join(output_dir, "leeds_street_archive.csv")
-        combined_street.to_csv(output_path, index=False)
-        print(f"Saved {len(combined_street)} street records to {output_path}")
-    else:
-        print("No street data found.")
+    for region in regions:
+        save_region(region, frames[region['key']])
 
-    if outcomes_dfs:
-        combined_outcomes = pd.concat(outcomes_dfs, ignore_index=True)
-        output_path = os.path.join(output_dir, "leeds_outcomes_combined.csv")
-        combined_outcomes.to_csv(output_path, index=False)
-        print(f"Saved {len(combined_outcomes)} outcome records to {output_path}")
-    else:
-        print("No outcome data found.")
 
-    if stop_search_dfs:
-        combined_stop_search = pd.concat(stop_search_dfs, ignore_index=True)
-        output_path = os.path.join(output_dir, "leeds_stop_and_search_combined.csv")
-        combined_stop_search.to_csv(output_path, index=False)
-        print(f"Saved {len(combined_stop_search)} stop and search records to {output_path}")
-    else:
-         print("No stop and search data found.")
+def save_region(region, frames):
+    name = region['name']
+    for dataset, label, file_name in [('street', "street", "street_archive.csv"),
+                                      ('outcomes', "outcome", "outcomes_combined.csv"),
+                                      ('stop-and-search', "stop and search", "stop_and_search_combined.csv")]:
+        if not frames[dataset]:
+            print(f"No {name} {label} data found.")
+            continue
+        combined = concat_datasets(frames[dataset])
+        if dataset != 'stop-and-search':
+            report_memory(combined, f"{name} {label} archive")
+        output_path = data_file(region, file_name)
+        write_dataset(combined, output_path)
+        print(f"Saved {len(combined)} {name} {label} records to {output_path}")
 
 if __name__ == "__main__":
-    combine_leeds_data()
+    parser = argparse.ArgumentParser(description="Extract regions' records from the archive months")
+    parser.add_argument("--region", default="leeds", help="Comma-separated region keys (default leeds)")
+    args = parser.parse_args()
+
+    combine_leeds_data(parse_regions(args.region))
@@ -0,0 +1,243 @@
+"""
+Indexed SQLite store over the processed crime data.
+
+The combined CSV is loaded once into data/processed/crime_store.sqlite with
+indexes on month, ward, polling district, crime type and the fixed grid cell
+from spatial_grid. CrimeStore.query() answers filtered counts (by bounding box
+or ward, month range and crime types, grouped by any of GROUP_FIELDS) without
+scanning the CSV, and keeps recent answers in an LRU cache.
+
+    store = open_store()
+    store.query(ward="Headingley & Hyde Park", month_range=("2023-01", "2023-12"),
+                types=["Burglary"], group_by=["month"])
+
+The store is rebuilt automatically when the source CSV or its delta log changes.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from delta_store import fingerprint
+from schema import read_dataset
+from spatial_grid import GRID_COLS, GRID_VERSION, cell_indices
+
+INPUT_PATH = os.path.join("data", "processed", "leeds_street_combined.csv")
+STORE_PATH = os.path.join("data", "processed", "crime_store.sqlite")
+STORE_VERSION = 1
+CACHE_SIZE = 256
+INSERT_CHUNK_ROWS = 100000
+
+# Store column -> source dataset column
+SOURCE_COLUMNS = {
+    'crime_id': 'Crime ID',
+    'month': 'Month',
+    'crime_type': 'Crime type',
+    'ward': 'Ward Name',
+    'polling_district': 'Polling District',
+    'postcode_district': 'Postcode District',
+    'lsoa_code': 'LSOA code',
+    'outcome': 'Last outcome category',
+    'latitude': 'Latitude',
+    'longitude': 'Longitude',
+}
+STORE_COLUMNS = list(SOURCE_COLUMNS) + ['lat_idx', 'lon_idx', 'cell', 'year']
+GROUP_FIELDS = ['month', 'year', 'crime_type', 'ward', 'polling_district', 'postcode_district',
+                'lsoa_code', 'outcome', 'lat_idx', 'lon_idx', 'cell']
+INDEXES = {
+    'crimes_month': ['month'],
+    'crimes_ward': ['ward', 'month'],
+    'crimes_polling_district': ['polling_district', 'month'],
+    'crimes_type': ['crime_type', 'month'],
+    'crimes_grid': ['lat_idx', 'lon_idx'],
+    'crimes_cell': ['cell'],
+}
+
+
+def _source_signature(csv_path):
+    # fingerprint() covers pending delta_store commits, which leave the CSV itself untouched
+    source = fingerprint(csv_path)
+    return f"{source['size']}:{source['mtime_ns']}:{source['head']}:{GRID_VERSION}:{STORE_VERSION}"
+
+
+def _sql_values(values, valid=None):
+    """Python scalars (None where missing) that sqlite3 can bind."""
+    values = pd.Series(values).astype(object)
+    missing = values.isna().to_numpy()
+    if valid is not None:
+        missing = missing | ~valid
+    values = values.tolist()
+    return [None if m else v for v, m in zip(values, missing)]
+
+
+def store_rows(df):
+    """Rows of STORE_COLUMNS for a dataset frame, including the grid keys."""
+    lats = df['Latitude'].to_numpy(dtype=np.float64)
+    lons = df['Longitude'].to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    lat_idx, lon_idx = cell_indices(np.where(valid, lats, 0), np.where(valid, lons, 0))
+
+    columns = [
+        _sql_values(df[source]) if source in df.columns else [None] * len(df)
+        for source in SOURCE_COLUMNS.values()
+    ]
+    years = pd.to_numeric(df['Month'].astype(object).str[:4], errors='coerce')
+    columns += [
+        _sql_values(lat_idx.astype(np.int64), valid),
+        _sql_values(lon_idx.astype(np.int64), valid),
+        _sql_values((lat_idx * GRID_COLS + lon_idx).astype(np.int64), valid),
+        _sql_values(years.fillna(-1).astype(np.int64), years.notna().to_numpy()),
+    ]
+    return list(zip(*columns))
+
+
+def build_store(csv_path=INPUT_PATH, path=STORE_PATH):
+    """(Re)create the SQLite store from the processed CSV."""
+    print(f"Building crime store {path} from {csv_path}...")
+    start = time.time()
+    df = read_dataset(csv_path)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    conn = sqlite3.connect(temp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"CREATE TABLE crimes ({', '.join(STORE_COLUMNS)})")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    placeholders = ", ".join("?" for _ in STORE_COLUMNS)
+    for i in range(0, len(df), INSERT_CHUNK_ROWS):
+        conn.executemany(f"INSERT INTO crimes VALUES ({placeholders})", store_rows(df.iloc[i:i + INSERT_CHUNK_ROWS]))
+
+    for name, index_columns in INDEXES.items():
+        conn.execute(f"CREATE INDEX {name} ON crimes ({', '.join(index_columns)})")
+    conn.execute("INSERT INTO meta VALUES ('source', ?)", (_source_signature(csv_path),))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    os.replace(temp_path, path)
+    print(f"Stored {len(df):,} records in {time.time() - start:.1f}s")
+    return CrimeStore(path)
+
+
+def open_store(csv_path=INPUT_PATH, path=STORE_PATH, rebuild=False):
+    """Open the store, rebuilding it first if it is missing or older than csv_path."""
+    if not rebuild and os.path.exists(path):
+        store = CrimeStore(path)
+        if not os.path.exists(csv_path) or store.source_signature() == _source_signature(csv_path):
+            return store
+        store.close()
+        print("Source data changed since the store was built.")
+    return build_store(csv_path, path)
+
+
+class CrimeStore:
+    def __init__(self, path=STORE_PATH, cache_size=CACHE_SIZE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cached_query = lru_cache(maxsize=cache_size)(self._run_query)
+
+    def close(self):
+        self._conn.close()
+
+    def source_signature(self):
+        rows = self._fetchall("SELECT value FROM meta WHERE key = 'source'")
+        return rows[0][0] if rows else None
+
+    def cache_info(self):
+        return self._cached_query.cache_info()
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def query(self, bbox=None, ward=None, polling_district=None, month_range=None, types=None, group_by=None):
+        """
+        Count records matching every given filter, grouped by group_by fields.
+
+        bbox: (min_lon, min_lat, max_lon, max_lat); ward / polling_district: a
+        name or list of names; month_range: inclusive ('YYYY-MM', 'YYYY-MM');
+        types: crime types. Returns a DataFrame of the group fields and 'count'.
+        """
+        def as_key(value):
+            if value is None or isinstance(value, str):
+                return value
+            return tuple(value)
+
+        return self._cached_query(as_key(bbox), as_key(ward), as_key(polling_district),
+                                  as_key(month_range), as_key(types), as_key(group_by)).copy()
+
+    def _run_query(self, bbox, ward, polling_district, month_range, types, group_by):
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        unknown = set(group_by) - set(GROUP_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}; choose from {GROUP_FIELDS}")
+
+        where, params = [], []
+
+        def match(column, values):
+            values = [values] if isinstance(values, str) else list(values)
+            where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            (lat_lo, lat_hi), (lon_lo, lon_hi) = cell_indices([min_lat, max_lat], [min_lon, max_lon])
+            # Grid key range first so the index narrows the scan, then the exact box
+            where.append("lat_idx BETWEEN ? AND ? AND lon_idx BETWEEN ? AND ?")
+            params.extend([int(lat_lo), int(lat_hi), int(lon_lo), int(lon_hi)])
+            where.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+        if ward is not None:
+            match("ward", ward)
+        if polling_district is not None:
+            match("polling_district", polling_district)
+        if month_range is not None:
+            where.append("month BETWEEN ? AND ?")
+            params.extend(month_range)
+        if types is not None:
+            match("crime_type", types)
+
+        select = ", ".join(group_by + ["COUNT(*) AS count"])
+        sql = f"SELECT {select} FROM crimes"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+
+        return pd.DataFrame(self._fetchall(sql, params), columns=group_by + ['count'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the indexed crime store")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the store even if it is up to date")
+    parser.add_argument("--ward", action="append", help="Ward name (repeatable)")
+    parser.add_argument("--polling-district", action="append", help="Polling district code (repeatable)")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    parser.add_argument("--from", dest="month_from", help="First month (YYYY-MM)")
+    parser.add_argument("--to", dest="month_to", help="Last month (YYYY-MM)")
+    parser.add_argument("--type", dest="types", action="append", help="Crime type (repeatable)")
+    parser.add_argument("--group-by", nargs="*", default=[], choices=GROUP_FIELDS)
+    args = parser.parse_args()
+
+    store = open_store(rebuild=args.rebuild)
+    month_range = None
+    if args.month_from or args.month_to:
+        month_range = (args.month_from or "0000-00", args.month_to or "9999-99")
+
+    start = time.time()
+    result = store.query(bbox=args.bbox, ward=args.ward, polling_district=args.polling_district,
+                         month_range=month_range, types=args.types, group_by=args.group_by)
+    print(result.to_string(index=False))
+    print(f"\nQuery took {(time.time() - start) * 1000:.1f} ms")
@@ -0,0 +1,237 @@
+"""
+Local aggregate query server for the dashboard.
+
+Serves the dashboard's static files plus a small JSON API over the same grid
+aggregates that prepare_dashboard_data builds, so the browser downloads only the
+answer to the current filter instead of every aggregate point:
+
+    GET /api/meta                                  crime types, years, wards, ... (crime_data.json without 'p')
+    GET /api/cells?type=&from=YYYY-MM&to=YYYY-MM&exclude_cc=1   [[lat, lon, count], ...] per grid cell
+    GET /api/wards?<same filters>                  [[ward_idx, type_idx, count], ...]
+    GET /api/ward_series?ward=<name>&type=         {"YYYY-MM": count, ...} over all months
+
+Responses are cached in-process (LRU) and carry an ETag; a matching
+If-None-Match gets a 304. Open http://localhost:8050/?api to use it.
+"""
+
+import argparse
+import hashlib
+import json
+from functools import lru_cache, partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from prepare_dashboard_data import (
+    CITY_CENTRE_WARD, aggregate_months, build_output, load_cached_aggregates, load_clean_data,
+)
+from spatial_grid import GRID_COLS, cell_centres
+
+DEFAULT_PORT = 8050
+DASHBOARD_DIR = "dashboard"
+CACHE_SIZE = 512
+# Polling district hidden together with the city centre ward (matches the static dashboard)
+EXCLUDED_DISTRICT = "HRA"
+
+
+def load_aggregates():
+    cached, _ = load_cached_aggregates()
+    if cached is not None:
+        print("Using cached dashboard aggregates.")
+        return cached
+    print("No aggregate cache found, aggregating the processed data...")
+    return aggregate_months(load_clean_data())
+
+
+def _month_ordinal(month):
+    try:
+        year, mon = (int(part) for part in month.split("-"))
+    except ValueError:
+        raise ValueError(f"Invalid month (expected YYYY-MM): {month}") from None
+    if not 1 <= mon <= 12:
+        raise ValueError(f"Invalid month (expected YYYY-MM): {month}")
+    return year * 12 + mon - 1
+
+
+class AggregateIndex:
+    """Column arrays over the aggregates, answering filtered totals with bincount."""
+
+    def __init__(self, aggregates):
+        meta = build_output(aggregates)
+        meta.pop('p')
+        self.meta = meta
+
+        self.type_names = meta['t']
+        self.ward_names = meta['w']
+        self.type_idx = pd.Categorical(aggregates['Crime type'], categories=self.type_names).codes.astype(np.int64)
+        self.ward_idx = pd.Categorical(aggregates['Ward Name'], categories=self.ward_names).codes.astype(np.int64)
+        months = aggregates['Month'].astype(str)
+        self.month = (months.str[:4].astype(int) * 12 + months.str[5:7].astype(int) - 1).to_numpy()
+        self.counts = aggregates['count'].to_numpy(dtype=np.int64)
+        self.excluded = ((aggregates['Ward Name'] == CITY_CENTRE_WARD)
+                         | (aggregates['Polling District'] == EXCLUDED_DISTRICT)).to_numpy()
+        self.cell = (aggregates['lat_idx'].to_numpy(dtype=np.int64) * GRID_COLS
+                     + aggregates['lon_idx'].to_numpy(dtype=np.int64))
+
+        self.cell_ids, self.cell_pos = np.unique(self.cell, return_inverse=True)
+        self.cell_lats, self.cell_lons = cell_centres(self.cell_ids // GRID_COLS, self.cell_ids % GRID_COLS)
+
+        latest = int(self.month.max()) if len(self.month) else 0
+        meta['md'] = [latest // 12, latest % 12 + 1]
+        meta['mc'] = int(np.bincount(self.cell_pos, weights=self.counts).max()) if len(self.counts) else 0
+
+        digest = hashlib.sha1(pd.util.hash_pandas_object(aggregates, index=False).to_numpy().tobytes())
+        self.version = digest.hexdigest()[:12]
+
+    def _mask(self, crime_type, month_from, month_to, exclude_cc):
+        mask = np.ones(len(self.counts), dtype=bool)
+        if crime_type is not None:
+            mask &= self.type_idx == self.type_names.index(crime_type)
+        if month_from is not None:
+            mask &= self.month >= _month_ordinal(month_from)
+        if month_to is not None:
+            mask &= self.month <= _month_ordinal(month_to)
+        if exclude_cc:
+            mask &= ~self.excluded
+        return mask
+
+    def cells(self, crime_type=None, month_from=None, month_to=None, exclude_cc=False):
+        mask = self._mask(crime_type, month_from, month_to, exclude_cc)
+        totals = np.bincount(self.cell_pos[mask], weights=self.counts[mask], minlength=len(self.cell_ids))
+        hit = np.flatnonzero(totals)
+        return [[lat, lon, int(c)] for lat, lon, c in
+                zip(self.cell_lats[hit].tolist(), self.cell_lons[hit].tolist(), totals[hit].tolist())]
+
+    def wards(self, crime_type=None, month_from=None, month_to=None, exclude_cc=False):
+        mask = self._mask(crime_type, month_from, month_to, exclude_cc)
+        n_types = len(self.type_names)
+        keys = self.ward_idx[mask] * n_types + self.type_idx[mask]
+        totals = np.bincount(keys, weights=self.counts[mask], minlength=len(self.ward_names) * n_types)
+        hit = np.flatnonzero(totals)
+        return [[int(k // n_types), int(k % n_types), int(totals[k])] for k in hit]
+
+    def ward_series(self, ward, crime_type=None):
+        mask = self._mask(crime_type, None, None, False) & (self.ward_idx == self.ward_names.index(ward))
+        months, pos = np.unique(self.month[mask], return_inverse=True)
+        totals = np.bincount(pos, weights=self.counts[mask])
+        return {f"{m // 12}-{m % 12 + 1:02d}": int(t) for m, t in zip(months.tolist(), totals.tolist())}
+
+
+class QueryCache:
+    """LRU of encoded responses keyed by endpoint and normalised filters."""
+
+    def __init__(self, index, size=CACHE_SIZE):
+        self.index = index
+        self.get = lru_cache(maxsize=size)(self._render)
+
+    def _render(self, endpoint, params):
+        kwargs = dict(params)
+        if endpoint == "meta":
+            payload = self.index.meta
+        elif endpoint == "cells":
+            payload = self.index.cells(**kwargs)
+        elif endpoint == "wards":
+            payload = self.index.wards(**kwargs)
+        elif endpoint == "ward_series":
+            payload = self.index.ward_series(**kwargs)
+        else:
+            raise KeyError(endpoint)
+
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        etag = '"%s-%s"' % (self.index.version, hashlib.sha1(body).hexdigest()[:16])
+        return body, etag
+
+
+def parse_filters(endpoint, query, index):
+    """Validate query parameters into a hashable, normalised tuple of kwargs."""
+    def one(name):
+        values = query.get(name)
+        return values[0] if values else None
+
+    crime_type = one("type")
+    if crime_type in (None, "", "all"):
+        crime_type = None
+    elif crime_type not in index.type_names:
+        raise ValueError(f"Unknown crime type: {crime_type}")
+
+    if endpoint == "ward_series":
+        ward = one("ward")
+        if ward not in index.ward_names:
+            raise ValueError(f"Unknown ward: {ward}")
+        return (("ward", ward), ("crime_type", crime_type))
+
+    params = [("crime_type", crime_type)]
+    for name, key in [("from", "month_from"), ("to", "month_to")]:
+        month = one(name)
+        if month:
+            # Canonical YYYY-MM so equivalent requests share a cache entry
+            ordinal = _month_ordinal(month)
+            month = f"{ordinal // 12}-{ordinal % 12 + 1:02d}"
+        params.append((key, month or None))
+    params.append(("exclude_cc", one("exclude_cc") in ("1", "true")))
+    return tuple(params)
+
+
+class DashboardHandler(SimpleHTTPRequestHandler):
+    cache = None
+
+    def end_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+        super().end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith("/api/"):
+            return super().do_GET()
+
+        endpoint = url.path[len("/api/"):].strip("/")
+        if endpoint not in ("meta", "cells", "wards", "ward_series"):
+            return self.send_error(404, "Unknown endpoint")
+
+        try:
+            params = () if endpoint == "meta" else parse_filters(endpoint, parse_qs(url.query), self.cache.index)
+        except ValueError as e:
+            return self.send_error(400, str(e))
+
+        body, etag = self.cache.get(endpoint, params)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(aggregates, host="127.0.0.1", port=DEFAULT_PORT, directory=DASHBOARD_DIR):
+    handler = type("Handler", (DashboardHandler,), {"cache": QueryCache(AggregateIndex(aggregates))})
+    return ThreadingHTTPServer((host, port), partial(handler, directory=directory))
+
+
+def serve_dashboard(host="127.0.0.1", port=DEFAULT_PORT):
+    server = make_server(load_aggregates(), host, port)
+    print(f"Serving dashboard and aggregate API on http://{host}:{port}/?api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve dashboard aggregates on demand")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    serve_dashboard(args.host, args.port)
@@ -0,0 +1,420 @@
+"""
+Versioned storage for the processed datasets: a base snapshot plus append-only
+deltas.
+
+Stages that correct a few records (LSOA assignment, boundary filtering,
+enrichment, the outcomes join) used to rewrite the whole master CSV. They now
+commit only the rows they change, as one small immutable delta file each:
+
+    data/processed/leeds_street_combined.csv          # last compacted snapshot
+    data/processed/leeds_street_combined.deltas/
+        log.json                                      # versions, bases, deltas
+        base-000000.csv                               # hard link to each base
+        000001-patch.csv                              # key columns + new values
+        000002-delete.csv                             # key columns
+        000003-insert.csv                             # whole rows
+
+Every committed delta is a new version. Records are keyed by Crime ID or, for
+ID-less rows, by the same content hash merge_datasets deduplicates on, so
+identical ID-less rows are patched and deleted together. A delta only becomes
+visible once the log names it, so a stage that crashes mid-run leaves no
+partial change behind.
+
+schema.read_dataset() returns the latest snapshot (base plus pending deltas)
+transparently, or any retained version with version=N. Compaction folds the
+pending deltas into a new base, replacing the CSV so that readers bypassing
+read_dataset see them too; it runs inline once the pending deltas outgrow
+COMPACT_FRACTION of the base, or in the background with the watch command.
+The bases are hard links to earlier versions of the CSV, so keeping history
+costs no copies while the CSV is replaced by rename. Any other full rewrite of
+the CSV (e.g. merge_datasets) is adopted as a new base version.
+
+    python src/delta_store.py status [PATH]
+    python src/delta_store.py compact [PATH]
+    python src/delta_store.py watch [PATH ...] --interval 60
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_quality import compute_manifest, save_manifest
+from merge_datasets import CONTENT_COLUMNS, content_hashes
+from schema import add_categories, concat_datasets, read_dataset, report_memory
+
+DEFAULT_PATH = "data/processed/leeds_street_combined.csv"
+LOG_FORMAT = 1
+KEY_COLUMNS = ['Crime ID'] + CONTENT_COLUMNS
+OPERATIONS = ('insert', 'delete', 'patch')
+# Bases kept for reads of older versions (the current one included)
+KEEP_BASES = 2
+# Compact inline once the pending deltas reach this fraction of the base's size
+COMPACT_FRACTION = 0.25
+LOCK_STALE_SECONDS = 300
+WATCH_INTERVAL = 60
+# The watch command leaves deltas younger than this for the stage still writing them
+WATCH_IDLE_SECONDS = 30
+
+
+def store_dir(path):
+    return os.path.splitext(path)[0] + ".deltas"
+
+
+def _log_path(path):
+    return os.path.join(store_dir(path), "log.json")
+
+
+def _base_file(path, version):
+    return os.path.join(store_dir(path), f"base-{version:06d}.csv")
+
+
+def _delta_file(path, delta):
+    return os.path.join(store_dir(path), delta['file'])
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def record_keys(df):
+    """uint64 key of every row: a hash of its Crime ID, or of CONTENT_COLUMNS where it has none."""
+    keys = content_hashes(df).copy()
+    if 'Crime ID' in df.columns:
+        ids = df['Crime ID'].astype(object)
+        has_id = ids.notna().to_numpy()
+        keys[has_id] = pd.util.hash_array(ids[has_id].astype(str).to_numpy(dtype=object))
+    return keys
+
+
+def load_log(path):
+    if not os.path.exists(_log_path(path)):
+        return None
+    with open(_log_path(path)) as f:
+        return json.load(f)
+
+
+def _save_log(path, log):
+    target = _log_path(path)
+    with open(target + ".tmp", 'w') as f:
+        json.dump(log, f, indent=1)
+    os.replace(target + ".tmp", target)
+
+
+@contextlib.contextmanager
+def store_lock(path):
+    """Serialise log updates between stages and the compactor (held for milliseconds)."""
+    os.makedirs(store_dir(path), exist_ok=True)
+    lock_path = os.path.join(store_dir(path), "lock")
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+
+
+def _link(source, target):
+    """Hard link target to source's current contents, copying where links are unsupported."""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _set_base(path, log, version):
+    _link(path, _base_file(path, version))
+    log['base'] = {'version': version, 'signature': file_signature(path)}
+    log['bases'] = sorted(set(log['bases']) | {version})
+    log['head'] = max(log['head'], version)
+
+    # Drop history nothing can be read from any more
+    for old in log['bases'][:-KEEP_BASES]:
+        if os.path.exists(_base_file(path, old)):
+            os.remove(_base_file(path, old))
+    log['bases'] = log['bases'][-KEEP_BASES:]
+    for delta in [d for d in log['deltas'] if d['version'] <= log['bases'][0]]:
+        if os.path.exists(_delta_file(path, delta)):
+            os.remove(_delta_file(path, delta))
+        log['deltas'].remove(delta)
+
+
+def _refresh(path):
+    """The log for path (created on first use), adopting a CSV rewritten outside the store. Call locked."""
+    log = load_log(path)
+    if log is None:
+        log = {'format': LOG_FORMAT, 'head': -1, 'base': None, 'bases': [], 'deltas': []}
+        _set_base(path, log, 0)
+        _save_log(path, log)
+    elif log['base']['signature'] != file_signature(path):
+        print(f"{path} was rewritten; adopting it as version {log['head'] + 1}")
+        _set_base(path, log, log['head'] + 1)
+        _save_log(path, log)
+    return log
+
+
+def pending(log, path=None):
+    """The deltas not yet folded into the base, or none if the CSV was rewritten since."""
+    if log is None or (path and log['base']['signature'] != file_signature(path)):
+        return []
+    return [d for d in log['deltas'] if d['version'] > log['base']['version']]
+
+
+def fingerprint(path):
+    """Changes whenever the dataset's content may have: the CSV's signature plus the store head."""
+    log = load_log(path)
+    return {**file_signature(path), 'head': log['head'] if log and pending(log, path) else None}
+
+
+def commit(path, op, rows, note=""):
+    """Append rows as one delta; returns the new version, or None if there is nothing to record."""
+    if op not in OPERATIONS:
+        raise ValueError(f"Unknown delta operation {op!r} (expected one of {', '.join(OPERATIONS)})")
+    if not len(rows):
+        return None
+
+    with store_lock(path):
+        log = _refresh(path)
+        version = log['head'] + 1
+        delta = {'version': version, 'op': op, 'file': f"{version:06d}-{op}.csv", 'rows': len(rows),
+                 'columns': [c for c in rows.columns if op == 'insert' or c not in KEY_COLUMNS],
+                 'note': note, 'time': round(time.time(), 3)}
+        target = _delta_file(path, delta)
+        rows.to_csv(target + ".tmp", index=False)
+        os.replace(target + ".tmp", target)
+        delta['bytes'] = os.path.getsize(target)
+
+        log['deltas'].append(delta)
+        log['head'] = version
+        _save_log(path, log)
+    return version
+
+
+def _key_frame(rows):
+    """The key columns of rows, leaving the content columns empty where a Crime ID identifies the row."""
+    keys = rows.reindex(columns=KEY_COLUMNS).astype(object)
+    keys.loc[keys['Crime ID'].notna(), CONTENT_COLUMNS] = np.nan
+    return keys
+
+
+def insert(path, rows, note=""):
+    return commit(path, 'insert', rows, note)
+
+
+def delete(path, rows, note=""):
+    """Delete every record sharing a key with rows."""
+    return commit(path, 'delete', _key_frame(rows), note)
+
+
+def patch(path, rows, columns, note=""):
+    """Set columns to rows' values on every record sharing a key with rows."""
+    if set(columns) & set(KEY_COLUMNS):
+        raise ValueError(f"Key columns cannot be patched ({', '.join(KEY_COLUMNS)}); delete and insert instead")
+    return commit(path, 'patch', pd.concat([_key_frame(rows), rows[list(columns)]], axis=1), note)
+
+
+def _differs(before, after):
+    """Rows where two aligned series hold different values (NaN equals NaN)."""
+    before, after = before.astype(object), after.astype(object)
+    return ~((before == after) | (before.isna() & after.isna())).to_numpy()
+
+
+def baseline(df, columns):
+    """Copy of df's key columns and the columns a stage may change, to pass to save_changes later."""
+    return df.reindex(columns=list(dict.fromkeys(KEY_COLUMNS + list(columns)))).copy()
+
+
+def save_changes(path, df, before, note=""):
+    """
+    Commit the difference between df and before (its baseline() from before the
+    stage edited it): rows missing from df are deleted, rows new to it inserted
+    and rows whose baseline columns changed patched. Compacts when the pending
+    deltas have grown large.
+    """
+    columns = [c for c in before.columns if c not in KEY_COLUMNS]
+    deleted = before.index.difference(df.index)
+    inserted = df.index.difference(before.index)
+    common = df.index.intersection(before.index)
+
+    changed = np.zeros(len(common), dtype=bool)
+    for column in columns:
+        after = df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+        changed |= _differs(before.loc[common, column], after.loc[common])
+
+    delete(path, before.loc[deleted], note)
+    patch(path, df.loc[common[changed]].reindex(columns=KEY_COLUMNS + columns), columns, note)
+    insert(path, df.loc[inserted], note)
+    print(f"Recorded {len(deleted)} deleted, {int(changed.sum())} patched and {len(inserted)} inserted "
+          f"records for {path}")
+    maybe_compact(path)
+
+
+def _apply(df, keys, delta, rows, columns=None):
+    """df (and its record keys) with one delta applied, patching only columns if given."""
+    if delta['op'] == 'insert':
+        return concat_datasets([df, rows]), np.concatenate([keys, record_keys(rows)])
+
+    targets = record_keys(rows)
+    if delta['op'] == 'delete':
+        keep = ~np.isin(keys, targets)
+        return df[keep].reset_index(drop=True), keys[keep]
+
+    # The last patch row for a key wins
+    last = ~pd.Series(targets).duplicated(keep='last').to_numpy()
+    positions = pd.Index(targets[last]).get_indexer(keys)
+    matched = positions >= 0
+    for column in delta['columns']:
+        if columns is not None and column not in columns:
+            continue
+        values = rows[column].to_numpy()[last][positions[matched]]
+        if column not in df.columns:
+            df[column] = pd.Series(np.nan, index=df.index, dtype=object)
+        df[column] = add_categories(df[column], values)
+        df.loc[matched, column] = values
+    return df, keys
+
+
+def _read_file(file_path, columns):
+    """A base or delta file, with whichever of columns it has."""
+    if columns is not None:
+        header = pd.read_csv(file_path, nrows=0).columns
+        columns = [c for c in header if c in columns]
+    return read_dataset(file_path, columns=columns, snapshot=False, report=False)
+
+
+def snapshot(path, version=None, columns=None):
+    """
+    The dataset at version (default the latest), or None when the CSV alone
+    already holds it. With columns, only those (plus the keys, while replaying)
+    are read and patched.
+    """
+    wanted = None if columns is None else list(dict.fromkeys(list(columns) + KEY_COLUMNS))
+    for _ in range(3):
+        log = load_log(path)
+        if log is None:
+            if version is not None:
+                raise ValueError(f"{path} has no version history")
+            return None
+
+        if version is None:
+            if not pending(log, path):
+                return None
+            target = log['head']
+        else:
+            target = version
+            if target == log['base']['version'] and log['base']['signature'] == file_signature(path):
+                return None
+
+        bases = [b for b in log['bases'] if b <= target]
+        if not bases or target > log['head']:
+            raise ValueError(f"Version {target} of {path} is not retained "
+                             f"(available: {log['bases'][0] if log['bases'] else '-'}..{log['head']})")
+        base = bases[-1]
+        try:
+            df = _read_file(_base_file(path, base), wanted)
+            keys = record_keys(df)
+            for delta in [d for d in log['deltas'] if base < d['version'] <= target]:
+                rows = _read_file(_delta_file(path, delta), wanted)
+                df, keys = _apply(df, keys, delta, rows, wanted)
+            return df if columns is None else df[[c for c in df.columns if c in columns]]
+        except FileNotFoundError:
+            # A compaction pruned the history we were reading; start again from the new log
+            continue
+    raise RuntimeError(f"Could not read a consistent snapshot of {path}")
+
+
+def compact(path):
+    """Fold the pending deltas into a new base. Stages may keep committing meanwhile."""
+    with store_lock(path):
+        log = _refresh(path)
+    target = log['head']
+    if not pending(log):
+        print(f"{path} is up to date at version {target}.")
+        return log
+
+    print(f"Compacting {len(pending(log))} deltas of {path} into version {target}...")
+    df = snapshot(path, target)
+    temp_path = path + ".compact.tmp"
+    df.to_csv(temp_path, index=False)
+    manifest = compute_manifest(df)
+
+    with store_lock(path):
+        log = load_log(path)
+        if log['base']['signature'] != file_signature(path):
+            os.remove(temp_path)
+            print(f"{path} was rewritten during compaction; leaving it as is.")
+            return log
+        os.replace(temp_path, path)
+        save_manifest(manifest, path)
+        _set_base(path, log, target)
+        _save_log(path, log)
+    report_memory(df, f"Compacted {os.path.basename(path)} at version {target}")
+    return log
+
+
+def maybe_compact(path, fraction=None):
+    """Compact once the pending deltas reach fraction (default COMPACT_FRACTION) of the base's size."""
+    fraction = COMPACT_FRACTION if fraction is None else fraction
+    log = load_log(path)
+    if sum(d['bytes'] for d in pending(log, path)) >= fraction * os.path.getsize(path):
+        compact(path)
+
+
+def status(path):
+    log = load_log(path)
+    deltas = pending(log, path)
+    return {
+        'head': log['head'] if log else None,
+        'base': log['base']['version'] if log else None,
+        'retained': log['bases'] if log else [],
+        'pending': len(deltas),
+        'pending_bytes': sum(d['bytes'] for d in deltas),
+        'base_bytes': os.path.getsize(path),
+    }
+
+
+def watch(paths, interval=WATCH_INTERVAL, idle=WATCH_IDLE_SECONDS):
+    """Compact each dataset whose newest pending delta is at least idle seconds old, forever."""
+    print(f"Watching {', '.join(paths)} every {interval:g}s")
+    while True:
+        for path in paths:
+            deltas = pending(load_log(path), path) if os.path.exists(path) else []
+            if deltas and time.time() - deltas[-1]['time'] >= idle:
+                compact(path)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and compact the delta logs of the processed datasets")
+    parser.add_argument("command", choices=["status", "compact", "watch"])
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_PATH])
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="Seconds between watch passes")
+    parser.add_argument("--idle", type=float, default=WATCH_IDLE_SECONDS,
+                        help="Only compact deltas older than this many seconds")
+    args = parser.parse_args()
+
+    if args.command == "watch":
+        watch(args.paths, args.interval, args.idle)
+    for path in args.paths:
+        if args.command == "status":
+            print(f"{path}: {json.dumps(status(path))}")
+        elif args.command == "compact":
+            compact(path)
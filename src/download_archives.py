@@ -4,59 +4,316 @@ Police.uk Archive Data Downloader
 Downloads historical crime data archives from https://data.police.uk/data/archive/
 Features:
 - Progress bar with download speed and ETA
-- Resume capability for interrupted downloads
-- MD5 checksum verification
+- Resume capability for interrupted downloads (per segment)
+- MD5 checksum verification against a cached index of every archive's checksum,
+  fetched and parsed once instead of once per file
+- Several archives downloaded concurrently, large files split into parallel
+  HTTP Range segments, hashed as the bytes arrive
+- Optional global bandwidth cap shared by every connection
 - Flexible date range selection
 """
 
 import argparse
 import hashlib
+import json
+import os
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from metrics import counter
+
 BASE_URL = "https://data.police.uk/data/archive"
 ARCHIVE_DIR = Path(__file__).parent.parent / "data" / "archive"
-CHUNK_SIZE = 8192
+STREAM_CHUNK_SIZE = 256 * 1024
+CHECKSUM_CACHE = "checksums.json"
+CHECKSUM_MAX_AGE = 24 * 3600
+DEFAULT_WORKERS = 3
+DEFAULT_SEGMENTS = 4
+# Files smaller than this are fetched over a single connection
+SEGMENT_MIN_SIZE = 64 * 1024 * 1024
+
+DOWNLOADED_BYTES = counter("archive_download_bytes", "Archive bytes downloaded")
+
+ARCHIVE_NAME = re.compile(r"(\d{4}-\d{2})\.zip")
+MD5_HEX = re.compile(r"\b[0-9a-f]{32}\b")
+
+_session = None
+_session_lock = threading.Lock()
+_checksums = None
+_checksums_refreshed = False
+_checksums_lock = threading.Lock()
+
+
+def get_session(pool_size: int = DEFAULT_WORKERS * DEFAULT_SEGMENTS) -> requests.Session:
+    """Shared keep-alive session sized for every concurrent connection."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
 
 
 def get_archive_url(year: int, month: int) -> str:
     return f"{BASE_URL}/{year:04d}-{month:02d}.zip"
 
 
+class TokenBucket:
+    """Byte-rate limiter shared by every download thread (rate None = unlimited)."""
+
+    def __init__(self, rate: float | None, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst or (rate if rate else 0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Go into debt and sleep it off, so chunks larger than the burst still pass
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+UNLIMITED = TokenBucket(None)
+
+
+def parse_checksum_index(html: str) -> dict[str, str]:
+    """Map every 'YYYY-MM.zip' on the archive index page to the MD5 listed after it."""
+    checksums = {}
+    matches = list(ARCHIVE_NAME.finditer(html))
+    for i, match in enumerate(matches):
+        filename = match.group(0)
+        if filename in checksums:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(html)
+        md5 = MD5_HEX.search(html, match.end(), min(end, match.end() + 500))
+        if md5:
+            checksums[filename] = md5.group(0)
+    return checksums
+
+
+def load_checksums(refresh: bool = False) -> dict[str, str]:
+    """
+    Archive checksums from the cached index, fetching the index page when the
+    cache is missing, older than CHECKSUM_MAX_AGE or refresh is set.
+    """
+    global _checksums, _checksums_refreshed
+    cache_path = ARCHIVE_DIR / CHECKSUM_CACHE
+
+    with _checksums_lock:
+        if _checksums is not None and not refresh:
+            return _checksums
+
+        if not refresh and cache_path.exists():
+            cached = json.loads(cache_path.read_text())
+            if time.time() - cached.get("fetched_at", 0) < CHECKSUM_MAX_AGE:
+                _checksums = cached["checksums"]
+                return _checksums
+
+        try:
+            response = get_session().get(f"{BASE_URL}/", timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"  ⚠ Could not fetch the archive index: {e}")
+            _checksums = _checksums or {}
+            return _checksums
+
+        _checksums = parse_checksum_index(response.text)
+        _checksums_refreshed = True
+        ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"fetched_at": time.time(), "checksums": _checksums}, indent=1))
+        print(f"  Cached checksums for {len(_checksums)} archives")
+        return _checksums
+
+
 def get_md5_for_archive(year: int, month: int) -> str | None:
-    """Fetch MD5 hash from the archive page for verification."""
+    """Expected MD5 of an archive, refreshing the cached index once if it is not listed."""
+    filename = f"{year:04d}-{month:02d}.zip"
+    checksums = load_checksums()
+    if filename not in checksums and not _checksums_refreshed:
+        checksums = load_checksums(refresh=True)
+    return checksums.get(filename)
+
+
+# Segments share one file descriptor. Where os.pread/os.pwrite are missing
+# (Windows), fall back to seek plus read/write, holding a lock so that no other
+# thread moves the file offset in between
+_seek_lock = threading.Lock()
+
+
+def _pread(fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+def _pwrite(fd: int, data: bytes, offset: int) -> int:
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
+
+
+class StreamingHasher:
+    """
+    MD5 over a file being written by parallel segments. Bytes are hashed as soon
+    as everything before them has landed, so no full re-read is needed at the end.
+    """
+
+    def __init__(self, fd: int, segments: list[list[int]]):
+        self.fd = fd
+        self.segments = segments
+        self.cursor = 0
+        self.md5 = hashlib.md5()
+        self._lock = threading.Lock()
+
+    def advance(self):
+        with self._lock:
+            for start, end, written in self.segments:
+                if self.cursor >= end + 1:
+                    continue
+                if self.cursor < start:
+                    break
+                while self.cursor < written:
+                    data = _pread(self.fd, min(STREAM_CHUNK_SIZE, written - self.cursor), self.cursor)
+                    self.md5.update(data)
+                    self.cursor += len(data)
+                if written <= end:
+                    break
+
+    def hexdigest(self) -> str:
+        self.advance()
+        return self.md5.hexdigest()
+
+
+def _probe(url: str) -> tuple[int, bool] | None:
+    """(size, supports Range) of url, or None if it does not exist."""
+    response = get_session().head(url, allow_redirects=True, timeout=30)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    size = int(response.headers.get("content-length", 0))
+    return size, response.headers.get("accept-ranges", "").lower() == "bytes"
+
+
+def _plan_segments(size: int, segments: int) -> list[list[int]]:
+    """[start, end (inclusive), next byte to write] for each Range segment."""
+    step = -(-size // segments)
+    return [[start, min(start + step, size) - 1, start] for start in range(0, size, step)]
+
+
+def _download_segment(url, fd, segment, hasher, bucket, pbar, pbar_lock):
+    start, end, written = segment
+    if written > end:
+        return
+    headers = {"Range": f"bytes={written}-{end}"}
+    with get_session().get(url, headers=headers, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise requests.RequestException(f"Server ignored Range request ({response.status_code})")
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if not chunk:
+                continue
+            bucket.consume(len(chunk))
+            _pwrite(fd, chunk, segment[2])
+            segment[2] += len(chunk)
+            DOWNLOADED_BYTES.inc(len(chunk))
+            with pbar_lock:
+                pbar.update(len(chunk))
+            hasher.advance()
+    if segment[2] <= end:
+        raise requests.RequestException(f"Segment {start}-{end} ended early at byte {segment[2]}")
+
+
+def _download_segmented(url, temp_filepath, size, segments, bucket, pbar):
+    """Fetch url into temp_filepath as parallel Range segments. Returns the MD5."""
+    state_path = temp_filepath.with_name(temp_filepath.name + ".json")
+    plan = _plan_segments(size, segments)
+    if temp_filepath.exists() and state_path.exists():
+        saved = json.loads(state_path.read_text())
+        if saved.get("size") == size:
+            plan = saved["segments"]
+            done = sum(written - start for start, _, written in plan)
+            print(f"  Resuming from {done / 1024 / 1024:.1f} MB...")
+            pbar.update(done)
+
+    fd = os.open(temp_filepath, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+    pbar_lock = threading.Lock()
     try:
-        response = requests.get(f"{BASE_URL}/", timeout=30)
+        os.ftruncate(fd, size)
+        hasher = StreamingHasher(fd, plan)
+        with ThreadPoolExecutor(max_workers=len(plan)) as executor:
+            futures = [executor.submit(_download_segment, url, fd, segment, hasher, bucket, pbar, pbar_lock)
+                       for segment in plan]
+            errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            raise errors[0]
+        return hasher.hexdigest()
+    finally:
+        os.close(fd)
+        # Keep per-segment progress for resuming; drop it once the file is complete
+        if all(written > end for _, end, written in plan):
+            state_path.unlink(missing_ok=True)
+        else:
+            state_path.write_text(json.dumps({"size": size, "segments": plan}))
+
+
+def _download_single(url, temp_filepath, bucket, pbar):
+    """Fetch url over one connection, resuming a partial file. Returns the MD5."""
+    md5 = hashlib.md5()
+    resume_byte = 0
+    headers = {}
+    if temp_filepath.exists():
+        resume_byte = temp_filepath.stat().st_size
+        headers["Range"] = f"bytes={resume_byte}-"
+        print(f"  Resuming from {resume_byte / 1024 / 1024:.1f} MB...")
+        with open(temp_filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                md5.update(chunk)
+
+    with get_session().get(url, headers=headers, stream=True, timeout=30) as response:
         response.raise_for_status()
-        search_text = f"{year:04d}-{month:02d}.zip"
-        content = response.text
-
-        if search_text in content:
-            idx = content.find(search_text)
-            section = content[idx:idx + 500]
-            lines = section.split('\n')
-            for line in lines[1:5]:
-                line = line.strip()
-                if len(line) == 32 and all(c in '0123456789abcdef' for c in line):
-                    return line
-    except requests.RequestException:
-        pass
-    return None
-
-
-def calculate_md5(filepath: Path) -> str:
-    hash_md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-
-def download_archive(year: int, month: int, verify: bool = True, force: bool = False) -> bool:
+        if resume_byte and response.status_code != 206:
+            # Range not honoured: start over
+            md5, resume_byte = hashlib.md5(), 0
+        pbar.reset(total=resume_byte + int(response.headers.get("content-length", 0)))
+        pbar.update(resume_byte)
+
+        with open(temp_filepath, "ab" if resume_byte else "wb") as f:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if chunk:
+                    bucket.consume(len(chunk))
+                    f.write(chunk)
+                    md5.update(chunk)
+                    pbar.update(len(chunk))
+                    DOWNLOADED_BYTES.inc(len(chunk))
+    return md5.hexdigest()
+
+
+def download_archive(year: int, month: int, verify: bool = True, force: bool = False,
+                     segments: int = DEFAULT_SEGMENTS, bucket: TokenBucket = UNLIMITED) -> bool:
     """
     Download a single archive file.
 
@@ -65,6 +322,8 @@ def download_archive(year: int, month: int, verify: bool = True, force: bool = F
         month: Archive month
         verify: Whether to verify MD5 checksum
         force: Force re-download even if file exists
+        segments: Parallel Range requests for files over SEGMENT_MIN_SIZE
+        bucket: Bandwidth limiter shared with other downloads
 
     Returns:
         True if download successful, False otherwise
@@ -83,58 +342,37 @@ def download_archive(year: int, month: int, verify: bool = True, force: bool = F
     print(f"\n📥 Downloading {filename}...")
 
     try:
-        resume_byte = 0
-        headers = {}
-
-        if temp_filepath.exists():
-            resume_byte = temp_filepath.stat().st_size
-            headers["Range"] = f"bytes={resume_byte}-"
-            print(f"  Resuming from {resume_byte / 1024 / 1024:.1f} MB...")
-
-        response = requests.get(url, headers=headers, stream=True, timeout=30)
-
-        if response.status_code == 404:
+        probe = _probe(url)
+        if probe is None:
             print(f"✗ Archive {filename} not found (may not exist yet)")
             return False
-
-        response.raise_for_status()
-
-        total_size = int(response.headers.get("content-length", 0))
-        if resume_byte > 0:
-            total_size += resume_byte
-
-        mode = "ab" if resume_byte > 0 else "wb"
-
-        with open(temp_filepath, mode) as f:
-            with tqdm(
-                total=total_size,
-                initial=resume_byte,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                desc=f"  {filename}",
-                bar_format="{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{rate_fmt}]"
-            ) as pbar:
-                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-
-        temp_filepath.rename(filepath)
+        size, ranges = probe
+
+        with tqdm(
+            total=size,
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            desc=f"  {filename}",
+            bar_format="{desc}: {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{rate_fmt}]"
+        ) as pbar:
+            if ranges and segments > 1 and size >= SEGMENT_MIN_SIZE:
+                actual_md5 = _download_segmented(url, temp_filepath, size, segments, bucket, pbar)
+            else:
+                actual_md5 = _download_single(url, temp_filepath, bucket, pbar)
 
         if verify:
-            print(f"  🔍 Verifying checksum...")
             expected_md5 = get_md5_for_archive(year, month)
             if expected_md5:
-                actual_md5 = calculate_md5(filepath)
-                if actual_md5 == expected_md5:
-                    print(f"  ✓ Checksum verified")
-                else:
+                if actual_md5 != expected_md5:
                     print(f"  ✗ Checksum mismatch! Expected {expected_md5}, got {actual_md5}")
+                    temp_filepath.unlink(missing_ok=True)
                     return False
+                print(f"  ✓ Checksum verified")
             else:
-                print(f"  ⚠ Could not fetch checksum for verification")
+                print(f"  ⚠ No checksum listed for {filename}, skipping verification")
 
+        temp_filepath.rename(filepath)
         print(f"✓ {filename} downloaded successfully")
         return True
 
@@ -149,7 +387,7 @@ def download_latest() -> bool:
     url = f"{BASE_URL}/latest.zip"
 
     try:
-        response = requests.head(url, allow_redirects=True, timeout=30)
+        response = get_session().head(url, allow_redirects=True, timeout=30)
         final_url = response.url
         filename = final_url.split("/")[-1]
 
@@ -165,26 +403,43 @@ def download_latest() -> bool:
         return False
 
 
-def download_range(start_year: int, start_month: int, end_year: int, end_month: int, **kwargs) -> int:
+def download_range(start_year: int, start_month: int, end_year: int, end_month: int,
+                   workers: int = DEFAULT_WORKERS, max_rate: float | None = None, **kwargs) -> int:
     """
-    Download archives for a date range.
+    Download archives for a date range, workers at a time.
+
+    Args:
+        max_rate: Bandwidth cap in bytes/second shared by every connection (None for no cap)
 
     Returns:
         Number of successfully downloaded archives
     """
-    success_count = 0
+    months = []
     current = datetime(start_year, start_month, 1)
     end = datetime(end_year, end_month, 1)
 
     while current <= end:
-        if download_archive(current.year, current.month, **kwargs):
-            success_count += 1
+        months.append((current.year, current.month))
 
         if current.month == 12:
             current = current.replace(year=current.year + 1, month=1)
         else:
             current = current.replace(month=current.month + 1)
 
+    get_session(workers * kwargs.get("segments", DEFAULT_SEGMENTS))
+    if kwargs.get("verify", True):
+        # One index fetch up front instead of one per archive
+        load_checksums()
+
+    bucket = TokenBucket(max_rate)
+
+    success_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download_archive, year, month, bucket=bucket, **kwargs) for year, month in months]
+        for future in as_completed(futures):
+            if future.result():
+                success_count += 1
+
     return success_count
 
 
@@ -207,6 +462,8 @@ Examples:
   python download_archives.py --month 2024-01       # Download January 2024
   python download_archives.py --range 2023-01 2023-12  # Download all of 2023
   python download_archives.py --month 2024-06 --no-verify  # Skip MD5 check
+  python download_archives.py --range 2019-01 2024-12 --workers 4 --max-rate 20
+                                                    # 4 at a time, capped at 20 MB/s
         """
     )
 
@@ -218,6 +475,14 @@ Examples:
 
     parser.add_argument("--no-verify", action="store_true", help="Skip MD5 checksum verification")
     parser.add_argument("--force", action="store_true", help="Force re-download existing files")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Archives downloaded at the same time (with --range)")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS,
+                        help="Parallel Range requests per large archive")
+    parser.add_argument("--max-rate", type=float, metavar="MB_PER_S",
+                        help="Total bandwidth cap across all connections")
+    parser.add_argument("--refresh-checksums", action="store_true",
+                        help="Re-fetch the archive index instead of using the cached checksums")
 
     args = parser.parse_args()
 
@@ -228,6 +493,9 @@ Examples:
     print("=" * 60)
 
     verify = not args.no_verify
+    max_rate = args.max_rate * 1024 * 1024 if args.max_rate else None
+    if verify and args.refresh_checksums:
+        load_checksums(refresh=True)
 
     if args.latest:
         success = download_latest()
@@ -235,14 +503,15 @@ Examples:
 
     elif args.month:
         year, month = parse_date(args.month)
-        success = download_archive(year, month, verify=verify, force=args.force)
+        success = download_archive(year, month, verify=verify, force=args.force, segments=args.segments,
+                                   bucket=TokenBucket(max_rate))
         sys.exit(0 if success else 1)
 
     elif args.range:
         start_year, start_month = parse_date(args.range[0])
         end_year, end_month = parse_date(args.range[1])
-        count = download_range(start_year, start_month, end_year, end_month,
-                               verify=verify, force=args.force)
+        count = download_range(start_year, start_month, end_year, end_month, workers=args.workers,
+                               max_rate=max_rate, verify=verify, force=args.force, segments=args.segments)
         print(f"\n{'=' * 60}")
         print(f"  Downloaded {count} archive(s)")
         print("=" * 60)
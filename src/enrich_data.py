@@ -1,218 +1,210 @@
+import argparse
+import numpy as np
 import pandas as pd
-import requests
 import os
 import time
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def enrich_data():
-    input_file = "data/processed/leeds_street_combined.csv"
+from geocoding_client import RADIUS_TIERS, PostcodesClient, parse_ward_postcode
+from data_quality import compute_manifest, report, validate
+from fetch_wards import load_polling_districts, parse_polling_districts
+from delta_store import baseline, save_changes
+from location_lookup import apply_lookup, lookup_from_map, lookup_positions
+from regions import data_file, get_region
+from schema import read_dataset, report_memory
+from spatial_join import nearest_polygons, points_in_polygons
+
+# Points just outside every polling district (e.g. on a boundary road) are
+# snapped to the nearest one within this distance by the local ward backend.
+WARD_SNAP_DISTANCE_M = 150
+# Postcode lookups shared by every region and run, so a location is only sent to
+# postcodes.io once (neighbouring districts share their border locations)
+ENRICHMENT_CACHE = "data/raw/postcode_lookups.csv"
+CACHE_COLUMNS = ['Latitude', 'Longitude', 'ward', 'pcd', 'radius']
+# Columns this stage writes; only records where they change are saved
+ENRICHED_COLUMNS = ['Ward Name', 'Postcode District', 'Polling District', 'Enrichment Radius']
+
+
+def read_lookups(path):
+    """{(lat, lon): {'ward', 'pcd', 'radius'}} from a file of CACHE_COLUMNS rows."""
+    lookups = pd.read_csv(path, keep_default_na=False, na_values={'radius': ['']},
+                          dtype={'ward': str, 'pcd': str})
+    return {(lat, lon): {'ward': ward, 'pcd': pcd, 'radius': radius}
+            for lat, lon, ward, pcd, radius in lookups[CACHE_COLUMNS].itertuples(index=False, name=None)}
+
+
+def load_enrichment_cache(path=ENRICHMENT_CACHE):
+    """Every location looked up so far, including those postcodes.io has no match for."""
+    return read_lookups(path) if os.path.exists(path) else {}
+
+
+def geocoded_lookups(coords, results, failed):
+    """
+    Cache entries for a reverse_geocode_escalating run over coords: matches with
+    their radius, and locations with no match at any radius as 'Unknown' with a
+    NaN radius, so they are not sent again. Failed requests are left out to be retried.
+    """
+    lookups = {}
+    for key, (item, radius) in results.items():
+        ward, pcd = parse_ward_postcode(item)
+        lookups[key] = {'ward': ward, 'pcd': pcd, 'radius': radius}
+    failed = set(failed)
+    for key in coords:
+        if key not in lookups and key not in failed:
+            lookups[key] = {'ward': "Unknown", 'pcd': "Unknown", 'radius': np.nan}
+    return lookups
+
+
+def save_enrichment_cache(cache, path=ENRICHMENT_CACHE):
+    rows = [(lat, lon, v['ward'], v['pcd'], v['radius']) for (lat, lon), v in cache.items()]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.DataFrame(rows, columns=CACHE_COLUMNS).to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def enrich_data(workers=None, ward_backend="postcodes", region=None):
+    region = region or get_region()
+    input_file = data_file(region, "street_combined.csv")
     
     print(f"Loading {input_file}...")
-    df = pd.read_csv(input_file, low_memory=False)
+    df = read_dataset(input_file)
+    before = baseline(df, ENRICHED_COLUMNS)
     
     unique_coords = df[['Latitude', 'Longitude']].drop_duplicates().dropna()
     print(f"Unique locations to enrich: {len(unique_coords)}")
     
-    coord_map = {}
-    
-    batch_size = 100
-    records = [row for row in unique_coords.itertuples(index=False)]
-    chunks = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    cache = load_enrichment_cache()
+    coords = [c for c in unique_coords.itertuples(index=False, name=None) if c not in cache]
+    print(f"{len(unique_coords) - len(coords)} locations found in the postcode lookup cache.")
     
-    print(f"Fetching data for {len(chunks)} batches using 10 threads...")
+    client = PostcodesClient()
+    print(f"Fetching postcodes for {len(coords)} locations "
+          f"(radius tiers {', '.join(f'{r}m' for r in RADIUS_TIERS)})...")
     
     start_time = time.time()
-    
-    def fetch_batch(chunk):
-        results_map = {}
-        payload = {
-            "geolocations": [
-                {"longitude": r.Longitude, "latitude": r.Latitude, "limit": 1, "radius": 200} 
-                for r in chunk
-            ]
-        }
-        try:
-            resp = requests.post("https://api.postcodes.io/postcodes", json=payload, timeout=20)
-            if resp.status_code == 200:
-                results = resp.json().get('result', [])
-                for i, res in enumerate(results):
-                    lat = chunk[i].Latitude
-                    lon = chunk[i].Longitude
-                    
-                    ward = "Unknown"
-                    pcd = "Unknown"
-                    
-                    if res['result']:
-                         item = res['result'][0]
-                         ward = item.get('admin_ward') or item.get('ward') or "Unknown"
-                         raw_pc = item.get('postcode')
-                         if raw_pc:
-                             pcd = raw_pc.split(' ')[0]
-                    
-                    results_map[(lat, lon)] = {'ward': ward, 'pcd': pcd}
-            return results_map
-        except Exception as e:
-            print(f"Error: {e}")
-            return {}
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [executor.submit(fetch_batch, chunk) for chunk in chunks]
-        
-        for future in tqdm(as_completed(futures), total=len(chunks)):
-            res = future.result()
-            coord_map.update(res)
-            
-
+    results, failed = client.reverse_geocode_escalating(coords) if coords else ({}, [])
+    lookups = geocoded_lookups(coords, results, failed)
+    cache.update(lookups)
+    if lookups:
+        save_enrichment_cache(cache)
+    print(f"{len(lookups) - len(results)} locations have no postcode within {RADIUS_TIERS[-1]}m "
+          f"and are cached as 'Unknown'.")
+    coord_map = {key: cache[key] for key in unique_coords.itertuples(index=False, name=None) if key in cache}
+    
+    client.report()
+    if failed:
+        print(f"WARNING: {len(failed)} locations could not be geocoded after retries "
+              f"and will stay 'Unknown'.")
 
     print(f"Postcode/Ward lookup complete in {time.time() - start_time:.1f}s")
-    print("Starting Polling District enrichment (Bulk Fetch & Local Join)...")
     
-    polling_districts_data = [] # List of (shape, code, ward)
+    district_polys, district_wards, district_codes = [], [], []
     
-    try:
-        url = "https://mapservices.leeds.gov.uk/arcgis/rest/services/Public/Boundary/MapServer/7/query"
-        params = {
-            "where": "1=1",
-            "outFields": "POLLING_DI,WARD",
-            "returnGeometry": "true",
-            "f": "json",
-            "outSR": "4326"
-        }
-        print("Fetching all polling district boundaries...")
-        resp = requests.get(url, params=params, timeout=30)
-        
-        if resp.status_code == 200:
-            data = resp.json()
-            features = data.get("features", [])
-            print(f"Retrieved {len(features)} polling district features.")
-            
-            from shapely.geometry import shape, Point
-            from shapely.prepared import prep
-            
-            for feat in features:
-                attr = feat.get("attributes", {})
-                geom = feat.get("geometry", {})
-                
-                if geom and "rings" in geom:
-                    
-                    poly = None
-                    try:
-                        poly = shape({"type": "Polygon", "coordinates": geom["rings"]})
-                    except:
-                         from shapely.geometry import Polygon
-                         if len(geom["rings"]) > 0:
-                             poly = Polygon(geom["rings"][0], geom["rings"][1:])
-                    
-                    if poly:
-                        polling_districts_data.append({
-                            "poly": poly,
-                            "prepared": prep(poly),
-                            "code": attr.get("POLLING_DI"),
-                            "ward": attr.get("WARD")
-                        })
-        else:
-            print(f"Failed to fetch boundaries: {resp.status_code}")
-            
-    except Exception as e:
-        print(f"Error fetching/parsing polygons: {e}")
+    if region['polling_districts']:
+        print("Starting Polling District enrichment (Bulk Fetch & Local Join)...")
+        try:
+            data = load_polling_districts()
+            if data:
+                district_polys, district_wards, district_codes = parse_polling_districts(data)
+                print(f"Retrieved {len(district_polys)} polling district features.")
+        except Exception as e:
+            print(f"Error fetching/parsing polygons: {e}")
+    else:
+        print(f"No polling district layer for {region['name']}, skipping.")
         
-    print(f"Built {len(polling_districts_data)} spatial objects.")
+    print(f"Built {len(district_polys)} spatial objects.")
     
     print("Performing spatial join...")
-    polling_map = {}
-    
-    hits = 0
-    from shapely.geometry import Point
-    
-    for row in tqdm(unique_coords.itertuples(index=False), total=len(unique_coords), desc="Spatial Join"):
-        pt = Point(row.Longitude, row.Latitude)
-        found = False
+    join_start = time.time()
+    matches = points_in_polygons(
+        unique_coords['Longitude'].values, unique_coords['Latitude'].values,
+        district_polys, workers=workers
+    )
+    matched = matches >= 0
+    hits = int(matched.sum())
         
-        for item in polling_districts_data:
-            if item["prepared"].contains(pt):
-                polling_map[(row.Latitude, row.Longitude)] = item["code"]
-                input_ward = item["ward"]
-                # Optionally use this ward if missing from postcode lookup
-                found = True
-                hits += 1
-                break
+    print(f"Spatial join complete in {time.time() - join_start:.2f}s. Matches: {hits}/{len(unique_coords)}")
+
+    if ward_backend == "local" and len(district_polys) == 0:
+        print("No polling district polygons available, falling back to postcode wards.")
+        ward_backend = "postcodes"
+
+    ward_lookup = None
+    if ward_backend == "local":
+        print("Assigning wards from local polling district polygons...")
+        ward_idx = matches.copy()
+        missing = ward_idx < 0
+        if missing.any():
+            ward_idx[missing] = nearest_polygons(
+                unique_coords['Longitude'].values[missing], unique_coords['Latitude'].values[missing],
+                district_polys, WARD_SNAP_DISTANCE_M
+            )
+            print(f"Snapped {int((ward_idx[missing] >= 0).sum())}/{int(missing.sum())} "
+                  f"unmatched locations within {WARD_SNAP_DISTANCE_M}m.")
         
-    print(f"Spatial join complete. Matches: {hits}/{len(unique_coords)}")
+        has_ward = ward_idx >= 0
+        ward_lookup = unique_coords[has_ward].copy()
+        ward_lookup['Ward Name'] = np.asarray(district_wards, dtype=object)[ward_idx[has_ward]]
 
     print("Applying mappings to main dataset...")
     
-    lats = df['Latitude'].values
-    lons = df['Longitude'].values
-    
-    wards = []
-    pcds = []
-    polling_districts = []
-    
-    count_hit = 0
-    count_miss = 0
-    
-    for lat, lon in zip(lats, lons):
-        val = coord_map.get((lat, lon))
-        ward_val = "Unknown"
-        pcd_val = "Unknown"
-        
-        if val:
-            ward_val = val['ward']
-            pcd_val = val['pcd']
-            count_hit += 1
-        else:
-            count_miss += 1
-            
-        pd_val = polling_map.get((lat, lon), "Unknown")
-        
-        wards.append(ward_val)
-        pcds.append(pcd_val)
-        polling_districts.append(pd_val)
-            
-    df['Ward Name'] = wards
-    df['Postcode District'] = pcds
-    df['Polling District'] = polling_districts
+    location_lookup = lookup_from_map(coord_map, {'Ward Name': 'ward', 'Postcode District': 'pcd',
+                                                  'Enrichment Radius': 'radius'})
+    location_positions = lookup_positions(df, location_lookup)
+    polling_lookup = unique_coords[matched].copy()
+    polling_lookup['Polling District'] = np.asarray(district_codes, dtype=object)[matches[matched]]
+    
+    if ward_lookup is not None:
+        apply_lookup(df, location_lookup, ['Postcode District'], positions=location_positions)
+        count_hit = apply_lookup(df, ward_lookup, ['Ward Name'])
+    else:
+        apply_lookup(df, location_lookup, ['Ward Name', 'Postcode District'], positions=location_positions)
+    
+    # Radius (m) at which postcodes.io matched each location, NaN where nothing matched
+    radii = np.append(location_lookup['Enrichment Radius'].to_numpy(dtype=float), np.nan)
+    df['Enrichment Radius'] = radii[location_positions]
+    if ward_lookup is None:
+        # Cached misses have a lookup entry but no radius
+        count_hit = int(df['Enrichment Radius'].notna().sum())
+    count_miss = len(df) - count_hit
+    apply_lookup(df, polling_lookup, ['Polling District'])
     
     print(f"Applied. Hits: {count_hit}, Misses: {count_miss}")
     
     # Strict Ward Filtering
-    VALID_LEEDS_WARDS = {
-        "Adel & Wharfedale", "Alwoodley", "Ardsley & Robin Hood", "Armley", 
-        "Beeston & Holbeck", "Bramley & Stanningley", "Burmantofts & Richmond Hill", 
-        "Calverley & Farsley", "Chapel Allerton", "Cross Gates & Whinmoor", 
-        "Farnley & Wortley", "Garforth & Swillington", "Gipton & Harehills", 
-        "Guiseley & Rawdon", "Harewood", "Headingley & Hyde Park", "Horsforth", 
-        "Hunslet & Riverside", "Killingbeck & Seacroft", "Kippax & Methley", 
-        "Kirkstall", "Little London & Woodhouse", "Middleton Park", "Moortown", 
-        "Morley North", "Morley South", "Otley & Yeadon", "Pudsey", "Rothwell", 
-        "Roundhay", "Temple Newsam", "Weetwood", "Wetherby"
-    }
-
-    initial_count = len(df)
-    
-    # Identify non-Leeds wards before dropping (excluding Unknown)
-    invalid_wards_df = df[~df['Ward Name'].isin(VALID_LEEDS_WARDS) & (df['Ward Name'] != 'Unknown')]
-    if not invalid_wards_df.empty:
-        print("\n--- Removing Outlier Wards ---")
-        print(invalid_wards_df['Ward Name'].value_counts().to_string())
-        print("------------------------------\n")
-    
-    # Keep Valid Leeds Wards OR Unknown
-    df = df[df['Ward Name'].isin(VALID_LEEDS_WARDS) | (df['Ward Name'] == 'Unknown')]
-    dropped_count = initial_count - len(df)
-    
-    if dropped_count > 0:
-        print(f"Removed {dropped_count} entries outside of valid Leeds wards (kept 'Unknown').")
-    
-    print(f"Saving to {input_file} (overwriting)...")
-    temp_save = input_file + ".tmp"
-    df.to_csv(temp_save, index=False)
+    valid_wards = region['wards']
+    if valid_wards is not None:
+        initial_count = len(df)
+        
+        # Identify wards outside the region before dropping (excluding Unknown)
+        invalid_wards_df = df[~df['Ward Name'].isin(valid_wards) & (df['Ward Name'] != 'Unknown')]
+        if not invalid_wards_df.empty:
+            print("\n--- Removing Outlier Wards ---")
+            print(invalid_wards_df['Ward Name'].value_counts().to_string())
+            print("------------------------------\n")
+        
+        # Keep Valid Wards OR Unknown
+        df = df[df['Ward Name'].isin(valid_wards) | (df['Ward Name'] == 'Unknown')]
+        dropped_count = initial_count - len(df)
+        
+        if dropped_count > 0:
+            print(f"Removed {dropped_count} entries outside of valid {region['name']} wards (kept 'Unknown').")
     
-    if os.path.exists(input_file):
-        os.remove(input_file)
-    os.rename(temp_save, input_file)
+    report_memory(df, "Enriched dataset")
+    print(f"Saving changed records to {input_file}...")
+    save_changes(input_file, df, before, note="enrich_data")
+
+    if region['quality_rules']:
+        print("Checking data quality rules...")
+        report(validate(compute_manifest(df)))
     print("Done.")
 
 if __name__ == "__main__":
-    enrich_data()
+    parser = argparse.ArgumentParser(description="Enrich crime records with ward, postcode and polling district")
+    parser.add_argument("--ward-backend", choices=["postcodes", "local"], default="postcodes",
+                        help="Take wards from postcodes.io or from the local polling district polygons")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes for the spatial join (defaults to all cores for large inputs)")
+    parser.add_argument("--region", default=None, help="Region key (default leeds)")
+    args = parser.parse_args()
+
+    enrich_data(workers=args.workers, ward_backend=args.ward_backend, region=get_region(args.region))
@@ -4,79 +4,134 @@ import time
 import os
 import numpy as np
 
-def fetch_crime_data(start_date, end_date, output_dir="data/raw"):
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+from metrics import STAGE_ROWS, counter
+from regions import BBOX_MARGIN, get_region, in_bbox
+
+MIN_LAT, MAX_LAT, MIN_LON, MAX_LON = get_region()['bbox']
+STEP = 0.02
+
+BASE_URL = "https://data.police.uk/api/crimes-street/all-crime"
+
+GRID_POINTS = counter("fetch_grid_points", "API grid points queried")
+
+
+def month_range(start_date, end_date):
+    return pd.date_range(start=start_date, end=end_date, freq='MS').strftime("%Y-%m").tolist()
+
 
-    MIN_LAT = 53.69
-    MAX_LAT = 53.96
-    MIN_LON = -1.80
-    MAX_LON = -1.29
-    STEP = 0.02
+def month_output_file(date, output_dir="data/raw", region=None):
+    region = region or get_region()
+    return os.path.join(output_dir, f"{region['key']}_crime_{date.replace('-', '_')}.csv")
+
+
+def grid_points(regions=None):
+    """
+    API query points covering every region's box, in lat/lon order. Each region
+    keeps its own STEP grid from its box's corner; coordinates are rounded so
+    points shared by overlapping boxes are queried once.
+    """
+    points = set()
+    for region in regions or [get_region()]:
+        min_lat, max_lat, min_lon, max_lon = region['bbox']
+        lats = np.arange(min_lat, max_lat, STEP).round(4)
+        lons = np.arange(min_lon, max_lon, STEP).round(4)
+        points.update((float(lat), float(lon)) for lat in lats for lon in lons)
+    return sorted(points)
+
+
+def split_by_region(df, regions):
+    """{region key: rows of a raw API frame whose location lies in (or just outside) its box}."""
+    locations = df['location'].map(lambda loc: loc if isinstance(loc, dict) else {})
+    lats = pd.to_numeric(locations.map(lambda loc: loc.get('latitude')), errors='coerce')
+    lons = pd.to_numeric(locations.map(lambda loc: loc.get('longitude')), errors='coerce')
+    return {region['key']: df[in_bbox(region, lats, lons, BBOX_MARGIN)] for region in regions}
+
+
+def fetch_month(date, points=None):
+    """Query every grid point for one month. Returns a de-duplicated DataFrame, or None if empty."""
+    points = points if points is not None else grid_points()
     
-    lats = np.arange(MIN_LAT, MAX_LAT, STEP)
-    lons = np.arange(MIN_LON, MAX_LON, STEP)
+    print(f"Fetching data for {date}...")
+    all_crimes = []
     
-    dates = pd.date_range(start=start_date, end=end_date, freq='MS').strftime("%Y-%m").tolist()
+    count = 0
+    total_points = len(points)
     
-    base_url = "https://data.police.uk/api/crimes-street/all-crime"
+    for lat, lon in points:
+        count += 1
+        GRID_POINTS.inc()
+        if count % 50 == 0:
+            print(f"  Processed {count}/{total_points} grid points...")
+            
+        try:
+            response = requests.get(BASE_URL, params={'lat': lat, 'lng': lon, 'date': date}, timeout=10)
+            
+            if response.status_code == 200:
+                data = response.json()
+                all_crimes.extend(data)
+                STAGE_ROWS.inc(len(data), stage="fetch_api")
+            elif response.status_code == 429:
+                print(f"Rate limited on {date}. Waiting for 5 seconds...")
+                time.sleep(5)
+                response = requests.get(BASE_URL, params={'lat': lat, 'lng': lon, 'date': date}, timeout=10)
+                if response.status_code == 200:
+                     data = response.json()
+                     all_crimes.extend(data)
+                     STAGE_ROWS.inc(len(data), stage="fetch_api")
+            else:
+                print(f"Error {response.status_code} for {date} at {lat},{lon}: {response.text}")
+                
+        except Exception as e:
+            print(f"Exception for {date} at {lat},{lon}: {e}")
+        
+        time.sleep(0.1)
+    
+    if not all_crimes:
+        print(f"No records found for {date}")
+        return None
+    
+    df = pd.DataFrame(all_crimes)
+    initial_len = len(df)
+    if 'id' in df.columns:
+        df = df.drop_duplicates(subset=['id'])
+    elif 'persistent_id' in df.columns:
+        df = df.drop_duplicates(subset=['persistent_id'])
     
-    print(f"Fetching data for {len(dates)} months using grid ({len(lats) * len(lons)} points)...")
+    print(f"Fetched {initial_len} records. Deduplicated to {len(df)} records.")
+    return df
+
+
+def fetch_crime_data(start_date, end_date, output_dir="data/raw", regions=None):
+    """
+    Fetch each month once for all regions: the union of their grids is queried and
+    the results are split into one raw file per region.
+    """
+    regions = regions or [get_region()]
+    
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    dates = month_range(start_date, end_date)
+    grid_size = len(grid_points(regions))
+    
+    print(f"Fetching data for {len(dates)} months using grid ({grid_size} points) "
+          f"for {', '.join(r['name'] for r in regions)}...")
     
     for date in dates:
-        output_file = os.path.join(output_dir, f"leeds_crime_{date.replace('-', '_')}.csv")
+        pending = [r for r in regions if not os.path.exists(month_output_file(date, output_dir, r))]
         
-        if os.path.exists(output_file):
+        if not pending:
             print(f"Skipping {date}, already exists.")
             continue
-            
-        print(f"Fetching data for {date}...")
-        all_crimes = []
-        
-        count = 0
-        total_points = len(lats) * len(lons)
-        
-        for lat in lats:
-            for lon in lons:
-                count += 1
-                if count % 50 == 0:
-                    print(f"  Processed {count}/{total_points} grid points...")
-                    
-                try:
-                    response = requests.get(base_url, params={'lat': lat, 'lng': lon, 'date': date}, timeout=10)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        all_crimes.extend(data)
-                    elif response.status_code == 429:
-                        print(f"Rate limited on {date}. Waiting for 5 seconds...")
-                        time.sleep(5)
-                        response = requests.get(base_url, params={'lat': lat, 'lng': lon, 'date': date}, timeout=10)
-                        if response.status_code == 200:
-                             all_crimes.extend(response.json())
-                    else:
-                        print(f"Error {response.status_code} for {date} at {lat},{lon}: {response.text}")
-                        
-                except Exception as e:
-                    print(f"Exception for {date} at {lat},{lon}: {e}")
-                
-                time.sleep(0.1)
         
-        if all_crimes:
-            df = pd.DataFrame(all_crimes)
-            initial_len = len(df)
-            if 'id' in df.columns:
-                df = df.drop_duplicates(subset=['id'])
-            elif 'persistent_id' in df.columns:
-                df = df.drop_duplicates(subset=['persistent_id'])
-            
-            print(f"Fetched {initial_len} records. Deduplicated to {len(df)} records.")
-            
-            df.to_csv(output_file, index=False)
-            print(f"Saved to {output_file}")
-        else:
-            print(f"No records found for {date}")
+        df = fetch_month(date, grid_points(pending))
+        if df is None:
+            continue
+        for region in pending:
+            output_file = month_output_file(date, output_dir, region)
+            subset = split_by_region(df, [region])[region['key']] if len(regions) > 1 else df
+            subset.to_csv(output_file, index=False)
+            print(f"Saved {len(subset)} records to {output_file}")
 
 if __name__ == "__main__":
     START_DATE = "2022-11" 
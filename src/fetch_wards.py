@@ -1,115 +1,202 @@
+import argparse
 import requests
 import json
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
 from shapely.geometry import shape, mapping
-from shapely.ops import unary_union
-from shapely.validation import make_valid
 
-def fetch_wards():
-    # Leeds City Council MapServer - Polling Districts Layer
-    url = "https://mapservices.leeds.gov.uk/arcgis/rest/services/Public/Boundary/MapServer/7/query"
+from topojson_export import write_topojson_levels
+
+# Leeds City Council MapServer - Polling Districts Layer
+POLLING_DISTRICTS_URL = "https://mapservices.leeds.gov.uk/arcgis/rest/services/Public/Boundary/MapServer/7/query"
+POLLING_DISTRICTS_CACHE = "data/raw/leeds_polling_districts.geojson"
+
+# Fragments are grown by this much before the union to close slivers, then shrunk back.
+DISSOLVE_BUFFER = 0.0001
+
+# Coarser arcs for zoomed-out views; the dashboard picks a file by zoom level.
+BOUNDARY_LEVELS = [
+    {"name": "low", "tolerance": 0.0005, "max_zoom": 11},
+    {"name": "medium", "tolerance": 0.0002, "max_zoom": 13},
+    {"name": "high", "tolerance": 0.00005, "max_zoom": 18}
+]
+
+
+def normalise_ward_name(ward_name):
+    # FIX: Align MapServer name with Crime Data name
+    if ward_name == "Crossgates & Whinmoor":
+        return "Cross Gates & Whinmoor"
+    return ward_name
+
+
+def load_polling_districts(refresh=False):
+    """
+    Return the raw polling district GeoJSON, fetching it from the MapServer only
+    when there is no cached copy (or refresh is requested).
+    """
+    if os.path.exists(POLLING_DISTRICTS_CACHE) and not refresh:
+        print(f"Using cached polling districts from {POLLING_DISTRICTS_CACHE}")
+        with open(POLLING_DISTRICTS_CACHE, 'r') as f:
+            return json.load(f)
+
     params = {
         "where": "1=1",
-        "outFields": "WARD",
+        "outFields": "WARD,POLLING_DI",
         "returnGeometry": "true",
-        "f": "geojson", 
+        "f": "geojson",
         "outSR": "4326"
     }
-    
-    output_file = "dashboard/data/leeds_wards.geojson"
-    print(f"Fetching boundaries from {url}...")
-    
+
+    print(f"Fetching boundaries from {POLLING_DISTRICTS_URL}...")
     try:
-        resp = requests.get(url, params=params, timeout=60)
+        resp = requests.get(POLLING_DISTRICTS_URL, params=params, timeout=60)
+        resp.raise_for_status()
         data = resp.json()
     except Exception as e:
         print(f"Error fetching data: {e}")
-        return
+        return None
 
-    features = data.get('features', [])
-    if not features:
-        # Fallback to check if it returned regular JSON instead of GeoJSON
-        if 'features' in data:
-            print("Received JSON features (not GeoJSON), requiring conversion...")
-            pass
-        else:
-            print("No features found in response.")
-            return
-
-    print(f"Retrieved {len(features)} polling district fragments.")
-    
-    # Group by WARD
-    ward_polys = {}
-    
-    for feat in features:
+    if not data.get('features'):
+        print("No features found in response.")
+        return None
+
+    os.makedirs(os.path.dirname(POLLING_DISTRICTS_CACHE), exist_ok=True)
+    temp_path = POLLING_DISTRICTS_CACHE + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, POLLING_DISTRICTS_CACHE)
+    print(f"Cached raw response to {POLLING_DISTRICTS_CACHE}")
+    return data
+
+
+def parse_polling_districts(data):
+    """Turn the GeoJSON response into parallel arrays of valid geometries, wards and codes."""
+    geoms = []
+    wards = []
+    codes = []
+
+    for feat in data.get('features', []):
         props = feat.get('properties', {})
         if not props and 'attributes' in feat:
             props = feat['attributes']
-            
+
         ward_name = props.get('WARD')
-        
-        if not ward_name:
+        geom_data = feat.get('geometry')
+        if not ward_name or not geom_data:
             continue
-            
-        # FIX: Align MapServer name with Crime Data name
-        if ward_name == "Crossgates & Whinmoor":
-            ward_name = "Cross Gates & Whinmoor"
-            
+
         try:
-            geom_data = feat.get('geometry')
-            if not geom_data:
-                continue
-            
-            poly = shape(geom_data)
-            if not poly.is_valid:
-                poly = make_valid(poly)
-                
-            if ward_name not in ward_polys:
-                ward_polys[ward_name] = []
-            ward_polys[ward_name].append(poly)
+            geoms.append(shape(geom_data))
         except Exception as e:
             print(f"Error parsing geometry for {ward_name}: {e}")
             continue
 
-    print(f"Aggregating into {len(ward_polys)} unique wards...")
-    
+        wards.append(normalise_ward_name(ward_name))
+        codes.append(props.get('POLLING_DI'))
+
+    geoms = shapely.make_valid(np.array(geoms, dtype=object))
+    return geoms, np.array(wards, dtype=object), np.array(codes, dtype=object)
+
+
+def _union_wkb(wkbs):
+    """Process-pool worker: union one ward's buffered fragments, passed as WKB."""
+    return shapely.to_wkb(shapely.union_all(shapely.from_wkb(wkbs)))
+
+
+def dissolve_wards(geoms, ward_names, workers=None):
+    """
+    Dissolve polling district fragments into one shape per ward.
+    Buffering, validity repair and erosion run as Shapely array operations over
+    every fragment at once; the per-ward unions optionally fan out to processes.
+    """
+    buffered = shapely.buffer(geoms, DISSOLVE_BUFFER)
+
+    order = np.argsort(ward_names, kind="stable")
+    wards, starts = np.unique(ward_names[order], return_index=True)
+    groups = np.split(buffered[order], starts[1:])
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_union_wkb, [shapely.to_wkb(g) for g in groups])
+            unified = shapely.from_wkb(np.array(list(results), dtype=object))
+    else:
+        unified = np.array([shapely.union_all(g) for g in groups], dtype=object)
+
+    eroded = shapely.buffer(unified, -DISSOLVE_BUFFER)
+    return wards, eroded
+
+
+def fetch_wards(refresh=False, workers=None):
+    output_file = "dashboard/data/leeds_wards.geojson"
+    topojson_dir = "dashboard/data"
+
+    data = load_polling_districts(refresh=refresh)
+    if data is None:
+        return
+
+    geoms, ward_names, codes = parse_polling_districts(data)
+    print(f"Retrieved {len(geoms)} polling district fragments.")
+
+    start_time = time.time()
+    print(f"Aggregating into {len(np.unique(ward_names))} unique wards...")
+    wards, eroded = dissolve_wards(geoms, ward_names, workers=workers)
+    simplified = shapely.simplify(eroded, 0.0001, preserve_topology=True)
+    print(f"Dissolve complete in {time.time() - start_time:.2f}s")
+
     final_features = []
-    
-    for ward, polys in ward_polys.items():
-        try:
-            buffered_polys = [p.buffer(0.0001) for p in polys]
-            
-            unified_poly = unary_union(buffered_polys)
-            
-            eroded_poly = unified_poly.buffer(-0.0001)
-            
-            simplified_poly = eroded_poly.simplify(0.0001, preserve_topology=True)
-            
-            final_features.append({
-                "type": "Feature",
-                "properties": {
-                    "WARD_NAME": ward
-                },
-                "geometry": mapping(simplified_poly)
-            })
-        except Exception as e:
-            print(f"Error dissolving ward {ward}: {e}")
+    ward_features = []
+
+    for ward, full_poly, simplified_poly in zip(wards, eroded, simplified):
+        if full_poly is None or full_poly.is_empty:
+            print(f"Error dissolving ward {ward}: empty geometry")
+            continue
+
+        ward_features.append(({"WARD_NAME": ward}, full_poly))
+        final_features.append({
+            "type": "Feature",
+            "properties": {
+                "WARD_NAME": ward
+            },
+            "geometry": mapping(simplified_poly)
+        })
+
+    district_features = [
+        ({"POLLING_DI": code, "WARD_NAME": ward}, poly)
+        for poly, ward, code in zip(geoms, ward_names, codes)
+    ]
 
     geojson = {
         "type": "FeatureCollection",
         "name": "Leeds Wards",
         "features": final_features
     }
-    
+
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
+
     with open(output_file, 'w') as f:
         json.dump(geojson, f)
-        
+
     print(f"Successfully saved {len(final_features)} wards to {output_file}")
     file_size_kb = os.path.getsize(output_file) / 1024
     print(f"File size: {file_size_kb:.2f} KB")
 
+    print("Writing quantised TopoJSON for wards and polling districts...")
+    index_path = write_topojson_levels(
+        {"wards": ward_features, "polling_districts": district_features},
+        BOUNDARY_LEVELS, topojson_dir, "leeds_boundaries"
+    )
+    print(f"Boundary index saved to {index_path}")
+
 if __name__ == "__main__":
-    fetch_wards()
+    parser = argparse.ArgumentParser(description="Build Leeds ward boundaries from polling districts")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-fetch the polling districts instead of using the cached response")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Dissolve wards across this many processes")
+    args = parser.parse_args()
+
+    fetch_wards(refresh=args.refresh, workers=args.workers)
@@ -1,45 +1,25 @@
 import pandas as pd
-import requests
 import time
-import os
-from shapely.geometry import shape, Point
-from shapely.prepared import prep
-import json
+
+from boundary_index import BoundaryIndex
+from delta_store import baseline, save_changes
+from regions import get_region, load_boundary
+from schema import add_categories, read_dataset
 
 def filter_leeds_locations():
     file_path = "data/processed/leeds_street_combined.csv"
     
     print(f"Loading {file_path}...")
-    df = pd.read_csv(file_path, low_memory=False)
-    
-    print("Fetching Leeds District boundary from OpenStreetMap...")
-    headers = {'User-Agent': 'LeedsCrimeAnalysis/1.0 (internal research tool)'}
-    url = "https://nominatim.openstreetmap.org/search?q=Leeds,+West+Yorkshire,+United+Kingdom&polygon_geojson=1&format=json"
+    df = read_dataset(file_path)
+    before = baseline(df, ['LSOA name'])
     
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        leeds_poly = None
-        for item in data:
-            if item.get('geojson') and item.get('type') == 'administrative':
-                leeds_poly = shape(item['geojson'])
-                break
-        
-        if not leeds_poly and data:
-            leeds_poly = shape(data[0]['geojson'])
-            
-        if not leeds_poly:
-            raise Exception("No GeoJSON found in OSM response")
-            
-        print("Leeds boundary fetched successfully.")
-        
-    except Exception as e:
-        print(f"Error fetching boundary: {e}")
+    print("Loading Leeds District boundary...")
+    leeds_poly = load_boundary(get_region("leeds"))
+    if leeds_poly is None:
         return
+    print("Leeds boundary loaded successfully.")
 
-    prepared_poly = prep(leeds_poly)
+    boundary = BoundaryIndex(leeds_poly)
 
     target_mask = df['LSOA name'].isin(["Leeds (Unspecified)", "Leeds (Imputed from Grid)"])
     items_to_check = df[target_mask]
@@ -56,25 +36,12 @@ def filter_leeds_locations():
     print("Performing local point-in-polygon check...")
     start_time = time.time()
     
-    results = {}
-    valid_count = 0
-    
-    for idx, row in unique_coords.iterrows():
-        lat = row['Latitude']
-        lon = row['Longitude']
-        
-        if pd.isna(lat) or pd.isna(lon):
-            results[(lat, lon)] = False
-            continue
-            
-        point = Point(lon, lat)
-        is_inside = prepared_poly.contains(point)
-        results[(lat, lon)] = is_inside
-        if is_inside:
-            valid_count += 1
+    inside = boundary.contains_xy(unique_coords['Longitude'].to_numpy(), unique_coords['Latitude'].to_numpy())
+    results = dict(zip(unique_coords.itertuples(index=False, name=None), inside))
+    valid_count = int(inside.sum())
             
     end_time = time.time()
-    print(f"Verification complete in {end_time - start_time:.2f} seconds.")
+    print(f"Verification complete in {end_time - start_time:.2f} seconds ({boundary.describe()}).")
     print(f"Valid Leeds locations: {valid_count} ({valid_count/len(unique_coords)*100:.1f}%)")
     
     target_indices = df[target_mask].index
@@ -96,6 +63,7 @@ def filter_leeds_locations():
     df_clean = df.drop(indices_to_drop)
     
     print(f"Updating {len(indices_to_update)} verified records...")
+    df_clean['LSOA name'] = add_categories(df_clean['LSOA name'], ['Leeds (Verified)'])
     df_clean.loc[indices_to_update, 'LSOA name'] = 'Leeds (Verified)'
     
     initial_count = len(df)
@@ -104,7 +72,7 @@ def filter_leeds_locations():
     print(f"Final records: {final_count}")
     print(f"Removed: {initial_count - final_count}")
 
-    df_clean.to_csv(file_path, index=False)
+    save_changes(file_path, df_clean, before, note="filter_leeds_locations")
     print(f"Saved cleaned data to {file_path}")
 
 if __name__ == "__main__":
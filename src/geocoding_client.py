@@ -0,0 +1,236 @@
+"""
+Shared batch client for postcodes.io reverse geocoding.
+
+- One pooled keep-alive session for every batch instead of a new TLS connection each time
+- AIMD concurrency: grows by roughly one request per round trip while latency is healthy,
+  backs off multiplicatively on 429s and slow responses
+- Failed batches are retried with exponential backoff (honouring Retry-After) and any
+  that still fail are reported back rather than silently becoming 'Unknown'
+- Radius escalation resolves every point in one pass, widening the search only for
+  points the previous tier could not match
+- Per-batch latency histogram printed at the end of a run
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from metrics import STAGE_ROWS, counter, gauge
+
+POSTCODES_URL = "https://api.postcodes.io/postcodes"
+BATCH_SIZE = 100
+# Search radii in metres, tried in order for points still unresolved at the previous tier
+RADIUS_TIERS = (200, 500, 1000, 2000)
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0]
+
+CONCURRENCY_LIMIT = gauge("geocoding_concurrency_limit", "Current AIMD cap on in-flight postcodes.io batches")
+IN_FLIGHT = gauge("geocoding_in_flight", "postcodes.io batches currently in flight")
+RETRIES = counter("geocoding_retries", "postcodes.io batch retries")
+THROTTLED = counter("geocoding_throttled", "postcodes.io responses with HTTP 429")
+FAILED_POINTS = counter("geocoding_failed_points", "Points whose batch failed after every retry")
+
+
+class GeocodingError(Exception):
+    pass
+
+
+class AdaptiveLimiter:
+    """Additive-increase / multiplicative-decrease cap on in-flight requests."""
+
+    def __init__(self, initial=4, minimum=1, maximum=32, target_latency=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.peak = initial
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            IN_FLIGHT.set(self.in_flight)
+
+    def release(self, latency=None, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None and latency > self.target_latency:
+                self.limit = max(self.minimum, self.limit * 0.75)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.peak = max(self.peak, int(self.limit))
+            IN_FLIGHT.set(self.in_flight)
+            CONCURRENCY_LIMIT.set(int(self.limit))
+            self._cond.notify_all()
+
+
+def parse_ward_postcode(item):
+    """Extract (ward, postcode district) from a postcodes.io result, 'Unknown' when absent."""
+    if not item:
+        return "Unknown", "Unknown"
+    ward = item.get('admin_ward') or item.get('ward') or "Unknown"
+    raw_pc = item.get('postcode')
+    pcd = raw_pc.split(' ')[0] if raw_pc else "Unknown"
+    return ward, pcd
+
+
+class PostcodesClient:
+    def __init__(self, max_concurrency=32, initial_concurrency=4, max_retries=5,
+                 backoff=1.0, timeout=20, target_latency=2.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = AdaptiveLimiter(initial_concurrency, 1, max_concurrency, target_latency)
+        self.max_concurrency = max_concurrency
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+
+        self.latencies = []
+        self.retries = 0
+        self.throttled = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, latency, retried=False, throttled=False):
+        with self._stats_lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.retries += int(retried)
+            self.throttled += int(throttled)
+        RETRIES.inc(int(retried))
+        THROTTLED.inc(int(throttled))
+
+    def _post_batch(self, chunk, radius, limit):
+        payload = {
+            "geolocations": [
+                {"longitude": lon, "latitude": lat, "limit": limit, "radius": radius}
+                for lat, lon in chunk
+            ]
+        }
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._record(None, retried=True)
+
+            self.limiter.acquire()
+            start = time.perf_counter()
+            throttled = False
+            latency = None
+            try:
+                resp = self.session.post(POSTCODES_URL, json=payload, timeout=self.timeout)
+                latency = time.perf_counter() - start
+
+                if resp.status_code == 200:
+                    self._record(latency)
+                    return resp.json().get('result', [])
+
+                throttled = resp.status_code == 429
+                last_error = f"HTTP {resp.status_code}"
+                retry_after = resp.headers.get("Retry-After")
+            except requests.RequestException as e:
+                last_error = str(e)
+                retry_after = None
+            finally:
+                self.limiter.release(latency, throttled)
+
+            if throttled:
+                self._record(None, throttled=True)
+
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+            time.sleep(delay)
+
+        raise GeocodingError(f"Batch failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def reverse_geocode(self, coords, radius, limit=1, desc="Geocoding"):
+        """
+        Look up the nearest postcode for each (lat, lon) within radius metres.
+        Returns ({(lat, lon): result item or None}, [coords of batches that failed]).
+        """
+        coords = list(coords)
+        chunks = [coords[i:i + BATCH_SIZE] for i in range(0, len(coords), BATCH_SIZE)]
+
+        results = {}
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {executor.submit(self._post_batch, chunk, radius, limit): chunk for chunk in chunks}
+
+            for future in tqdm(as_completed(futures), total=len(chunks), desc=desc):
+                chunk = futures[future]
+                try:
+                    batch = future.result()
+                except GeocodingError as e:
+                    print(f"Error: {e}")
+                    failed.extend(chunk)
+                    FAILED_POINTS.inc(len(chunk))
+                    continue
+
+                STAGE_ROWS.inc(len(chunk), stage="geocode")
+                for (lat, lon), res in zip(chunk, batch):
+                    matches = res.get('result') if res else None
+                    results[(lat, lon)] = matches[0] if matches else None
+
+        return results, failed
+
+    def reverse_geocode_escalating(self, coords, radii=RADIUS_TIERS, limit=1):
+        """
+        Resolve each (lat, lon) at the smallest radius in radii that yields a match,
+        re-querying only the still-unresolved points at each wider tier. Points whose
+        batch failed are retried once at the same tier rather than widened, since a
+        failed request says nothing about whether a closer postcode exists.
+        Returns ({(lat, lon): (result item, radius)}, [coords whose lookup failed at any tier]).
+        """
+        resolved = {}
+        pending = list(coords)
+        failed = []
+
+        for radius in radii:
+            if not pending:
+                break
+
+            results, tier_failed = self.reverse_geocode(pending, radius, limit, desc=f"Radius {radius}m")
+            if tier_failed:
+                retried, tier_failed = self.reverse_geocode(tier_failed, radius, limit,
+                                                            desc=f"Radius {radius}m retry")
+                results.update(retried)
+            for key, item in results.items():
+                if item is not None:
+                    resolved[key] = (item, radius)
+
+            failed.extend(tier_failed)
+            gave_up = set(tier_failed)
+            pending = [c for c in pending if c not in resolved and c not in gave_up]
+            print(f"  {radius}m: {len(resolved)} resolved, {len(pending)} remaining, {len(failed)} failed")
+
+        return resolved, failed
+
+    def report(self):
+        print(f"Geocoding: {len(self.latencies)} batches, {self.retries} retries, "
+              f"{self.throttled} throttled, peak concurrency {self.limiter.peak}")
+        if not self.latencies:
+            return
+
+        latencies = np.array(self.latencies)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"  Latency p50 {p50:.2f}s, p95 {p95:.2f}s, p99 {p99:.2f}s")
+
+        counts, _ = np.histogram(latencies, bins=[0] + LATENCY_BUCKETS + [np.inf])
+        labels = [f"<={b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        for label, count in zip(labels, counts):
+            if count:
+                print(f"  {label:>8}: {count}")
@@ -0,0 +1,232 @@
+"""
+Join the archive outcomes onto the street crimes.
+
+combine_leeds_data writes every outcome event of the archive months to
+<region>_outcomes_combined.csv, one row per Crime ID and outcome month. The
+street files only carry 'Last outcome category' as it stood when their archive
+edition was published, so this stage keeps a compact hash index of the events
+in data/processed/<region>_outcome_index/: one .npz per outcome month holding
+the 64-bit hash of each Crime ID and an int16 outcome code (10 bytes an event).
+
+Months whose checksum in the outcomes file's statistics manifest (see
+data_quality) matches the index are not read again. The file is streamed in
+chunks and only rows of new or changed months are kept, so refreshing the
+outcomes costs a pass over the changed months, not a reload of every event.
+
+The master dataset then gets, with one sorted search for all rows:
+- 'Last outcome category': the most recent outcome, where the crime has any
+- 'Outcome timeline': every outcome as "YYYY-MM: outcome", oldest first
+Only the records whose outcomes changed are written, as a delta_store patch.
+
+    python src/join_outcomes.py [--region leeds] [--rebuild]
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_quality import NO_MONTH, ensure_manifest
+from delta_store import baseline, fingerprint, save_changes
+from regions import data_file, get_region
+from schema import add_categories, month_codes, month_labels, read_dataset
+
+OUTCOMES_NAME = "outcomes_combined.csv"
+DATASET_NAME = "street_combined.csv"
+INDEX_NAME = "outcome_index"
+STATE_FILE = "state.json"
+INDEX_VERSION = 1
+CHUNK_ROWS = 250_000
+
+OUTCOME_COLUMN = 'Last outcome category'
+TIMELINE_COLUMN = 'Outcome timeline'
+TIMELINE_SEPARATOR = " | "
+
+
+def crime_keys(ids):
+    """uint64 hash of each Crime ID. Collisions are ~1e-8 likely even at a million IDs."""
+    values = pd.Series(ids, dtype=object).fillna("").to_numpy(dtype=object)
+    return pd.util.hash_array(values, categorize=True)
+
+
+def index_dir(region):
+    return data_file(region, INDEX_NAME)
+
+
+def partition_path(directory, month):
+    return os.path.join(directory, f"{month}.npz")
+
+
+def load_state(directory):
+    """{'outcomes': code -> outcome type, 'months': {month: checksum}, 'dataset': signature}."""
+    path = os.path.join(directory, STATE_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state.get('version') == INDEX_VERSION:
+            return state
+    return {'version': INDEX_VERSION, 'outcomes': [], 'months': {}, 'dataset': None}
+
+
+def save_state(state, directory):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def encode_outcomes(labels, vocabulary):
+    """int16 codes of labels in vocabulary, appending outcome types it has not seen."""
+    vocabulary.extend(sorted(pd.Index(pd.unique(labels)).difference(vocabulary)))
+    return pd.Index(vocabulary).get_indexer(labels).astype(np.int16)
+
+
+def stream_months(path, months, chunk_rows=CHUNK_ROWS):
+    """{month: frame of its Crime ID and Outcome type rows}, reading path in chunks."""
+    parts = {month: [] for month in months}
+    columns = ['Crime ID', 'Month', 'Outcome type']
+    for chunk in pd.read_csv(path, usecols=columns, dtype=str, chunksize=chunk_rows):
+        chunk = chunk[chunk['Month'].isin(parts) & chunk['Crime ID'].notna() & chunk['Outcome type'].notna()]
+        for month, rows in chunk.groupby('Month', sort=False):
+            parts[month].append(rows)
+    return {month: pd.concat(frames) if frames else pd.DataFrame(columns=columns)
+            for month, frames in parts.items()}
+
+
+def write_partition(directory, month, keys, outcomes):
+    path = partition_path(directory, month)
+    with open(path + ".tmp", 'wb') as f:
+        np.savez(f, keys=keys, outcomes=outcomes)
+    os.replace(path + ".tmp", path)
+
+
+def update_index(region, rebuild=False):
+    """
+    Re-index the outcome months that are new or changed since the last run.
+    Returns the index state and whether any month changed.
+    """
+    outcomes_file = data_file(region, OUTCOMES_NAME)
+    directory = index_dir(region)
+    os.makedirs(directory, exist_ok=True)
+
+    state = load_state(directory)
+    if rebuild:
+        for path in glob.glob(os.path.join(directory, "*.npz")):
+            os.remove(path)
+        state = {'version': INDEX_VERSION, 'outcomes': [], 'months': {}, 'dataset': None}
+
+    checksums = {month: stats['checksum'] for month, stats in ensure_manifest(outcomes_file)['months'].items()
+                 if month != NO_MONTH}
+    changed = sorted(m for m, checksum in checksums.items() if state['months'].get(m) != checksum)
+    removed = sorted(set(state['months']) - set(checksums))
+    print(f"Outcome months - changed: {len(changed)}, removed: {len(removed)}, "
+          f"unchanged: {len(checksums) - len(changed)}")
+
+    if changed:
+        for month, rows in stream_months(outcomes_file, changed).items():
+            write_partition(directory, month, crime_keys(rows['Crime ID']),
+                            encode_outcomes(rows['Outcome type'], state['outcomes']))
+    for month in removed:
+        if os.path.exists(partition_path(directory, month)):
+            os.remove(partition_path(directory, month))
+        del state['months'][month]
+
+    state['months'].update({month: checksums[month] for month in changed})
+    state['months'] = dict(sorted(state['months'].items()))
+    save_state(state, directory)
+    return state, bool(changed or removed)
+
+
+def load_index(directory, state):
+    """Every indexed event as (crime keys, month codes, outcome codes) arrays."""
+    keys, months, outcomes = [], [], []
+    for month in state['months']:
+        with np.load(partition_path(directory, month)) as part:
+            keys.append(part['keys'])
+            outcomes.append(part['outcomes'])
+        months.append(np.full(len(keys[-1]), month_codes([month])[0], dtype=np.int32))
+    if not keys:
+        return np.array([], dtype=np.uint64), np.array([], dtype=np.int32), np.array([], dtype=np.int16)
+    return np.concatenate(keys), np.concatenate(months), np.concatenate(outcomes)
+
+
+def attach_outcomes(df, keys, months, outcomes, vocabulary):
+    """
+    Set the latest outcome and the outcome timeline of every row of df whose
+    Crime ID has indexed events. Returns the number of rows matched.
+    """
+    if TIMELINE_COLUMN not in df.columns:
+        df[TIMELINE_COLUMN] = pd.Series(np.nan, index=df.index, dtype=object)
+    if not len(keys) or 'Crime ID' not in df.columns:
+        return 0
+
+    # Group events by crime, oldest month first; lexsort is stable so same-month
+    # events keep their order in the outcomes file
+    order = np.lexsort((months, keys))
+    keys, months, outcomes = keys[order], months[order], outcomes[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    crimes = keys[starts]
+
+    row_keys = crime_keys(df['Crime ID'])
+    positions = np.minimum(np.searchsorted(crimes, row_keys), len(crimes) - 1)
+    matched = df['Crime ID'].notna().to_numpy() & (crimes[positions] == row_keys)
+    groups = positions[matched]
+
+    vocabulary = np.asarray(vocabulary, dtype=object)
+    latest = vocabulary[outcomes[ends[groups] - 1]]
+    if OUTCOME_COLUMN in df.columns:
+        df[OUTCOME_COLUMN] = add_categories(df[OUTCOME_COLUMN], latest)
+    else:
+        df[OUTCOME_COLUMN] = pd.Series(np.nan, index=df.index, dtype=object)
+    df.loc[matched, OUTCOME_COLUMN] = latest
+
+    # Build each matched crime's timeline once, however many rows share it
+    wanted = np.unique(groups)
+    event_group = np.repeat(np.arange(len(starts)), ends - starts)
+    events = np.isin(event_group, wanted)
+    text = (pd.Series(month_labels(months[events]), dtype=object) + ": "
+            + pd.Series(vocabulary[outcomes[events]], dtype=object))
+    timelines = text.groupby(event_group[events]).agg(TIMELINE_SEPARATOR.join)
+    df.loc[matched, TIMELINE_COLUMN] = timelines.reindex(groups).to_numpy()
+    return int(matched.sum())
+
+
+def join_outcomes(region=None, rebuild=False):
+    region = region or get_region()
+    outcomes_file = data_file(region, OUTCOMES_NAME)
+    dataset_file = data_file(region, DATASET_NAME)
+    for path in (outcomes_file, dataset_file):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found.")
+            return
+
+    state, changed = update_index(region, rebuild)
+    if not changed and state['dataset'] == fingerprint(dataset_file):
+        print(f"{dataset_file} already has the latest outcomes.")
+        return
+
+    directory = index_dir(region)
+    keys, months, outcomes = load_index(directory, state)
+    print(f"Indexed {len(keys):,} outcome events for {len(np.unique(keys)):,} crimes")
+
+    df = read_dataset(dataset_file)
+    before = baseline(df, [OUTCOME_COLUMN, TIMELINE_COLUMN])
+    matched = attach_outcomes(df, keys, months, outcomes, state['outcomes'])
+    print(f"Attached outcomes to {matched:,} of {len(df):,} records in {dataset_file}")
+    save_changes(dataset_file, df, before, note="join_outcomes")
+
+    state['dataset'] = fingerprint(dataset_file)
+    save_state(state, directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attach the archive outcomes to the street crimes")
+    parser.add_argument("--region", default=None, help="Region key (default leeds)")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every outcome month")
+    args = parser.parse_args()
+
+    join_outcomes(get_region(args.region), args.rebuild)
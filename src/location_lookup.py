@@ -0,0 +1,63 @@
+"""
+Keyed lookup tables for per-location enrichment results.
+
+Enrichment is resolved once per unique (Latitude, Longitude) pair. These helpers
+keep those results in a small DataFrame and attach them to the full dataset with
+one factorised gather, producing categorical columns instead of looping over
+every row in Python.
+"""
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['Latitude', 'Longitude']
+
+
+def lookup_from_map(coord_map, columns):
+    """
+    Build a lookup table from {(lat, lon): {field: value}}.
+    columns maps output column names to the field names in the values.
+    """
+    keys = list(coord_map.keys())
+    lookup = pd.DataFrame(keys, columns=KEY_COLUMNS) if keys else pd.DataFrame(columns=KEY_COLUMNS)
+    for column, field in columns.items():
+        lookup[column] = [coord_map[k][field] for k in keys]
+    return lookup
+
+
+def lookup_positions(df, lookup):
+    """Row position in lookup for every row of df, or -1 where the location is missing."""
+    if lookup.empty:
+        return np.full(len(df), -1, dtype=np.int64)
+
+    index = pd.MultiIndex.from_frame(lookup[KEY_COLUMNS])
+    return index.get_indexer(pd.MultiIndex.from_frame(df[KEY_COLUMNS]))
+
+
+def _gather(values, positions, default):
+    """Categorical of values[positions], with default wherever positions is -1."""
+    codes, categories = pd.factorize(values)
+    categories = list(categories)
+    if default in categories:
+        default_code = categories.index(default)
+    else:
+        default_code = len(categories)
+        categories.append(default)
+
+    if not len(codes):
+        return pd.Categorical.from_codes(np.full(len(positions), default_code), categories=categories)
+    gathered = np.where(positions >= 0, codes[np.clip(positions, 0, None)], default_code)
+    return pd.Categorical.from_codes(gathered, categories=categories)
+
+
+def apply_lookup(df, lookup, columns, default="Unknown", positions=None):
+    """Set each column of df from lookup in one vectorised pass. Returns the hit count."""
+    if positions is None:
+        positions = lookup_positions(df, lookup)
+
+    for column in columns:
+        values = lookup[column].to_numpy(dtype=object) if not lookup.empty else np.array([], dtype=object)
+        df[column] = _gather(values, positions, default)
+
+    return int((positions >= 0).sum())
+
@@ -9,90 +9,201 @@ Usage:
     python src/main.py --step 1     # Run specific step only
     python src/main.py --from 3     # Start from step 3
     python src/main.py --list       # List all steps
+    python src/main.py --stream     # Overlap API fetching with processing (steps 2-3)
+    python src/main.py --region leeds,bradford   # Run steps 0-6 for several districts
 """
 
 import argparse
+import glob
+import importlib
+import os
 import sys
 import time
 from datetime import datetime
 
-from combine_leeds_data import combine_leeds_data
-from fetch_data import fetch_crime_data
-from process_api_data import process_api_data
-from merge_datasets import merge_datasets
-from enrich_data import enrich_data
-from patch_enrichment import patch_enrichment
-from download_archives import download_latest
-from fetch_wards import fetch_wards
-from prepare_dashboard_data import prepare_dashboard_data
+from metrics import DEFAULT_INTERVAL, MetricsExporter, counter, gauge, instrument_requests
+from regions import DEFAULT_REGION, get_region, parse_regions
 
+CURRENT_STEP = gauge("pipeline_current_step", "Number of the step running now (-1 when idle)")
+STEP_DURATION = gauge("pipeline_step_duration_seconds", "Wall time of the last run of each step", ["step"])
+STEP_FAILURES = counter("pipeline_step_failures", "Failed step runs", ["step"])
 
+# Steps name their function as "module:function" and the module is only imported
+# when the step runs, so --list or a single light step never loads pandas, shapely
+# etc. for the others. "inputs"/"outputs" are paths or glob patterns and
+# "expected_duration" a typical full-data wall time in seconds, used for planning.
+# Steps with "regions": "all" run once and get every selected region (sharing
+# archive reads and API calls between them); "each" runs once per region and
+# "{region}" in its paths stands for the region key. The rest build the Leeds dashboard.
 PIPELINE_STEPS = [
     {
         "num": 0,
         "name": "Download Archive Data",
-        "desc": "Downloads historical crime data archives from Police.uk",
-        "func": download_latest,
-        "args": ()
+        "desc": "Downloads the fewest Police.uk archive editions covering the archive months",
+        "func": "archive_planner:fetch_archive_months",
+        "args": ("2018-01", "2022-10"),
+        "regions": "all",
+        "inputs": [],
+        "outputs": ["data/archive/manifest.json"],
+        "expected_duration": 300
     },
     {
         "num": 1,
         "name": "Generate Archive Data",
         "desc": "Aggregates historical data from local archive files",
-        "func": combine_leeds_data,
-        "args": ()
+        "func": "combine_leeds_data:combine_leeds_data",
+        "args": (),
+        "regions": "all",
+        "inputs": ["data/archive/*/*-street.csv"],
+        "outputs": ["data/processed/{region}_street_archive.csv", "data/processed/{region}_outcomes_combined.csv",
+                    "data/processed/{region}_stop_and_search_combined.csv"],
+        "expected_duration": 120
     },
     {
         "num": 2,
         "name": "Fetch API Data",
         "desc": "Fetches crime data from the UK Police API",
-        "func": fetch_crime_data,
-        "args": ("2022-11", "2025-12")
+        "func": "fetch_data:fetch_crime_data",
+        "args": ("2022-11", "2025-12"),
+        "regions": "all",
+        "inputs": [],
+        "outputs": ["data/raw/{region}_crime_*.csv"],
+        "expected_duration": 7200
     },
     {
         "num": 3,
         "name": "Process API Data",
-        "desc": "Normalizes API data, filters by Leeds boundary, assigns LSOA codes",
-        "func": process_api_data,
-        "args": ()
+        "desc": "Normalizes API data, filters by region boundary, assigns LSOA codes",
+        "func": "process_api_data:process_api_data",
+        "args": (),
+        "regions": "each",
+        "inputs": ["data/raw/{region}_crime_*.csv"],
+        "outputs": ["data/processed/{region}_street_api_clean.csv"],
+        "expected_duration": 300
     },
     {
         "num": 4,
         "name": "Merge Datasets",
         "desc": "Combines archive and API data, removes duplicates",
-        "func": merge_datasets,
-        "args": ()
+        "func": "merge_datasets:merge_datasets",
+        "args": (),
+        "regions": "each",
+        "inputs": ["data/processed/{region}_street_archive.csv", "data/processed/{region}_street_api_clean.csv"],
+        "outputs": ["data/processed/{region}_street_combined.csv"],
+        "expected_duration": 60
     },
     {
         "num": 5,
         "name": "Enrich Data",
-        "desc": "Adds Ward Names, Postcode Districts, and Polling Districts via geocoding",
-        "func": enrich_data,
-        "args": ()
+        "desc": "Adds Ward Names, Postcode Districts, and Polling Districts via geocoding, widening the search radius per tier",
+        "func": "enrich_data:enrich_data",
+        "args": (),
+        "regions": "each",
+        "inputs": ["data/processed/{region}_street_combined.csv"],
+        "outputs": ["data/processed/{region}_street_combined.csv", "data/processed/{region}_street_combined.manifest.json"],
+        "expected_duration": 900
     },
     {
         "num": 6,
-        "name": "Patch Enrichment",
-        "desc": "Fills in missing Ward/Postcode data with wider search radius",
-        "func": patch_enrichment,
-        "args": ()
-    },
+        "name": "Join Outcomes",
+        "desc": "Attaches the latest outcome and outcome timeline, re-indexing only changed outcome months",
+        "func": "join_outcomes:join_outcomes",
+        "args": (),
+        "regions": "each",
+        "inputs": ["data/processed/{region}_outcomes_combined.csv", "data/processed/{region}_street_combined.csv"],
+        "outputs": ["data/processed/{region}_street_combined.csv", "data/processed/{region}_outcome_index/state.json"],
+        "expected_duration": 60
+    }
+,
     {
         "num": 7,
         "name": "Fetch Ward Boundaries",
-        "desc": "Fetches and processes official ward boundaries from MapServer",
-        "func": fetch_wards,
-        "args": ()
+        "desc": "Builds official ward boundaries from the (cached) MapServer polling districts",
+        "func": "fetch_wards:fetch_wards",
+        "args": (),
+        "inputs": [],
+        "outputs": ["dashboard/data/leeds_wards.geojson"],
+        "expected_duration": 30
     },
     {
         "num": 8,
         "name": "Prepare Dashboard Data",
-        "desc": "Aggregates enriched data into optimized JSON for the dashboard",
-        "func": prepare_dashboard_data,
-        "args": ()
+        "desc": "Aggregates enriched data into optimized JSON, re-aggregating only changed months",
+        "func": "prepare_dashboard_data:prepare_dashboard_data",
+        "args": (True,),
+        "inputs": ["data/processed/leeds_street_combined.csv"],
+        "outputs": ["dashboard/data/crime_data.json"],
+        "expected_duration": 30
+    },
+    {
+        "num": 9,
+        "name": "Render Heatmap Tiles",
+        "desc": "Pre-renders kernel density heatmap tiles per year and crime type",
+        "func": "render_heatmap_tiles:render_heatmap_tiles",
+        "args": (),
+        "inputs": ["data/processed/leeds_street_combined.csv"],
+        "outputs": ["dashboard/tiles/index.json"],
+        "expected_duration": 600
     }
 ]
 
+# Replaces steps 2 and 3 when running with --stream
+STREAM_STEP = {
+    "num": 2,
+    "name": "Stream API Data",
+    "desc": "Fetches API months and normalizes, filters and assigns LSOAs to each as it arrives",
+    "func": "stream_pipeline:stream_api_data",
+    "args": ("2022-11", "2025-12"),
+    "regions": "each",
+    "inputs": [],
+    "outputs": ["data/raw/{region}_crime_*.csv", "data/processed/{region}_street_api_clean.csv"],
+    "expected_duration": 7200
+}
+
+
+def resolve(step):
+    """Import the step's module and return its function."""
+    module_name, func_name = step["func"].split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def path_exists(pattern):
+    return bool(glob.glob(pattern)) if glob.has_magic(pattern) else os.path.exists(pattern)
+
+
+def expand_paths(paths, regions):
+    """paths with each "{region}" placeholder expanded for every region."""
+    keys = [r["key"] for r in regions]
+    return [p.format(region=key) for p in paths for key in (keys if "{region}" in p else keys[:1])]
+
+
+def missing_inputs(steps, regions=None):
+    """{step num: inputs that neither exist nor are produced by an earlier step in steps}."""
+    regions = regions or [get_region()]
+    produced = set()
+    missing = {}
+    for step in steps:
+        absent = [p for p in expand_paths(step["inputs"], regions) if p not in produced and not path_exists(p)]
+        if absent:
+            missing[step["num"]] = absent
+        produced.update(expand_paths(step["outputs"], regions))
+    return missing
+
+
+def format_duration(seconds):
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds:.0f}s"
+
+
+def pipeline_steps(stream=False):
+    if not stream:
+        return PIPELINE_STEPS
+    steps = [s for s in PIPELINE_STEPS if s["num"] not in (2, 3)]
+    return sorted(steps + [STREAM_STEP], key=lambda s: s["num"])
+
 
 def print_banner():
     print("=" * 60)
@@ -101,17 +212,34 @@ def print_banner():
     print()
 
 
-def print_step_list():
+def print_step_list(stream=False):
     print_banner()
     print("Pipeline Steps:")
     print("-" * 60)
-    for step in PIPELINE_STEPS:
-        print(f"  {step['num']}. {step['name']}")
+    for step in pipeline_steps(stream):
+        scope = {"all": ", all regions at once", "each": ", per region"}.get(step.get("regions"), ", Leeds only")
+        print(f"  {step['num']}. {step['name']} (~{format_duration(step['expected_duration'])}{scope})")
         print(f"     {step['desc']}")
+        if step["inputs"]:
+            print(f"     in:  {', '.join(step['inputs'])}")
+        print(f"     out: {', '.join(step['outputs'])}")
     print()
 
 
-def run_step(step):
+def call_step(step, regions):
+    func = resolve(step)
+    if step.get("regions") == "all":
+        func(*step["args"], regions=regions)
+    elif step.get("regions") == "each":
+        for region in regions:
+            if len(regions) > 1:
+                print(f"--- {region['name']} ---")
+            func(*step["args"], region=region)
+    else:
+        func(*step["args"])
+
+
+def run_step(step, regions=None):
     print()
     print("=" * 60)
     print(f"  Step {step['num']}: {step['name']}")
@@ -120,43 +248,55 @@ def run_step(step):
     print("-" * 60)
     
     start_time = time.time()
+    CURRENT_STEP.set(step["num"])
     
     try:
-        step["func"](*step["args"])
+        call_step(step, regions or [get_region()])
         elapsed = time.time() - start_time
         print()
         print(f"[✓] Step {step['num']} completed in {elapsed:.1f}s")
         return True
     except Exception as e:
         elapsed = time.time() - start_time
+        STEP_FAILURES.inc(step=step["num"])
         print()
         print(f"[✗] Step {step['num']} failed after {elapsed:.1f}s")
         print(f"    Error: {e}")
         return False
+    finally:
+        STEP_DURATION.set(round(time.time() - start_time, 3), step=step["num"])
+        CURRENT_STEP.set(-1)
 
 
-def run_pipeline(start_step=0, end_step=None, single_step=None):
+def run_pipeline(start_step=0, end_step=None, single_step=None, stream=False, regions=None):
+    regions = regions or [get_region()]
     print_banner()
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Regions: {', '.join(r['name'] for r in regions)}")
     
+    steps = pipeline_steps(stream)
     steps_to_run = []
     
     if single_step is not None:
-        steps_to_run = [s for s in PIPELINE_STEPS if s["num"] == single_step]
+        steps_to_run = [s for s in steps if s["num"] == single_step]
         if not steps_to_run:
             print(f"Error: Step {single_step} not found.")
             return False
     else:
-        end = end_step if end_step is not None else max(s["num"] for s in PIPELINE_STEPS)
-        steps_to_run = [s for s in PIPELINE_STEPS if start_step <= s["num"] <= end]
+        end = end_step if end_step is not None else max(s["num"] for s in steps)
+        steps_to_run = [s for s in steps if start_step <= s["num"] <= end]
     
-    print(f"Running {len(steps_to_run)} step(s): {', '.join(str(s['num']) for s in steps_to_run)}")
+    expected = sum(s["expected_duration"] for s in steps_to_run)
+    print(f"Running {len(steps_to_run)} step(s): {', '.join(str(s['num']) for s in steps_to_run)} "
+          f"(typically ~{format_duration(expected)})")
+    for num, paths in missing_inputs(steps_to_run, regions).items():
+        print(f"Warning: step {num} inputs not found and not produced by an earlier step: {', '.join(paths)}")
     
     pipeline_start = time.time()
     failed_step = None
     
     for step in steps_to_run:
-        success = run_step(step)
+        success = run_step(step, regions)
         if not success:
             failed_step = step["num"]
             break
@@ -187,6 +327,11 @@ Examples:
   python src/main.py --step 3     Run only step 3
   python src/main.py --from 4     Start from step 4
   python src/main.py --list       Show all steps
+  python src/main.py --stream     Stream API months through processing
+  python src/main.py --metrics data/metrics.prom
+                                  Export live OpenMetrics while running
+  python src/main.py --region leeds,bradford
+                                  Build several districts, sharing downloads
         """
     )
     
@@ -198,22 +343,48 @@ Examples:
                         help="Start from step N")
     parser.add_argument("--to", type=int, metavar="N",
                         help="End at step N (use with --from)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Run steps 2-3 as one streaming step that processes each month as it is fetched")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write OpenMetrics (HTTP calls, rows/sec, queue depth) to PATH while running")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_INTERVAL, metavar="SECONDS",
+                        help="How often the metrics file is rewritten")
+    parser.add_argument("--region", default=DEFAULT_REGION, metavar="KEYS",
+                        help="Comma-separated region keys for steps 0-6, e.g. leeds,bradford,wakefield")
     
     args = parser.parse_args()
     
     if args.list:
-        print_step_list()
+        print_step_list(args.stream)
         return 0
     
     if args.step and args.from_step:
         print("Error: Cannot use --step and --from together.")
         return 1
     
-    success = run_pipeline(
-        start_step=args.from_step or 1,
-        end_step=args.to,
-        single_step=args.step
-    )
+    try:
+        regions = parse_regions(args.region)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    
+    exporter = None
+    if args.metrics:
+        instrument_requests()
+        exporter = MetricsExporter(args.metrics, args.metrics_interval).start()
+        print(f"Exporting metrics to {args.metrics} every {args.metrics_interval:g}s")
+    
+    try:
+        success = run_pipeline(
+            start_step=args.from_step or 1,
+            end_step=args.to,
+            single_step=args.step,
+            stream=args.stream,
+            regions=regions
+        )
+    finally:
+        if exporter:
+            exporter.stop()
     
     return 0 if success else 1
 
@@ -1,56 +1,273 @@
-import pandas as pd
+"""
+Merge the archive and API datasets within a bounded memory budget.
+
+Pass 1 streams each input in chunks, spills the rows to one temporary file per
+month and records the last-seen row for every Crime ID in an on-disk SQLite
+index. Pass 2 walks the months in order, keeps only each ID's winning row
+(the later source wins, as before), drops ID-less rows that another source
+already reported, and appends the month to the output. At most one input chunk
+or one month is in memory at once.
+
+ID-less rows (e.g. anti-social behaviour) are matched on a 64-bit hash of
+CONTENT_COLUMNS. Within a source, identical rows are genuine repeats, so the
+n-th copy of a hash is only matched against the n-th copy in another source:
+the result keeps max(count per source) copies of each row.
+
+append_months adds newly streamed API months to an already merged dataset
+without the rebuild: rows whose Crime ID it holds replace their old row, and
+ID-less rows are matched against the month's existing rows with dedup_content.
+The changes are committed to the dataset's delta log (see delta_store).
+"""
+
+import argparse
 import os
+import shutil
+import sqlite3
+import tempfile
 
-def merge_datasets():
-    archive_file = "data/processed/leeds_street_archive.csv"
-    api_file = "data/processed/leeds_street_api_clean.csv"
-    output_file = "data/processed/leeds_street_combined.csv"
-    
-    dfs = []
-    
-    if os.path.exists(archive_file):
-        print(f"Loading archive: {archive_file}...")
-        df_archive = pd.read_csv(archive_file, low_memory=False)
-        dfs.append(df_archive)
-        print(f"  Archive records: {len(df_archive)}")
-    else:
-        print(f"Warning: Archive file {archive_file} not found.")
-        
-    if os.path.exists(api_file):
-        print(f"Loading processed API data: {api_file}...")
-        df_api = pd.read_csv(api_file, low_memory=False)
-        dfs.append(df_api)
-        print(f"  API records: {len(df_api)}")
-    else:
-        print(f"Warning: API file {api_file} not found.")
-        
-    if not dfs:
+import numpy as np
+import pandas as pd
+
+from metrics import STAGE_ROWS
+from regions import data_file, get_region
+
+ARCHIVE_FILE = data_file(get_region(), "street_archive.csv")
+API_FILE = data_file(get_region(), "street_api_clean.csv")
+OUTPUT_FILE = data_file(get_region(), "street_combined.csv")
+
+DEFAULT_MEMORY_MB = 256
+MIN_CHUNK_ROWS = 1000
+# Working copies of a chunk alive at once while it is split and spilled
+CHUNK_OVERHEAD = 4
+NO_MONTH = "~"  # sorts after every YYYY-MM, as NaN months did with sort_values
+SEQ_COLUMN = "_seq"
+SOURCE_COLUMN = "_source"
+CONTENT_COLUMNS = ['Month', 'Longitude', 'Latitude', 'Location', 'Crime type']
+COORD_DECIMALS = 6
+
+
+def chunk_rows_for_budget(path, memory_mb):
+    """Rows per chunk that keep a chunk and its working copies under memory_mb."""
+    sample = pd.read_csv(path, dtype=str, nrows=MIN_CHUNK_ROWS)
+    if sample.empty:
+        return MIN_CHUNK_ROWS
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(MIN_CHUNK_ROWS, int(memory_mb * 1024 * 1024 / (bytes_per_row * CHUNK_OVERHEAD)))
+
+
+def open_id_index(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE ids (crime_id TEXT PRIMARY KEY, seq INTEGER, month TEXT)")
+    return conn
+
+
+def index_ids(conn, chunk, months):
+    has_id = chunk['Crime ID'].notna().to_numpy()
+    rows = zip(chunk['Crime ID'].to_numpy()[has_id].tolist(),
+               chunk[SEQ_COLUMN].to_numpy()[has_id].tolist(),
+               months[has_id].tolist())
+    # Sequence numbers only grow, so the last occurrence of an ID always wins
+    conn.executemany(
+        "INSERT INTO ids VALUES (?, ?, ?) "
+        "ON CONFLICT(crime_id) DO UPDATE SET seq = excluded.seq, month = excluded.month "
+        "WHERE excluded.seq > ids.seq",
+        rows,
+    )
+    conn.commit()
+
+
+def spill_inputs(inputs, columns, spill_dir, conn, chunk_rows):
+    """Pass 1: split every input into per-month spill files and index Crime IDs."""
+    spill_files = {}
+    seq = 0
+    total = 0
+
+    for source, path in enumerate(inputs):
+        for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_rows):
+            chunk = chunk.reindex(columns=columns)
+            chunk[SEQ_COLUMN] = range(seq, seq + len(chunk))
+            chunk[SOURCE_COLUMN] = source
+            seq += len(chunk)
+            total += len(chunk)
+            STAGE_ROWS.inc(len(chunk), stage="merge_spill")
+
+            months = chunk['Month'].fillna(NO_MONTH).to_numpy()
+            index_ids(conn, chunk, months)
+
+            for month, part in chunk.groupby(months, sort=False):
+                spill = spill_files.get(month)
+                new_file = spill is None
+                if new_file:
+                    spill = os.path.join(spill_dir, f"{len(spill_files)}.csv")
+                    spill_files[month] = spill
+                part.to_csv(spill, mode='w' if new_file else 'a', header=new_file, index=False)
+
+    return spill_files, total
+
+
+def content_hashes(df):
+    """64-bit hash of CONTENT_COLUMNS, with coordinates compared numerically."""
+    content = df.reindex(columns=CONTENT_COLUMNS)
+    for column in ['Longitude', 'Latitude']:
+        content[column] = pd.to_numeric(content[column], errors='coerce').round(COORD_DECIMALS)
+    return pd.util.hash_pandas_object(content, index=False).to_numpy()
+
+
+def content_duplicates(hashes, sources, keep='last'):
+    """
+    Mask of rows whose content another source also supplied. The n-th copy of
+    a hash within a source pairs with the n-th copy in every other source; the
+    copy from the latest (keep='last') or earliest (keep='first') source survives.
+    """
+    keys = pd.DataFrame({'hash': hashes, 'source': sources})
+    keys['rank'] = keys.groupby(['source', 'hash']).cumcount()
+    order = keys.sort_values('source', kind='stable')
+    duplicated = order.duplicated(subset=['hash', 'rank'], keep=keep)
+    return duplicated.reindex(keys.index).to_numpy()
+
+
+def dedup_content(df, existing):
+    """
+    Rows of df to append to an already merged partition of the same month:
+    ID-less rows whose content existing already holds, copy for copy, are dropped.
+    """
+    no_id = df['Crime ID'].isna().to_numpy()
+    existing = existing[existing['Crime ID'].isna()]
+    if not no_id.any() or existing.empty:
+        return df
+
+    hashes = np.concatenate([content_hashes(existing), content_hashes(df[no_id])])
+    sources = np.repeat([0, 1], [len(existing), int(no_id.sum())])
+    duplicated = content_duplicates(hashes, sources, keep='first')
+
+    keep = np.ones(len(df), dtype=bool)
+    keep[no_id] = ~duplicated[len(existing):]
+    return df[keep]
+
+
+def merge_month(path, conn, month):
+    """
+    Keep the winning row of every Crime ID seen in this month, plus ID-less
+    rows not already supplied by another source.
+    """
+    df = pd.read_csv(path, dtype=str)
+    winners = {seq for (seq,) in conn.execute("SELECT seq FROM ids WHERE month = ?", (month,))}
+    no_id = df['Crime ID'].isna().to_numpy()
+    keep = ~no_id & df[SEQ_COLUMN].astype(int).isin(winners).to_numpy()
+
+    if no_id.any():
+        rows = df[no_id]
+        keep[no_id] = ~content_duplicates(content_hashes(rows), rows[SOURCE_COLUMN].astype(int).to_numpy())
+
+    return df[keep]
+
+
+def merge_datasets(memory_mb=DEFAULT_MEMORY_MB, archive_file=None, api_file=None,
+                   output_file=None, chunk_rows=None, region=None):
+    region = region or get_region()
+    archive_file = archive_file or data_file(region, "street_archive.csv")
+    api_file = api_file or data_file(region, "street_api_clean.csv")
+    output_file = output_file or data_file(region, "street_combined.csv")
+    inputs = []
+
+    for label, path in [("archive", archive_file), ("processed API data", api_file)]:
+        if os.path.exists(path):
+            print(f"Found {label}: {path}")
+            inputs.append(path)
+        else:
+            print(f"Warning: {label} file {path} not found.")
+
+    if not inputs:
         print("No data to merge.")
         return
 
-    print("Combining datasets...")
-    df_combined = pd.concat(dfs, ignore_index=True)
-    initial_count = len(df_combined)
-    
-    print("Deduplicating based on 'Crime ID'...")
-    
-    mask_id = df_combined['Crime ID'].notna()
-    df_ids = df_combined[mask_id]
-    df_no_ids = df_combined[~mask_id]
-    
-    df_ids_dedup = df_ids.drop_duplicates(subset=['Crime ID'], keep='last')
-    
-    df_final = pd.concat([df_ids_dedup, df_no_ids], ignore_index=True)
-    
-    print(f"Dropped {initial_count - len(df_final)} duplicates.")
-    
-    print("Sorting by Month...")
-    if 'Month' in df_final.columns:
-        df_final = df_final.sort_values(by='Month')
-        
-    print(f"Saving {len(df_final)} records to {output_file}...")
-    df_final.to_csv(output_file, index=False)
+    columns = []
+    for path in inputs:
+        for column in pd.read_csv(path, nrows=0).columns:
+            if column not in columns:
+                columns.append(column)
+
+    if chunk_rows is None:
+        chunk_rows = min(chunk_rows_for_budget(path, memory_mb) for path in inputs)
+    print(f"Streaming inputs in chunks of {chunk_rows} rows (budget {memory_mb} MB)...")
+
+    output_dir = os.path.dirname(output_file) or "."
+    work_dir = tempfile.mkdtemp(prefix="merge_", dir=output_dir)
+    conn = open_id_index(os.path.join(work_dir, "ids.sqlite"))
+
+    try:
+        spill_files, initial_count = spill_inputs(inputs, columns, work_dir, conn, chunk_rows)
+        conn.execute("CREATE INDEX ids_month ON ids (month)")
+        print(f"  Spilled {initial_count} records into {len(spill_files)} months.")
+
+        print("Deduplicating on 'Crime ID' and content hash, writing months in order...")
+        temp_output = output_file + ".tmp"
+        written = 0
+        for i, month in enumerate(sorted(spill_files)):
+            df = merge_month(spill_files[month], conn, month)
+            df.drop(columns=[SEQ_COLUMN, SOURCE_COLUMN]).to_csv(temp_output, mode='w' if i == 0 else 'a',
+                                                 header=(i == 0), index=False)
+            written += len(df)
+            STAGE_ROWS.inc(len(df), stage="merge_write")
+
+        os.replace(temp_output, output_file)
+    finally:
+        conn.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Dropped {initial_count - written} duplicates.")
+    print(f"Saved {written} records to {output_file}.")
     print("Merge complete.")
 
+def append_months(partitions, output_file=None, region=None):
+    """
+    Add API months ({month: partition file}) to the merged dataset at output_file
+    as delta log inserts, replacing rows whose Crime ID it already holds (the API,
+    the later source, wins). Returns the number of rows added.
+    """
+    from delta_store import delete, insert
+    from schema import read_dataset
+
+    region = region or get_region()
+    output_file = output_file or data_file(region, "street_combined.csv")
+    existing = read_dataset(output_file, columns=['Crime ID'] + CONTENT_COLUMNS, report=False).astype(object)
+    known_ids = set(existing['Crime ID'].dropna())
+
+    added = 0
+    for month, path in sorted(partitions.items()):
+        if not os.path.exists(path):
+            print(f"No partition for {month} ({path}), skipping.")
+            continue
+        new = read_dataset(path, report=False)
+        rows = dedup_content(new, existing[existing['Month'] == month])
+        replaced = rows[rows['Crime ID'].astype(object).isin(known_ids)]
+        if len(replaced):
+            delete(output_file, replaced, note=f"merge_datasets {month}")
+        insert(output_file, rows, note=f"merge_datasets {month}")
+        known_ids.update(rows['Crime ID'].dropna().astype(object))
+        added += len(rows) - len(replaced)
+        STAGE_ROWS.inc(len(rows), stage="merge_write")
+        print(f"Appended {month}: {len(rows)} records ({len(replaced)} replaced, "
+              f"{len(new) - len(rows)} duplicates dropped)")
+    return added
+
+
 if __name__ == "__main__":
-    merge_datasets()
+    parser = argparse.ArgumentParser(description="Merge archive and API crime data with Crime ID deduplication")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="Approximate memory budget for each input chunk")
+    parser.add_argument("--region", default=None, help="Region key (default leeds)")
+    parser.add_argument("--append", default=None, metavar="MONTHS",
+                        help="Comma-separated streamed API months to add to the merged dataset instead of rebuilding")
+    args = parser.parse_args()
+
+    region = get_region(args.region)
+    if args.append:
+        from stream_pipeline import partition_file, region_partition_dir
+
+        months = args.append.split(",")
+        append_months({m: partition_file(m, region_partition_dir(region)) for m in months}, region=region)
+    else:
+        merge_datasets(memory_mb=args.memory_mb, region=region)
@@ -3,13 +3,15 @@ import glob
 import os
 import ast
 
+from schema import read_dataset, write_dataset
+
 def merge_raw_data():
     processed_file = "data/processed/leeds_street_combined.csv"
     raw_dir = "data/raw"
     
     print(f"Loading existing processed data from {processed_file}...")
     if os.path.exists(processed_file):
-        df_processed = pd.read_csv(processed_file)
+        df_processed = read_dataset(processed_file)
     else:
         print("Processed file not found. Starting fresh.")
         df_processed = pd.DataFrame(columns=[
@@ -111,7 +113,7 @@ def merge_raw_data():
     
     df_combined = df_combined.sort_values(by=['Month'])
     
-    df_combined.to_csv(processed_file, index=False)
+    write_dataset(df_combined, processed_file)
     print(f"Saved merged data to {processed_file}")
 
 if __name__ == "__main__":
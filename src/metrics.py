@@ -0,0 +1,257 @@
+"""
+Lightweight in-process metrics with an OpenMetrics text exporter.
+
+Modules declare their metrics once at import time and update them from any
+thread:
+
+    ROWS = metrics.counter("stage_rows", "Rows processed per stage", ["stage"])
+    ROWS.inc(len(df), stage="assign_lsoa")
+
+    with LATENCY.time(host="api.postcodes.io"):
+        ...
+
+instrument_requests() records every HTTP call made through `requests`
+(count by host and status, latency histogram by host). MetricsExporter
+rewrites an OpenMetrics text file every few seconds while the pipeline runs,
+so throughput, error and throttling rates can be watched (or scraped by a
+node_exporter textfile collector) from outside the process:
+
+    python src/main.py --metrics data/metrics.prom
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+DEFAULT_INTERVAL = 5.0
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {self.documentation}"]
+        for sample_name, key, extra, value in self._samples():
+            lines.append(f"{sample_name}{_label_text(self.labels, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [(f"{self.name}_total", key, extra, value) for _, key, extra, value in super()._samples()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def value(self, **labels):
+        """(observation count, sum) for the given labels."""
+        with self._lock:
+            counts, total = self._values.get(self._key(labels), ([0], 0.0))
+            return sum(counts), total
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key, [("le", _format_value(float(bound)))], cumulative))
+                samples.append((f"{self.name}_count", key, (), cumulative))
+                samples.append((f"{self.name}_sum", key, (), total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, cls, name, documentation, labels=(), **kwargs):
+        """Return the metric called name, creating it on first use."""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines + ["# EOF"]) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labels=(), registry=REGISTRY):
+    return registry.register(Counter, name, documentation, labels)
+
+
+def gauge(name, documentation, labels=(), registry=REGISTRY):
+    return registry.register(Gauge, name, documentation, labels)
+
+
+def histogram(name, documentation, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+    return registry.register(Histogram, name, documentation, labels, buckets=buckets)
+
+
+STAGE_ROWS = counter("stage_rows", "Rows processed by a pipeline stage", ["stage"])
+HTTP_REQUESTS = counter("http_requests", "HTTP requests by host and status code ('error' if no response)",
+                        ["host", "code"])
+HTTP_LATENCY = histogram("http_request_duration_seconds", "HTTP request latency", ["host"])
+
+
+def write_metrics(path, registry=REGISTRY):
+    """Atomically replace path with the current OpenMetrics exposition."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(registry.render())
+    os.replace(temp_path, path)
+
+
+class MetricsExporter:
+    """Background thread that rewrites an OpenMetrics file every interval seconds."""
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            write_metrics(self.path, self.registry)
+
+    def start(self):
+        write_metrics(self.path, self.registry)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        write_metrics(self.path, self.registry)
+
+
+_instrument_lock = threading.Lock()
+
+
+def instrument_requests():
+    """Record every request sent through the requests library in HTTP_REQUESTS/HTTP_LATENCY."""
+    import requests
+
+    with _instrument_lock:
+        send = requests.Session.send
+        if getattr(send, "_metrics_instrumented", False):
+            return
+
+        def instrumented_send(session, request, **kwargs):
+            host = urlparse(request.url).hostname or "unknown"
+            start = time.perf_counter()
+            try:
+                response = send(session, request, **kwargs)
+            except Exception:
+                HTTP_REQUESTS.inc(host=host, code="error")
+                HTTP_LATENCY.observe(time.perf_counter() - start, host=host)
+                raise
+            HTTP_REQUESTS.inc(host=host, code=response.status_code)
+            HTTP_LATENCY.observe(time.perf_counter() - start, host=host)
+            return response
+
+        instrumented_send._metrics_instrumented = True
+        requests.Session.send = instrumented_send
@@ -2,92 +2,150 @@
 Prepares aggregated crime data for the dashboard.
 Aggregates raw data into a grid structure grouped by crime type and year-month.
 Includes ward data for top wards chart and city centre filtering.
+
+Cells come from the fixed project grid in spatial_grid, so the aggregates for a
+month only change when that month's records change. In incremental mode:
+- if the dataset's fingerprint (delta_store) is the one the last build used,
+  nothing is read or written
+- otherwise the needed columns are still loaded and every row hashed into a
+  per-month fingerprint, but only new or modified months are re-aggregated;
+  the cached aggregates of the other months are reused
+The dashboard JSON is always rewritten in full, as it is a single file.
 """
 
-import pandas as pd
-import numpy as np
+import argparse
 import json
 import os
 
-GRID_SIZE = 80
+import pandas as pd
+
+from crime_store import open_store
+from delta_store import fingerprint
+from regions import get_region
+from schema import add_categories, read_dataset
+from spatial_grid import GRID_VERSION, cell_centres, cell_indices, grid_centre
+
 INPUT_PATH = os.path.join("data", "processed", "leeds_street_combined.csv")
 OUTPUT_PATH = os.path.join("dashboard", "data", "crime_data.json")
-CITY_CENTRE_WARD = "Little London & Woodhouse"
+AGGREGATES_PATH = os.path.join("data", "processed", "dashboard_aggregates.csv")
+STATE_PATH = os.path.join("data", "processed", "dashboard_state.json")
+CITY_CENTRE_WARD = get_region("leeds")['city_centre_ward']
+
+INPUT_COLUMNS = ['Latitude', 'Longitude', 'Month', 'Crime type', 'Ward Name', 'Polling District']
+GROUP_COLUMNS = ['lat_idx', 'lon_idx', 'Crime type', 'Month', 'is_city_centre', 'Polling District', 'Ward Name']
 
 
-def prepare_dashboard_data():
+def load_clean_data():
     print(f"Loading data from {INPUT_PATH}...")
-    df = pd.read_csv(INPUT_PATH)
-    
+    df = read_dataset(INPUT_PATH, columns=INPUT_COLUMNS)
+
     df_clean = df.dropna(subset=['Latitude', 'Longitude', 'Month', 'Crime type', 'Ward Name']).copy()
+    df_clean['Polling District'] = add_categories(df_clean['Polling District'], ['Unknown']).fillna('Unknown')
     print(f"Records with valid data: {len(df_clean):,}")
-    
-    df_clean['Year'] = df_clean['Month'].str[:4]
-    df_clean['MonthNum'] = df_clean['Month'].str[5:7]
-    
-    min_lat, max_lat = df_clean['Latitude'].min(), df_clean['Latitude'].max()
-    min_lon, max_lon = df_clean['Longitude'].min(), df_clean['Longitude'].max()
-    
-    lat_bins = np.linspace(min_lat, max_lat, GRID_SIZE + 1)
-    lon_bins = np.linspace(min_lon, max_lon, GRID_SIZE + 1)
-    
-    lat_centers = (lat_bins[:-1] + lat_bins[1:]) / 2
-    lon_centers = (lon_bins[:-1] + lon_bins[1:]) / 2
-    
-    df_clean['lat_idx'] = np.digitize(df_clean['Latitude'], lat_bins) - 1
-    df_clean['lon_idx'] = np.digitize(df_clean['Longitude'], lon_bins) - 1
-    
-    df_clean['lat_idx'] = df_clean['lat_idx'].clip(0, GRID_SIZE - 1)
-    df_clean['lon_idx'] = df_clean['lon_idx'].clip(0, GRID_SIZE - 1)
-    
+    return df_clean
+
+
+def month_fingerprints(df_clean):
+    """Order-independent 64-bit fingerprint of each month's records."""
+    row_hashes = pd.util.hash_pandas_object(df_clean[INPUT_COLUMNS], index=False)
+    sums = row_hashes.groupby(df_clean['Month'].values, observed=True).sum()
+    sizes = df_clean.groupby('Month', observed=True).size()
+    return {month: f"{int(sizes[month])}:{int(sums[month]) & 0xFFFFFFFFFFFFFFFF:016x}" for month in sums.index}
+
+
+def aggregate_months(df_clean):
+    """Count records per fixed grid cell, crime type, month, polling district and ward."""
+    df_clean = df_clean.copy()
+    df_clean['lat_idx'], df_clean['lon_idx'] = cell_indices(df_clean['Latitude'], df_clean['Longitude'])
     df_clean['is_city_centre'] = (df_clean['Ward Name'] == CITY_CENTRE_WARD).astype(int)
-    
-    polling_districts = sorted(df_clean['Polling District'].astype(str).unique().tolist())
-    dist_map = {d: i for i, d in enumerate(polling_districts)}
-    df_clean['dist_idx'] = df_clean['Polling District'].astype(str).map(dist_map)
-    
-    crime_types = sorted(df_clean['Crime type'].unique().tolist())
-    years = sorted(df_clean['Year'].unique().tolist())
-    wards = sorted(df_clean['Ward Name'].unique().tolist())
-    
-    crime_type_map = {ct: i for i, ct in enumerate(crime_types)}
-    ward_map = {w: i for i, w in enumerate(wards)}
-    
-    df_clean['ward_idx'] = df_clean['Ward Name'].map(ward_map)
-    
-    print("Aggregating by grid cell, crime type, ward, and year-month...")
-    grouped = df_clean.groupby(
-        ['lat_idx', 'lon_idx', 'Crime type', 'Year', 'MonthNum', 'is_city_centre', 'dist_idx', 'ward_idx']
-    ).size().reset_index(name='count')
-    
-    grouped['lat'] = grouped['lat_idx'].apply(lambda x: round(lat_centers[x], 4))
-    grouped['lon'] = grouped['lon_idx'].apply(lambda x: round(lon_centers[x], 4))
-    
+
+    return df_clean.groupby(GROUP_COLUMNS, observed=True).size().reset_index(name='count')
+
+
+def aggregate_from_store(store):
+    """The same aggregates as aggregate_months, computed by the indexed crime store."""
+    store_columns = {'lat_idx': 'lat_idx', 'lon_idx': 'lon_idx', 'crime_type': 'Crime type', 'month': 'Month',
+                     'polling_district': 'Polling District', 'ward': 'Ward Name'}
+    aggregates = store.query(group_by=list(store_columns)).rename(columns=store_columns)
+    aggregates = aggregates.dropna(subset=['lat_idx', 'lon_idx', 'Crime type', 'Month', 'Ward Name'])
+    aggregates['Polling District'] = aggregates['Polling District'].fillna('Unknown')
+    aggregates['is_city_centre'] = (aggregates['Ward Name'] == CITY_CENTRE_WARD).astype(int)
+
+    return aggregates.groupby(GROUP_COLUMNS, observed=True)['count'].sum().reset_index()
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH, 'r') as f:
+        return json.load(f)
+
+
+def load_cached_aggregates():
+    if not (os.path.exists(AGGREGATES_PATH) and os.path.exists(STATE_PATH)):
+        return None, {}
+
+    state = load_state()
+    if state.get('grid_version') != GRID_VERSION:
+        print("Grid definition changed since the last build, rebuilding all months.")
+        return None, {}
+
+    cached = pd.read_csv(AGGREGATES_PATH, keep_default_na=False,
+                         dtype={'Month': str, 'Crime type': str, 'Polling District': str, 'Ward Name': str})
+    return cached, state.get('months', {})
+
+
+def save_cached_aggregates(aggregates, fingerprints, dataset):
+    os.makedirs(os.path.dirname(AGGREGATES_PATH), exist_ok=True)
+    aggregates.to_csv(AGGREGATES_PATH, index=False)
+    with open(STATE_PATH, 'w') as f:
+        json.dump({'grid_version': GRID_VERSION, 'months': fingerprints, 'dataset': dataset},
+                  f, indent=2, sort_keys=True)
+
+
+def build_output(aggregates):
+    """Encode the aggregate table into the compact dashboard JSON structure."""
+    years_series = aggregates['Month'].str[:4].astype(int)
+    month_nums = aggregates['Month'].str[5:7].astype(int)
+
+    crime_types = sorted(aggregates['Crime type'].unique().tolist())
+    years = sorted(years_series.unique().tolist())
+    wards = sorted(aggregates['Ward Name'].unique().tolist())
+    polling_districts = sorted(aggregates['Polling District'].unique().tolist())
+
+    type_idx = pd.Categorical(aggregates['Crime type'], categories=crime_types).codes
+    ward_idx = pd.Categorical(aggregates['Ward Name'], categories=wards).codes
+    dist_idx = pd.Categorical(aggregates['Polling District'], categories=polling_districts).codes
+    lats, lons = cell_centres(aggregates['lat_idx'].values, aggregates['lon_idx'].values)
+
     print(f"Crime types: {len(crime_types)}")
     print(f"Years: {years}")
     print(f"Wards: {len(wards)}")
     print(f"Polling Districts: {len(polling_districts)}")
-    print(f"Aggregated points: {len(grouped):,}")
-    
-    points = []
-    for _, row in grouped.iterrows():
-        points.append([
-            row['lat'],
-            row['lon'],
-            crime_type_map[row['Crime type']],
-            int(row['Year']),
-            int(row['MonthNum']),
-            int(row['count']),
-            int(row['is_city_centre']),
-            int(row['dist_idx']),
-            int(row['ward_idx'])
-        ])
-    
+    print(f"Aggregated points: {len(aggregates):,}")
+
+    points = [list(p) for p in zip(
+        lats.tolist(),
+        lons.tolist(),
+        type_idx.tolist(),
+        years_series.tolist(),
+        month_nums.tolist(),
+        aggregates['count'].astype(int).tolist(),
+        aggregates['is_city_centre'].astype(int).tolist(),
+        dist_idx.tolist(),
+        ward_idx.tolist()
+    )]
+
     print("Building Polling District -> Ward mapping...")
-    pd_ward_map = df_clean.groupby('Polling District')['Ward Name'].first().to_dict()
+    dist_totals = aggregates.groupby(['Polling District', 'Ward Name'], observed=True)['count'].sum().reset_index()
+    dist_totals = dist_totals.sort_values('count', ascending=False).drop_duplicates('Polling District')
+    pd_ward_map = dict(zip(dist_totals['Polling District'], dist_totals['Ward Name']))
+    ward_map = {w: i for i, w in enumerate(wards)}
     dist_ward_indices = [ward_map[pd_ward_map[d]] for d in polling_districts]
 
-    output_data = {
+    centre_lat, centre_lon = grid_centre()
+
+    return {
         't': crime_types,
         'y': [int(y) for y in years],
         'w': wards,
@@ -95,21 +153,77 @@ def prepare_dashboard_data():
         'dw': dist_ward_indices,
         'cc': CITY_CENTRE_WARD,
         'c': {
-            'lat': round((min_lat + max_lat) / 2, 4),
-            'lon': round((min_lon + max_lon) / 2, 4)
+            'lat': centre_lat,
+            'lon': centre_lon
         },
         'p': points
     }
-    
+
+
+def write_dashboard(aggregates):
+    aggregates = aggregates.sort_values(['Month', 'lat_idx', 'lon_idx', 'Crime type']).reset_index(drop=True)
+    output_data = build_output(aggregates)
+
     os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    
+
     print(f"Writing to {OUTPUT_PATH}...")
     with open(OUTPUT_PATH, 'w') as f:
         json.dump(output_data, f, separators=(',', ':'))
-    
+
     file_size = os.path.getsize(OUTPUT_PATH) / (1024 * 1024)
     print(f"Done! File size: {file_size:.2f} MB")
+    return aggregates
+
+
+def prepare_dashboard_data(incremental=False, use_store=False):
+    if use_store:
+        print("Aggregating through the crime store...")
+        aggregates = aggregate_from_store(open_store(INPUT_PATH))
+        write_dashboard(aggregates)
+        return
+
+    dataset = fingerprint(INPUT_PATH)
+    state = load_state()
+    if (incremental and os.path.exists(OUTPUT_PATH) and state.get('grid_version') == GRID_VERSION
+            and state.get('dataset') == dataset):
+        print(f"{INPUT_PATH} is unchanged since the last build, {OUTPUT_PATH} is up to date.")
+        return
+
+    df_clean = load_clean_data()
+    fingerprints = month_fingerprints(df_clean)
+
+    cached, cached_fingerprints = (None, {})
+    if incremental:
+        cached, cached_fingerprints = load_cached_aggregates()
+        if cached is None:
+            print("No usable aggregate cache found, running a full build.")
+
+    if cached is None:
+        print("Aggregating by grid cell, crime type, ward, and year-month...")
+        aggregates = aggregate_months(df_clean)
+    else:
+        changed = sorted(m for m, fp in fingerprints.items() if cached_fingerprints.get(m) != fp)
+        removed = sorted(set(cached_fingerprints) - set(fingerprints))
+        print(f"Months changed: {len(changed)}, removed: {len(removed)}, "
+              f"unchanged: {len(fingerprints) - len(changed)}")
+
+        if changed:
+            print(f"Re-aggregating {', '.join(changed)}...")
+
+        keep = cached[~cached['Month'].isin(set(changed) | set(removed))]
+        fresh = aggregate_months(df_clean[df_clean['Month'].isin(changed)])
+        aggregates = pd.concat([keep, fresh], ignore_index=True)
+
+    aggregates = write_dashboard(aggregates)
+    save_cached_aggregates(aggregates, fingerprints, dataset)
 
 
 if __name__ == "__main__":
-    prepare_dashboard_data()
+    parser = argparse.ArgumentParser(description="Prepare aggregated dashboard data")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-aggregate months whose records changed since the last build")
+    parser.add_argument("--store", action="store_true",
+                        help="Aggregate with the indexed crime store instead of scanning the CSV")
+    args = parser.parse_args()
+
+    prepare_dashboard_data(incremental=args.incremental, use_store=args.store)
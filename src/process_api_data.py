@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import requests
 import os
@@ -8,15 +9,19 @@ from shapely.geometry import shape, Point
 from shapely.prepared import prep
 from tqdm import tqdm
 
+from boundary_index import BoundaryIndex
+from metrics import STAGE_ROWS
+from regions import data_file, get_region, load_boundary as load_boundary_geometry, lsoa_file, lsoa_url
+from schema import apply_schema, report_memory, write_dataset
+
 RAW_DIR = "data/raw"
-OUTPUT_FILE = "data/processed/leeds_street_api_clean.csv"
-LEEDS_BOUNDARY_URL = "https://nominatim.openstreetmap.org/search?q=Leeds,+West+Yorkshire,+United+Kingdom&polygon_geojson=1&format=json"
-LSOA_BOUNDARY_URL = "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/LSOA_Dec_2011_Boundaries_Generalised_Clipped_BGC_EW_V3/FeatureServer/0/query?where=LSOA11NM%20like%20%27Leeds%25%27&outFields=*&f=geojson"
-LSOA_FILE = "data/raw/leeds_lsoa_2011.geojson"
+OUTPUT_NAME = "street_api_clean.csv"
+OUTPUT_FILE = data_file(get_region(), OUTPUT_NAME)
 
-def normalize_raw_data():
+def normalize_raw_data(region=None):
+    region = region or get_region()
     print("Step 1: Loading and Normalizing Raw Data...")
-    raw_files = glob.glob(os.path.join(RAW_DIR, "*.csv"))
+    raw_files = glob.glob(os.path.join(RAW_DIR, f"{region['key']}_crime_*.csv"))
     if not raw_files:
         print("No raw files found.")
         return None
@@ -24,9 +29,8 @@ def normalize_raw_data():
     raw_dfs = []
     for f in raw_files:
         try:
-            if "leeds_crime" in f:
-                df = pd.read_csv(f)
-                raw_dfs.append(df)
+            df = pd.read_csv(f)
+            raw_dfs.append(df)
         except Exception as e:
             print(f"Error reading {f}: {e}")
             
@@ -37,21 +41,35 @@ def normalize_raw_data():
     df_raw = pd.concat(raw_dfs, ignore_index=True)
     print(f"Loaded {len(df_raw)} raw records.")
     
-    def get_lat_lon_loc(loc_str):
-        try:
-            if pd.isna(loc_str): return None, None, None
-            d = ast.literal_eval(loc_str)
-            return d.get('latitude'), d.get('longitude'), d.get('street', {}).get('name')
-        except: return None, None, None
+    print("Parsing JSON columns...")
+    return normalize_frame(df_raw, region)
 
-    def get_outcome(outcome_str):
-        try:
-            if pd.isna(outcome_str): return ""
-            d = ast.literal_eval(outcome_str)
-            return d.get('category', "")
-        except: return ""
+def _as_dict(value):
+    # Raw CSVs hold the API's nested objects as repr strings; freshly fetched frames hold dicts
+    if isinstance(value, dict):
+        return value
+    if pd.isna(value):
+        return None
+    return ast.literal_eval(value)
 
-    print("Parsing JSON columns...")
+def get_lat_lon_loc(loc):
+    try:
+        d = _as_dict(loc)
+        if d is None: return None, None, None
+        return d.get('latitude'), d.get('longitude'), d.get('street', {}).get('name')
+    except: return None, None, None
+
+def get_outcome(outcome):
+    try:
+        d = _as_dict(outcome)
+        if d is None: return ""
+        return d.get('category', "")
+    except: return ""
+
+def normalize_frame(df_raw, region=None):
+    """Convert one frame of raw API records to the archive CSV schema."""
+    region = region or get_region()
+    df_raw = df_raw.copy()
     loc_data = df_raw['location'].apply(get_lat_lon_loc)
     df_raw['Latitude'] = [float(x[0]) if x[0] else None for x in loc_data]
     df_raw['Longitude'] = [float(x[1]) if x[1] else None for x in loc_data]
@@ -61,8 +79,8 @@ def normalize_raw_data():
     
     df_raw['Crime ID'] = df_raw['persistent_id'].combine_first(df_raw['id'])
     df_raw['Month'] = df_raw['month']
-    df_raw['Reported by'] = "West Yorkshire Police"
-    df_raw['Falls within'] = "West Yorkshire Police"
+    df_raw['Reported by'] = region['force_name']
+    df_raw['Falls within'] = region['force_name']
     df_raw['Context'] = df_raw['context']
     
     category_map = {
@@ -89,69 +107,57 @@ def normalize_raw_data():
             
     return df_raw[cols].copy()
 
-def filter_leeds_boundary(df):
-    print("Step 2: Filtering Non-Leeds Data...")
-    
-    headers = {'User-Agent': 'LeedsCrimeAnalysis/1.0'}
+def load_boundary(region=None):
+    """A BoundaryIndex over the region's administrative polygon from the boundary store, or None."""
+    poly = load_boundary_geometry(region or get_region())
+    return BoundaryIndex(poly) if poly is not None else None
+
+def as_boundary_index(boundary):
+    """A BoundaryIndex for a plain or prepared shapely geometry (None and indexes pass through).
+
+    Build it once before sharing a boundary between threads: preparing the same
+    geometry from several threads at once is not thread-safe in GEOS.
+    """
+    if boundary is None or isinstance(boundary, BoundaryIndex):
+        return boundary
+    return BoundaryIndex(getattr(boundary, 'context', boundary))
+
+def filter_boundary(df, boundary=None, region=None):
+    region = region or get_region()
+    print(f"Step 2: Filtering Non-{region['name']} Data...")
     
-    try:
-        print("Fetching Leeds boundary...")
-        resp = requests.get(LEEDS_BOUNDARY_URL, headers=headers, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        poly = None
-        for item in data:
-            if item.get('geojson') and item.get('type') == 'administrative':
-                poly = shape(item['geojson'])
-                break
-        if not poly and data: poly = shape(data[0]['geojson'])
-        
-        if not poly: raise Exception("No polygon found")
-        
-    except Exception as e:
-        print(f"Error fetching boundary: {e}")
+    index = as_boundary_index(boundary if boundary is not None else load_boundary(region))
+    if index is None:
         return df
-        
-    prepared = prep(poly)
     
     initial = len(df)
-    unique_coords = df[['Latitude', 'Longitude']].drop_duplicates()
+    unique_coords = df[['Latitude', 'Longitude']].drop_duplicates().dropna()
     print(f"Checking {len(unique_coords)} unique locations...")
     
-    valid_coords = set()
-    for idx, row in unique_coords.iterrows():
-        lat, lon = row['Latitude'], row['Longitude']
-        if pd.isna(lat) or pd.isna(lon): continue
-        if prepared.contains(Point(lon, lat)):
-             valid_coords.add((lat, lon))
-             
-    keep_indices = []
-    for idx in df.index:
-        pt = (df.at[idx, 'Latitude'], df.at[idx, 'Longitude'])
-        if pt in valid_coords:
-            keep_indices.append(idx)
+    inside = index.contains_xy(unique_coords['Longitude'].to_numpy(), unique_coords['Latitude'].to_numpy())
+    print(f"  Resolved {index.describe()}")
+    valid = pd.MultiIndex.from_frame(unique_coords[inside])
+    keep = pd.MultiIndex.from_frame(df[['Latitude', 'Longitude']]).isin(valid)
             
-    df_clean = df.loc[keep_indices].copy()
+    df_clean = df[keep].copy()
     print(f"Filtered: {initial} -> {len(df_clean)} records.")
     return df_clean
 
-def assign_lsoa(df):
-    print("Step 3: Assigning LSOA Codes...")
-    
-    if not os.path.exists(LSOA_FILE):
+def load_lsoa_polygons(region=None):
+    """Prepared LSOA polygons from the cached GeoJSON (downloaded on first use), or None."""
+    region = region or get_region()
+    path = lsoa_file(region)
+    if not os.path.exists(path):
         print("Downloading LSOA boundaries...")
         try:
-             resp = requests.get(LSOA_BOUNDARY_URL, timeout=30)
+             resp = requests.get(lsoa_url(region), timeout=30)
              resp.raise_for_status()
-             with open(LSOA_FILE, 'wb') as f: f.write(resp.content)
+             with open(path, 'wb') as f: f.write(resp.content)
         except Exception as e:
             print(f"Error downloading LSOA: {e}")
-            df['LSOA code'] = ""
-            df['LSOA name'] = ""
-            return df
+            return None
             
-    with open(LSOA_FILE, 'r') as f:
+    with open(path, 'r') as f:
         geojson = json.load(f)
         
     lsoa_polys = []
@@ -162,12 +168,25 @@ def assign_lsoa(df):
             'name': props['LSOA11NM'],
             'poly': prep(shape(feature['geometry']))
         })
+    return lsoa_polys
+
+def assign_lsoa(df, lsoa_polys=None, region=None):
+    region = region or get_region()
+    print("Step 3: Assigning LSOA Codes...")
+    
+    if lsoa_polys is None:
+        lsoa_polys = load_lsoa_polygons(region)
+    if lsoa_polys is None:
+        df['LSOA code'] = ""
+        df['LSOA name'] = ""
+        return df
         
     unique_coords = df[['Latitude', 'Longitude']].drop_duplicates()
     coord_map = {}
     
     print(f"Mapping {len(unique_coords)} locations to LSOAs...")
     for idx, row in tqdm(unique_coords.iterrows(), total=len(unique_coords)):
+        STAGE_ROWS.inc(stage="assign_lsoa")
         lat, lon = row['Latitude'], row['Longitude']
         pt = Point(lon, lat)
         
@@ -180,7 +199,7 @@ def assign_lsoa(df):
         if match:
             coord_map[(lat, lon)] = match
         else:
-            coord_map[(lat, lon)] = ("E01000000", "Leeds (Unmatched)")
+            coord_map[(lat, lon)] = ("E01000000", f"{region['name']} (Unmatched)")
             
     codes = []
     names = []
@@ -195,17 +214,24 @@ def assign_lsoa(df):
     
     return df
 
-def process_api_data():
-    df = normalize_raw_data()
+def process_api_data(region=None):
+    region = region or get_region()
+    output_file = data_file(region, OUTPUT_NAME)
+    df = normalize_raw_data(region)
     if df is None: return
     
-    df = filter_leeds_boundary(df)
+    df = filter_boundary(df, region=region)
     
-    df = assign_lsoa(df)
+    df = apply_schema(assign_lsoa(df, region=region))
+    report_memory(df, f"Processed {region['name']} API data")
     
-    print(f"Saving {len(df)} records to {OUTPUT_FILE}...")
-    df.to_csv(OUTPUT_FILE, index=False)
+    print(f"Saving {len(df)} records to {output_file}...")
+    write_dataset(df, output_file)
     print("Done.")
 
 if __name__ == "__main__":
-    process_api_data()
+    parser = argparse.ArgumentParser(description="Normalise raw API months, filter to the region boundary, assign LSOAs")
+    parser.add_argument("--region", default=None, help="Region key (default leeds)")
+    args = parser.parse_args()
+
+    process_api_data(get_region(args.region))
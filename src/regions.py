@@ -0,0 +1,188 @@
+"""
+Region profiles.
+
+A region is a local authority district inside a police force area. Its profile
+holds everything the pipeline used to hard-code for Leeds: the force whose
+archive files and API records it comes from, the Nominatim query for its
+boundary, the LSOA name prefix, a bounding box for the API grid and the valid
+ward names. Output files are prefixed with the region's key, so Leeds keeps its
+existing paths (data/processed/leeds_street_combined.csv etc.).
+
+Regions sharing a force share its work: each month's archive CSV is parsed
+once and split between them, and each API grid point is queried once per
+month. Boundaries are stored under data/raw/boundaries/ after the first fetch,
+and postcode lookups go through one cache shared by every region.
+
+    python src/main.py --region leeds,bradford,wakefield
+"""
+
+import json
+import os
+import threading
+from urllib.parse import quote, quote_plus
+
+DEFAULT_REGION = "leeds"
+BOUNDARY_DIR = "data/raw/boundaries"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+LSOA_QUERY_URL = "https://services1.arcgis.com/ESMARspQHYMw9BZ9/arcgis/rest/services/LSOA_Dec_2011_Boundaries_Generalised_Clipped_BGC_EW_V3/FeatureServer/0/query"
+USER_AGENT = "LeedsCrimeAnalysis/1.0"
+# Padding around a region's box when splitting shared API results between regions
+BBOX_MARGIN = 0.01
+
+LEEDS_WARDS = {
+    "Adel & Wharfedale", "Alwoodley", "Ardsley & Robin Hood", "Armley",
+    "Beeston & Holbeck", "Bramley & Stanningley", "Burmantofts & Richmond Hill",
+    "Calverley & Farsley", "Chapel Allerton", "Cross Gates & Whinmoor",
+    "Farnley & Wortley", "Garforth & Swillington", "Gipton & Harehills",
+    "Guiseley & Rawdon", "Harewood", "Headingley & Hyde Park", "Horsforth",
+    "Hunslet & Riverside", "Killingbeck & Seacroft", "Kippax & Methley",
+    "Kirkstall", "Little London & Woodhouse", "Middleton Park", "Moortown",
+    "Morley North", "Morley South", "Otley & Yeadon", "Pudsey", "Rothwell",
+    "Roundhay", "Temple Newsam", "Weetwood", "Wetherby"
+}
+
+# bbox is (min_lat, max_lat, min_lon, max_lon) and generously covers the district;
+# the boundary polygon does the exact filtering. wards=None skips the strict ward
+# filter in enrich_data. Only Leeds publishes the polling district layer, and the
+# data_quality RULES (LS postcodes, Leeds bbox) only describe Leeds.
+REGIONS = {
+    'leeds': {
+        'name': "Leeds",
+        'force': "west-yorkshire",
+        'force_name': "West Yorkshire Police",
+        'boundary_query': "Leeds, West Yorkshire, United Kingdom",
+        'lsoa_prefix': "Leeds",
+        'bbox': (53.69, 53.96, -1.80, -1.29),
+        'wards': LEEDS_WARDS,
+        'city_centre_ward': "Little London & Woodhouse",
+        'polling_districts': True,
+        'quality_rules': True,
+    },
+    'bradford': {
+        'name': "Bradford",
+        'force': "west-yorkshire",
+        'force_name': "West Yorkshire Police",
+        'boundary_query': "City of Bradford, West Yorkshire, United Kingdom",
+        'lsoa_prefix': "Bradford",
+        'bbox': (53.72, 53.97, -2.07, -1.64),
+        'wards': None,
+        'city_centre_ward': "City",
+        'polling_districts': False,
+        'quality_rules': False,
+    },
+    'wakefield': {
+        'name': "Wakefield",
+        'force': "west-yorkshire",
+        'force_name': "West Yorkshire Police",
+        'boundary_query': "City of Wakefield, West Yorkshire, United Kingdom",
+        'lsoa_prefix': "Wakefield",
+        'bbox': (53.57, 53.75, -1.63, -1.20),
+        'wards': None,
+        'city_centre_ward': None,
+        'polling_districts': False,
+        'quality_rules': False,
+    },
+}
+
+_boundaries = {}
+_boundary_lock = threading.Lock()
+
+
+def get_region(key=None):
+    """The profile for key (default Leeds), with its key added as 'key'."""
+    key = (key or DEFAULT_REGION).strip().lower()
+    if key not in REGIONS:
+        raise ValueError(f"Unknown region {key!r} (known: {', '.join(sorted(REGIONS))})")
+    return {'key': key, **REGIONS[key]}
+
+
+def parse_regions(text):
+    """Profiles for a comma-separated list of region keys, in order and without repeats."""
+    keys = [k.strip().lower() for k in text.split(",") if k.strip()]
+    return [get_region(k) for k in dict.fromkeys(keys)] or [get_region()]
+
+
+def by_force(regions):
+    """{force: [regions in it]}, preserving order."""
+    grouped = {}
+    for region in regions:
+        grouped.setdefault(region['force'], []).append(region)
+    return grouped
+
+
+def data_file(region, name, directory="data/processed"):
+    """Path of a per-region file, e.g. data_file(leeds, "street_combined.csv")."""
+    return os.path.join(directory, f"{region['key']}_{name}")
+
+
+def lsoa_file(region):
+    return data_file(region, "lsoa_2011.geojson", "data/raw")
+
+
+def lsoa_url(region):
+    where = quote(f"LSOA11NM like '{region['lsoa_prefix']}%'")
+    return f"{LSOA_QUERY_URL}?where={where}&outFields=*&f=geojson"
+
+
+def boundary_url(region):
+    return f"{NOMINATIM_URL}?q={quote_plus(region['boundary_query'], safe=',')}&polygon_geojson=1&format=json"
+
+
+def boundary_file(region):
+    return os.path.join(BOUNDARY_DIR, f"{region['key']}.geojson")
+
+
+def in_bbox(region, lats, lons, margin=0.0):
+    """Boolean mask of the points inside the region's bounding box."""
+    import numpy as np
+
+    min_lat, max_lat, min_lon, max_lon = region['bbox']
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    return ((lats >= min_lat - margin) & (lats <= max_lat + margin)
+            & (lons >= min_lon - margin) & (lons <= max_lon + margin))
+
+
+def _fetch_boundary(region):
+    import requests
+
+    resp = requests.get(boundary_url(region), headers={'User-Agent': USER_AGENT}, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+
+    for item in data:
+        if item.get('geojson') and item.get('type') == 'administrative':
+            return item['geojson']
+    if data and data[0].get('geojson'):
+        return data[0]['geojson']
+    raise Exception("No polygon found")
+
+
+def load_boundary(region, refresh=False):
+    """
+    The region's administrative polygon as a shapely geometry, or None if unavailable.
+    Fetched from Nominatim once, then read from the boundary store and kept in memory.
+    """
+    from shapely.geometry import shape
+
+    with _boundary_lock:
+        if region['key'] in _boundaries and not refresh:
+            return _boundaries[region['key']]
+
+        path = boundary_file(region)
+        if os.path.exists(path) and not refresh:
+            with open(path) as f:
+                geometry = json.load(f)
+        else:
+            try:
+                print(f"Fetching {region['name']} boundary...")
+                geometry = _fetch_boundary(region)
+            except Exception as e:
+                print(f"Error fetching boundary: {e}")
+                return None
+            os.makedirs(BOUNDARY_DIR, exist_ok=True)
+            with open(path + ".tmp", 'w') as f:
+                json.dump(geometry, f)
+            os.replace(path + ".tmp", path)
+
+        _boundaries[region['key']] = shape(geometry)
+        return _boundaries[region['key']]
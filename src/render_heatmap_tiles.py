@@ -0,0 +1,235 @@
+"""
+Renders static heatmap tiles for the dashboard.
+Builds a kernel density raster per year and crime type with an FFT convolution
+over a fixed Web Mercator pixel grid, then slices it into z/x/y tiles so the
+browser only has to display images instead of computing the heatmap itself.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from schema import month_years, read_dataset, with_constants
+from spatial_grid import MAX_LAT, MAX_LON, MIN_LAT, MIN_LON
+
+INPUT_PATH = os.path.join("data", "processed", "leeds_street_combined.csv")
+OUTPUT_DIR = os.path.join("dashboard", "tiles")
+
+MIN_ZOOM = 10
+MAX_ZOOM = 13
+TILE_SIZE = 256
+
+# Matches the radius/blur the client-side L.heatLayer used, in screen pixels.
+KERNEL_SIGMA_PX = 12
+SATURATION_PERCENTILE = 99.5
+
+GRADIENT = [
+    (0.0, "#0d0887"),
+    (0.2, "#5302a3"),
+    (0.4, "#8b0aa5"),
+    (0.6, "#db5c68"),
+    (0.8, "#febd2a"),
+    (1.0, "#f0f921"),
+]
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def lonlat_to_pixels(lon, lat, zoom):
+    """Project WGS84 coordinates to global Web Mercator pixel coordinates."""
+    scale = TILE_SIZE * (2 ** zoom)
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = (np.asarray(lon) + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / math.pi) / 2.0 * scale
+    return x, y
+
+
+def tile_range(zoom):
+    """Return (min_tx, min_ty, max_tx, max_ty) of the tiles covering the bounds."""
+    x0, y0 = lonlat_to_pixels(MIN_LON, MAX_LAT, zoom)
+    x1, y1 = lonlat_to_pixels(MAX_LON, MIN_LAT, zoom)
+    return (int(x0 // TILE_SIZE), int(y0 // TILE_SIZE),
+            int(x1 // TILE_SIZE), int(y1 // TILE_SIZE))
+
+
+def gaussian_kernel(sigma):
+    radius = int(math.ceil(3 * sigma))
+    axis = np.arange(-radius, radius + 1, dtype=np.float64)
+    k1 = np.exp(-(axis ** 2) / (2 * sigma ** 2))
+    kernel = np.outer(k1, k1)
+    return kernel / kernel.sum(), radius
+
+
+class DensityCanvas:
+    """
+    Fixed pixel grid for one zoom level.
+    The kernel spectrum is computed once and reused for every year/type layer.
+    """
+
+    def __init__(self, zoom, sigma=KERNEL_SIGMA_PX):
+        self.zoom = zoom
+        self.min_tx, self.min_ty, self.max_tx, self.max_ty = tile_range(zoom)
+        self.width = (self.max_tx - self.min_tx + 1) * TILE_SIZE
+        self.height = (self.max_ty - self.min_ty + 1) * TILE_SIZE
+
+        kernel, self.radius = gaussian_kernel(sigma)
+        # Pad to avoid circular wrap-around from the FFT convolution.
+        self.fft_shape = (self.height + 2 * self.radius, self.width + 2 * self.radius)
+        padded = np.zeros(self.fft_shape)
+        size = kernel.shape[0]
+        padded[:size, :size] = kernel
+        self.kernel_fft = np.fft.rfft2(padded)
+
+    def histogram(self, lons, lats, weights=None):
+        x, y = lonlat_to_pixels(lons, lats, self.zoom)
+        col = np.floor(x - self.min_tx * TILE_SIZE).astype(np.int64)
+        row = np.floor(y - self.min_ty * TILE_SIZE).astype(np.int64)
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height)
+
+        flat = (row[inside] + self.radius) * self.fft_shape[1] + (col[inside] + self.radius)
+        w = None if weights is None else np.asarray(weights)[inside]
+        counts = np.bincount(flat, weights=w, minlength=self.fft_shape[0] * self.fft_shape[1])
+        return counts.reshape(self.fft_shape)
+
+    def density(self, lons, lats, weights=None):
+        grid = self.histogram(lons, lats, weights)
+        smoothed = np.fft.irfft2(np.fft.rfft2(grid) * self.kernel_fft, s=self.fft_shape)
+        # The kernel sits at the origin, so the output is shifted by its radius.
+        r = self.radius
+        out = smoothed[2 * r:2 * r + self.height, 2 * r:2 * r + self.width]
+        return np.clip(out, 0, None)
+
+
+def build_colormap():
+    """256-entry RGBA lookup table from the dashboard gradient."""
+    stops = np.array([s for s, _ in GRADIENT])
+    colours = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for _, c in GRADIENT], dtype=np.float64)
+    levels = np.linspace(0, 1, 256)
+
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.interp(levels, stops, colours[:, channel]).round()
+    lut[:, 3] = (np.clip(levels * 2.5, 0, 1) * 220).round()
+    lut[0, 3] = 0
+    return lut
+
+
+def encode_png(rgba):
+    """Encode an (H, W, 4) uint8 array as a PNG without any imaging dependency."""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def write_tiles(levels, canvas, layer_dir, lut, fmt="png"):
+    """Slice a quantised (0-255) raster into tiles, skipping empty ones."""
+    written = 0
+    ext = "png" if fmt == "png" else "bin"
+    for ty in range(canvas.max_ty - canvas.min_ty + 1):
+        for tx in range(canvas.max_tx - canvas.min_tx + 1):
+            tile = levels[ty * TILE_SIZE:(ty + 1) * TILE_SIZE, tx * TILE_SIZE:(tx + 1) * TILE_SIZE]
+            if not tile.any():
+                continue
+
+            tile_dir = os.path.join(layer_dir, str(canvas.zoom), str(canvas.min_tx + tx))
+            os.makedirs(tile_dir, exist_ok=True)
+            path = os.path.join(tile_dir, f"{canvas.min_ty + ty}.{ext}")
+
+            with open(path, "wb") as f:
+                if fmt == "png":
+                    f.write(encode_png(lut[tile]))
+                else:
+                    f.write(tile.tobytes())
+            written += 1
+    return written
+
+
+def render_heatmap_tiles(min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, fmt="png"):
+    print(f"Loading data from {INPUT_PATH}...")
+    df = read_dataset(INPUT_PATH, columns=['Latitude', 'Longitude', 'Month', 'Crime type'], compact=True)
+    # A dataset with a single crime type has it moved into attrs by compact
+    df = with_constants(df)
+    df = df[df['Month'] >= 0].dropna(subset=['Latitude', 'Longitude', 'Crime type'])
+    df['Year'] = month_years(df['Month'])
+    print(f"Records with valid data: {len(df):,}")
+
+    crime_types = sorted(df['Crime type'].unique().tolist())
+    years = sorted(df['Year'].unique().tolist())
+    type_slugs = {slugify(t): t for t in crime_types}
+
+    # Collapse repeated coordinates into weights before binning.
+    weighted = (df.groupby(['Year', 'Crime type', 'Latitude', 'Longitude'], observed=True)
+                .size().reset_index(name='count'))
+
+    layers = []
+    for year in years:
+        year_df = weighted[weighted['Year'] == year]
+        layers.append((str(year), "all", year_df))
+        for slug, crime_type in type_slugs.items():
+            layers.append((str(year), slug, year_df[year_df['Crime type'] == crime_type]))
+
+    lut = build_colormap()
+    total_tiles = 0
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        canvas = DensityCanvas(zoom)
+        print(f"Zoom {zoom}: {canvas.width}x{canvas.height}px canvas, {len(layers)} layers...")
+
+        for year, slug, layer_df in layers:
+            if layer_df.empty:
+                continue
+
+            density = canvas.density(layer_df['Longitude'].values, layer_df['Latitude'].values,
+                                     layer_df['count'].values)
+            nonzero = density[density > 1e-9]
+            if nonzero.size == 0:
+                continue
+
+            saturation = np.percentile(nonzero, SATURATION_PERCENTILE)
+            levels = np.clip(density / saturation * 255, 0, 255).astype(np.uint8)
+
+            layer_dir = os.path.join(OUTPUT_DIR, year, slug)
+            total_tiles += write_tiles(levels, canvas, layer_dir, lut, fmt)
+
+    index = {
+        'types': type_slugs,
+        'years': [int(y) for y in years],
+        'minZoom': min_zoom,
+        'maxZoom': max_zoom,
+        'format': fmt,
+        'bounds': [[MIN_LAT, MIN_LON], [MAX_LAT, MAX_LON]]
+    }
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with open(os.path.join(OUTPUT_DIR, "index.json"), 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+
+    print(f"Done! Wrote {total_tiles:,} tiles to {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render static heatmap tiles for the dashboard")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--format", choices=["png", "bin"], default="png",
+                        help="PNG images or raw uint8 density tiles")
+    args = parser.parse_args()
+
+    render_heatmap_tiles(args.min_zoom, args.max_zoom, args.format)
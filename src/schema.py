@@ -0,0 +1,167 @@
+"""
+Column dtypes for the crime datasets, shared by every stage's readers and writers.
+
+Repeated strings (Month, Crime type, LSOA/ward names, ...) are loaded as
+categoricals instead of one Python object per row. Coordinates stay float64 in
+the default schema: they are written back to disk and used as exact join keys,
+and float32 cannot hold six decimal places at Leeds' latitude (~0.4 m steps).
+
+compact=True is for read-only consumers such as the dashboard and tile
+renderer. It additionally narrows coordinates to float32, stores Month as int32
+period codes (months since 1970-01) and moves constant columns into df.attrs,
+from where with_constants() puts them back. Compact frames cannot be written back.
+"""
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from data_quality import compute_manifest, save_manifest
+from metrics import counter
+
+CATEGORY_COLUMNS = [
+    'Month', 'Reported by', 'Falls within', 'Location', 'LSOA code', 'LSOA name',
+    'Crime type', 'Last outcome category', 'Context', 'Ward Name',
+    'Postcode District', 'Polling District',
+]
+DTYPES = {
+    **{column: 'category' for column in CATEGORY_COLUMNS},
+    'Crime ID': str,
+    'Longitude': 'float64',
+    'Latitude': 'float64',
+    'Enrichment Radius': 'float32',
+}
+COMPACT_DTYPES = {'Longitude': 'float32', 'Latitude': 'float32'}
+MONTH_EPOCH_YEAR = 1970
+
+ROWS_WRITTEN = counter("dataset_rows_written", "Rows written per dataset file", ["dataset"])
+
+
+def month_codes(months):
+    """'YYYY-MM' labels to int32 months since 1970-01 (-1 where missing)."""
+    periods = pd.PeriodIndex(pd.Series(months, dtype=object), freq='M')
+    return np.where(periods.isna(), -1, periods.asi8).astype(np.int32)
+
+
+def month_labels(codes):
+    """Inverse of month_codes."""
+    codes = np.asarray(codes)
+    labels = pd.PeriodIndex.from_ordinals(codes, freq='M').strftime('%Y-%m').to_numpy(dtype=object)
+    labels[codes < 0] = np.nan
+    return labels
+
+
+def month_years(codes):
+    return np.asarray(codes) // 12 + MONTH_EPOCH_YEAR
+
+
+def report_memory(df, label):
+    mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    print(f"{label}: {len(df):,} rows, {mb:.1f} MB in memory")
+
+
+def add_categories(series, values):
+    """Make sure a categorical column can hold values before assigning them."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        missing = pd.Index(pd.unique(pd.Series(values, dtype=object).dropna())).difference(series.cat.categories)
+        if len(missing):
+            return series.cat.add_categories(missing)
+    return series
+
+
+def apply_schema(df, compact=False):
+    """Convert an in-memory frame to the registry dtypes."""
+    for column, dtype in DTYPES.items():
+        if column in df.columns and column != 'Crime ID' and str(df[column].dtype) != dtype:
+            df[column] = df[column].astype(dtype)
+    return _compact(df) if compact else df
+
+
+def _compact(df):
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in df.columns:
+            df[column] = df[column].astype(dtype)
+    if 'Month' in df.columns:
+        df['Month'] = month_codes(df['Month'])
+
+    constants = {}
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and column != 'Month' and len(df) and df[column].nunique(dropna=False) == 1:
+            constants[column] = df[column].iloc[0]
+    df = df.drop(columns=list(constants))
+    df.attrs['constants'] = constants
+    df.attrs['compact'] = True
+    return df
+
+
+def with_constants(df):
+    """A compact frame with the constant columns it moved into attrs put back, for grouping or filtering."""
+    constants = df.attrs.get('constants', {})
+    if not constants:
+        return df
+    return df.assign(**{column: pd.Series(value, index=df.index, dtype='category')
+                        for column, value in constants.items()})
+
+
+def read_dataset(path, columns=None, compact=False, report=True, version=None, snapshot=True, **kwargs):
+    """
+    Read a crime CSV with the registry dtypes, optionally only some columns.
+    Where the file has a delta log (see delta_store) this is its latest snapshot,
+    or the one at version; snapshot=False reads the CSV alone. Extra pandas
+    options (nrows, chunksize, ...) act on the snapshot as they would on the CSV.
+    """
+    df = None
+    source, header = path, None
+    if snapshot and (version is not None or os.path.isdir(os.path.splitext(path)[0] + ".deltas")):
+        from delta_store import snapshot as delta_snapshot
+
+        df = delta_snapshot(path, version, columns)
+        if df is not None and kwargs:
+            # Re-parse the snapshot as CSV so the options behave exactly as without deltas
+            source, header, df = io.StringIO(df.to_csv(index=False)), df.columns, None
+
+    if df is None:
+        header = pd.read_csv(path, nrows=0).columns if header is None else header
+        wanted = header if columns is None else [c for c in header if c in columns]
+        dtypes = {column: DTYPES[column] for column in wanted if column in DTYPES}
+        df = pd.read_csv(source, usecols=columns, dtype=dtypes, **kwargs)
+    if compact:
+        df = _compact(df)
+    if report:
+        report_memory(df, f"Loaded {os.path.basename(path)}")
+    return df
+
+
+def concat_datasets(dfs):
+    """Concatenate frames, unioning categories so categorical columns stay categorical."""
+    dfs = [df for df in dfs if len(df)] or dfs[:1]
+    if len(dfs) <= 1:
+        return dfs[0].reset_index(drop=True) if dfs else pd.DataFrame()
+
+    columns = list(dict.fromkeys(c for df in dfs for c in df.columns))
+    combined = pd.concat(dfs, ignore_index=True)
+    for column in columns:
+        parts = [df[column] for df in dfs if column in df.columns]
+        if len(parts) == len(dfs) and all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            combined[column] = union_categoricals(parts, ignore_order=True)
+    return combined
+
+
+def write_dataset(df, path, manifest=True):
+    """
+    Atomically write a frame as CSV (via a .tmp file renamed into place), plus
+    its statistics manifest (see data_quality) unless manifest=False.
+    """
+    if df.attrs.get('compact'):
+        raise ValueError("Compact frames are lossy and read-only; read without compact=True to write.")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".tmp"
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
+    ROWS_WRITTEN.inc(len(df), dataset=os.path.basename(path))
+    if manifest:
+        save_manifest(compute_manifest(df), path)
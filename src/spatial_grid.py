@@ -0,0 +1,45 @@
+"""
+Project-wide spatial grid definition.
+Cells are anchored to fixed constants rather than to the extent of the data,
+so a cell index refers to the same patch of ground on every run and new
+records never shift existing cells.
+"""
+
+import numpy as np
+
+# Leeds district bounding box (the same box used for the API grid search).
+MIN_LAT = 53.69
+MAX_LAT = 53.96
+MIN_LON = -1.80
+MAX_LON = -1.29
+
+GRID_ROWS = 80
+GRID_COLS = 80
+
+CELL_LAT = (MAX_LAT - MIN_LAT) / GRID_ROWS
+CELL_LON = (MAX_LON - MIN_LON) / GRID_COLS
+
+# Bump when any constant above changes so cached aggregates are rebuilt.
+GRID_VERSION = 1
+
+
+def cell_indices(lats, lons):
+    """
+    Map coordinates to (row, col) cell indices.
+    Points outside the bounding box get indices outside 0..GRID_ROWS-1 and
+    0..GRID_COLS-1 instead of being clipped, so they stay in their own stable cells.
+    """
+    rows = np.floor((np.asarray(lats, dtype=np.float64) - MIN_LAT) / CELL_LAT).astype(np.int64)
+    cols = np.floor((np.asarray(lons, dtype=np.float64) - MIN_LON) / CELL_LON).astype(np.int64)
+    return rows, cols
+
+
+def cell_centres(rows, cols, decimals=4):
+    """Return the rounded (lat, lon) centre of each cell."""
+    lats = MIN_LAT + (np.asarray(rows) + 0.5) * CELL_LAT
+    lons = MIN_LON + (np.asarray(cols) + 0.5) * CELL_LON
+    return np.round(lats, decimals), np.round(lons, decimals)
+
+
+def grid_centre(decimals=4):
+    return round((MIN_LAT + MAX_LAT) / 2, decimals), round((MIN_LON + MAX_LON) / 2, decimals)
@@ -0,0 +1,106 @@
+"""
+Bulk point-in-polygon joins backed by a Shapely STRtree.
+
+Points are queried as whole coordinate arrays, so only the few polygons whose
+bounding boxes overlap a point are tested exactly. Very large inputs are split
+into chunks and spread across a process pool; each worker rebuilds the tree
+once from WKB passed at start-up instead of receiving geometry per chunk.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import shapely
+
+CHUNK_SIZE = 50000
+PARALLEL_THRESHOLD = 200000
+
+_worker_tree = None
+
+
+def _first_match(n, point_idx, poly_idx):
+    """Lowest polygon index containing each point, -1 where there is none."""
+    result = np.full(n, -1, dtype=np.int64)
+    if len(point_idx) == 0:
+        return result
+
+    order = np.lexsort((poly_idx, point_idx))
+    point_idx, poly_idx = point_idx[order], poly_idx[order]
+    first = np.ones(len(point_idx), dtype=bool)
+    first[1:] = point_idx[1:] != point_idx[:-1]
+    result[point_idx[first]] = poly_idx[first]
+    return result
+
+
+def _query(tree, lons, lats):
+    points = shapely.points(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+    point_idx, poly_idx = tree.query(points, predicate="within")
+    return _first_match(len(points), point_idx, poly_idx)
+
+
+def _init_worker(polygons_wkb):
+    global _worker_tree
+    _worker_tree = shapely.STRtree(shapely.from_wkb(polygons_wkb))
+
+
+def _query_chunk(chunk):
+    lons, lats = chunk
+    return _query(_worker_tree, lons, lats)
+
+
+def points_in_polygons(lons, lats, polygons, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Return, for each (lon, lat), the index of the first polygon that contains it,
+    or -1. Missing coordinates never match.
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    polygons = np.asarray(polygons, dtype=object)
+
+    if len(polygons) == 0:
+        return np.full(len(lons), -1, dtype=np.int64)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(lons) < PARALLEL_THRESHOLD:
+        return _query(shapely.STRtree(polygons), lons, lats)
+
+    chunks = [(lons[i:i + chunk_size], lats[i:i + chunk_size]) for i in range(0, len(lons), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(shapely.to_wkb(polygons),)) as executor:
+        results = list(executor.map(_query_chunk, chunks))
+    return np.concatenate(results)
+
+
+def _metre_scale(polygons):
+    """Equirectangular metres-per-degree factors around the polygons' centre latitude."""
+    min_x, min_y, max_x, max_y = shapely.total_bounds(polygons)
+    lat0 = np.radians((min_y + max_y) / 2)
+    return np.array([111320.0 * np.cos(lat0), 110574.0])
+
+
+def nearest_polygons(lons, lats, polygons, max_distance_m):
+    """
+    Index of the nearest polygon within max_distance_m of each point, or -1.
+    Distances are measured in a local equirectangular projection, which is
+    accurate to well under a metre at district scale.
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    polygons = np.asarray(polygons, dtype=object)
+    result = np.full(len(lons), -1, dtype=np.int64)
+
+    valid = ~(np.isnan(lons) | np.isnan(lats))
+    if len(polygons) == 0 or not valid.any():
+        return result
+
+    scale = _metre_scale(polygons)
+    projected = shapely.transform(polygons, lambda coords: coords * scale)
+    points = shapely.points(lons[valid] * scale[0], lats[valid] * scale[1])
+
+    tree = shapely.STRtree(projected)
+    point_idx, poly_idx = tree.query_nearest(points, max_distance=max_distance_m, all_matches=False)
+    result[np.flatnonzero(valid)[point_idx]] = poly_idx
+    return result
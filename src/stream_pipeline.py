@@ -0,0 +1,172 @@
+"""
+Streaming fetch + process for the Police API data.
+
+A producer thread fetches one month at a time (or reads it from the raw cache)
+and hands it through a bounded queue to worker threads. Each worker normalises
+the month, filters it to the region's boundary, assigns LSOAs and writes a
+per-month partition as soon as it is done. Network time overlaps with
+processing, and at most QUEUE_SIZE + workers months are held in memory.
+The partitions are then concatenated into the same output file that
+process_api_data produces.
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+from data_quality import combine_manifests, compute_manifest, load_manifest, save_manifest
+from fetch_data import fetch_month, grid_points, month_output_file, month_range
+from metrics import STAGE_ROWS, gauge
+from process_api_data import (
+    OUTPUT_NAME, as_boundary_index, assign_lsoa, filter_boundary, load_boundary,
+    load_lsoa_polygons, normalize_frame,
+)
+from regions import data_file, get_region
+from schema import apply_schema, read_dataset, write_dataset
+
+PARTITION_DIR = "data/processed/api_partitions"
+QUEUE_SIZE = 2
+DEFAULT_WORKERS = 2
+
+QUEUE_DEPTH = gauge("stream_queue_depth", "Fetched months waiting for a worker")
+
+_DONE = object()
+
+
+def region_partition_dir(region):
+    """Leeds keeps the original partition directory; other regions get their own."""
+    return PARTITION_DIR if region['key'] == get_region()['key'] else f"{PARTITION_DIR}_{region['key']}"
+
+
+def partition_file(date, partition_dir=PARTITION_DIR):
+    return os.path.join(partition_dir, f"{date}.csv")
+
+
+def _produce(dates, work, raw_dir, partition_dir, workers, errors, region):
+    try:
+        for date in dates:
+            if os.path.exists(partition_file(date, partition_dir)):
+                print(f"Skipping {date}, partition already exists.")
+                continue
+
+            raw_file = month_output_file(date, raw_dir, region)
+            if os.path.exists(raw_file):
+                df = pd.read_csv(raw_file)
+            else:
+                df = fetch_month(date, grid_points([region]))
+                if df is None:
+                    continue
+                df.to_csv(raw_file, index=False)
+
+            # Blocks while the queue is full, so fetching never runs far ahead of processing
+            work.put((date, df))
+            QUEUE_DEPTH.set(work.qsize())
+    except Exception as e:
+        errors.append(e)
+    finally:
+        for _ in range(workers):
+            work.put(_DONE)
+
+
+def _consume(work, boundary, lsoa_polys, partition_dir, errors, region):
+    while True:
+        item = work.get()
+        QUEUE_DEPTH.set(work.qsize())
+        if item is _DONE:
+            return
+
+        date, df = item
+        try:
+            start = time.time()
+            df = normalize_frame(df, region)
+            df = filter_boundary(df, boundary, region)
+            df = apply_schema(assign_lsoa(df, lsoa_polys, region))
+
+            write_dataset(df, partition_file(date, partition_dir))
+            STAGE_ROWS.inc(len(df), stage="stream_api")
+            print(f"Wrote {date} partition ({len(df)} records) in {time.time() - start:.1f}s")
+        except Exception as e:
+            print(f"Error processing {date}: {e}")
+            errors.append(e)
+
+
+def combine_partitions(months, partition_dir=PARTITION_DIR, output_file=None):
+    """
+    Concatenate the partitions of months into output_file one at a time, in month
+    order. Other files in partition_dir (other runs' months, stray CSVs) are left out;
+    months without a partition, which had no records, are skipped.
+    """
+    output_file = output_file or data_file(get_region(), OUTPUT_NAME)
+    partitions = [path for path in (partition_file(month, partition_dir) for month in sorted(set(months)))
+                  if os.path.exists(path)]
+    if not partitions:
+        print("No partitions to combine.")
+        return 0
+
+    temp_file = output_file + ".tmp"
+    total = 0
+    manifests = []
+    for i, path in enumerate(partitions):
+        df = read_dataset(path, report=False)
+        df.to_csv(temp_file, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        total += len(df)
+        manifests.append(load_manifest(path) or compute_manifest(df))
+
+    os.replace(temp_file, output_file)
+    save_manifest(combine_manifests(manifests), output_file)
+    print(f"Combined {len(partitions)} partitions ({total} records) into {output_file}")
+    return total
+
+
+def stream_api_data(start_date, end_date, workers=DEFAULT_WORKERS, raw_dir="data/raw",
+                    partition_dir=None, output_file=None, region=None):
+    region = region or get_region()
+    partition_dir = partition_dir or region_partition_dir(region)
+    output_file = output_file or data_file(region, OUTPUT_NAME)
+    os.makedirs(raw_dir, exist_ok=True)
+    os.makedirs(partition_dir, exist_ok=True)
+
+    # Shared by every worker instead of being reloaded per month; indexed here,
+    # once, because preparing one geometry from several threads can crash GEOS
+    boundary = as_boundary_index(load_boundary(region))
+    lsoa_polys = load_lsoa_polygons(region)
+
+    dates = month_range(start_date, end_date)
+    print(f"Streaming {len(dates)} {region['name']} months through {workers} worker(s)...")
+
+    work = queue.Queue(maxsize=QUEUE_SIZE)
+    errors = []
+
+    producer = threading.Thread(target=_produce, args=(dates, work, raw_dir, partition_dir, workers, errors, region))
+    consumers = [
+        threading.Thread(target=_consume, args=(work, boundary, lsoa_polys, partition_dir, errors, region))
+        for _ in range(workers)
+    ]
+
+    producer.start()
+    for t in consumers:
+        t.start()
+    producer.join()
+    for t in consumers:
+        t.join()
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} month(s) failed to stream; first error: {errors[0]}")
+
+    combine_partitions(dates, partition_dir, output_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch and process Police API months as a stream")
+    parser.add_argument("--start", default="2022-11", help="First month (YYYY-MM)")
+    parser.add_argument("--end", default="2025-12", help="Last month (YYYY-MM)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Threads normalising, filtering and assigning LSOAs")
+    parser.add_argument("--region", default=None, help="Region key (default leeds)")
+    args = parser.parse_args()
+
+    stream_api_data(args.start, args.end, workers=args.workers, region=get_region(args.region))
@@ -0,0 +1,216 @@
+"""
+Minimal TopoJSON encoder for the dashboard boundary layers.
+
+Polygons are quantised onto an integer grid, split into arcs at the points
+where neighbouring rings stop sharing an edge, and each shared arc is stored
+once. Simplification is applied per arc rather than per polygon, so adjacent
+boundaries stay coincident at every level of detail.
+"""
+
+import json
+import os
+
+import numpy as np
+from shapely.geometry import LineString, MultiPolygon, Polygon
+
+QUANTIZATION = 100000
+
+
+class Quantizer:
+    def __init__(self, bounds, n=QUANTIZATION):
+        min_x, min_y, max_x, max_y = bounds
+        self.translate = [min_x, min_y]
+        self.scale = [
+            (max_x - min_x) / (n - 1) if max_x > min_x else 1.0,
+            (max_y - min_y) / (n - 1) if max_y > min_y else 1.0
+        ]
+
+    def ring(self, coords):
+        """Quantise a ring and drop consecutive duplicate points (closing point removed)."""
+        arr = np.asarray(coords, dtype=np.float64)[:, :2]
+        q = np.round((arr - self.translate) / self.scale).astype(np.int64)
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+        q = q[keep]
+        if len(q) > 1 and tuple(q[0]) == tuple(q[-1]):
+            q = q[:-1]
+        return [tuple(p) for p in q.tolist()]
+
+
+def _polygons(geom):
+    if isinstance(geom, Polygon):
+        return [geom]
+    if isinstance(geom, MultiPolygon):
+        return list(geom.geoms)
+    if hasattr(geom, "geoms"):
+        return [g for part in geom.geoms for g in _polygons(part)]
+    return []
+
+
+def _find_junctions(rings):
+    """Points whose neighbours differ between uses are where shared edges start or stop."""
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            pair = tuple(sorted((ring[i - 1], ring[(i + 1) % n])))
+            seen = neighbours.get(point)
+            if seen is None:
+                neighbours[point] = pair
+            elif seen != pair:
+                junctions.add(point)
+    return junctions
+
+
+def _canonical_closed(ring):
+    """Rotate a junction-free ring to start at its smallest point so equal rings match."""
+    start = ring.index(min(ring))
+    rotated = ring[start:] + ring[:start]
+    return rotated + [rotated[0]]
+
+
+def _split_ring(ring, junctions):
+    cuts = [i for i, p in enumerate(ring) if p in junctions]
+    if not cuts:
+        return [_canonical_closed(ring)]
+
+    start = cuts[0]
+    rotated = ring[start:] + ring[:start]
+    closed = rotated + [rotated[0]]
+    positions = [i - start for i in cuts] + [len(ring)]
+
+    return [closed[a:b + 1] for a, b in zip(positions[:-1], positions[1:])]
+
+
+class Topology:
+    """Collects named layers of polygon features and builds shared arcs."""
+
+    def __init__(self, layers):
+        # layers: {name: [(properties, shapely geometry), ...]}
+        bounds = np.array([geom.bounds for feats in layers.values() for _, geom in feats if not geom.is_empty])
+        self.bbox = [float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+                     float(bounds[:, 2].max()), float(bounds[:, 3].max())]
+        self.quantizer = Quantizer(self.bbox)
+
+        # Quantise every ring once: objects[layer] = [(props, [[ring, ...] per polygon])]
+        self.objects = {}
+        all_rings = []
+        for name, feats in layers.items():
+            entries = []
+            for props, geom in feats:
+                polygons = []
+                for poly in _polygons(geom):
+                    rings = [self.quantizer.ring(poly.exterior.coords)]
+                    rings += [self.quantizer.ring(r.coords) for r in poly.interiors]
+                    rings = [r for r in rings if len(r) >= 3]
+                    if rings:
+                        polygons.append(rings)
+                        all_rings.extend(rings)
+                entries.append((props, polygons))
+            self.objects[name] = entries
+
+        junctions = _find_junctions(all_rings)
+
+        self.arcs = []
+        arc_index = {}
+
+        def add_arc(points):
+            key = tuple(points)
+            if key in arc_index:
+                return arc_index[key]
+            reverse_keys = [tuple(reversed(points))]
+            if points[0] == points[-1] and len(points) > 1:
+                reverse_keys.append(tuple(_canonical_closed(list(reversed(points[:-1])))))
+            for reverse_key in reverse_keys:
+                if reverse_key in arc_index:
+                    return ~arc_index[reverse_key]
+            arc_index[key] = len(self.arcs)
+            self.arcs.append(points)
+            return arc_index[key]
+
+        self.ring_arcs = {}
+        for name, entries in self.objects.items():
+            for props, polygons in entries:
+                for rings in polygons:
+                    for ring in rings:
+                        key = id(ring)
+                        if key not in self.ring_arcs:
+                            self.ring_arcs[key] = [add_arc(a) for a in _split_ring(ring, junctions)]
+
+    def _simplified_arcs(self, tolerance):
+        """Douglas-Peucker each arc in quantised units, keeping its end points."""
+        if tolerance <= 0:
+            return [list(a) for a in self.arcs]
+
+        tol_q = tolerance / min(self.quantizer.scale)
+        simplified = []
+        for arc in self.arcs:
+            if len(arc) <= 2:
+                simplified.append(list(arc))
+                continue
+            coords = LineString(arc).simplify(tol_q, preserve_topology=False).coords
+            simplified.append([(int(x), int(y)) for x, y in coords])
+
+        # A ring must keep at least three distinct vertices; restore its arcs if not.
+        for arcs in self.ring_arcs.values():
+            points = sum(len(simplified[a if a >= 0 else ~a]) - 1 for a in arcs)
+            if points < 3:
+                for a in arcs:
+                    idx = a if a >= 0 else ~a
+                    simplified[idx] = list(self.arcs[idx])
+        return simplified
+
+    def to_dict(self, tolerance=0.0):
+        arcs = []
+        for arc in self._simplified_arcs(tolerance):
+            pts = np.asarray(arc, dtype=np.int64)
+            deltas = np.vstack([pts[:1], np.diff(pts, axis=0)])
+            arcs.append(deltas.tolist())
+
+        objects = {}
+        for name, entries in self.objects.items():
+            geometries = []
+            for props, polygons in entries:
+                if not polygons:
+                    continue
+                poly_arcs = [[self.ring_arcs[id(ring)] for ring in rings] for rings in polygons]
+                if len(poly_arcs) == 1:
+                    geometries.append({"type": "Polygon", "arcs": poly_arcs[0], "properties": props})
+                else:
+                    geometries.append({"type": "MultiPolygon", "arcs": poly_arcs, "properties": props})
+            objects[name] = {"type": "GeometryCollection", "geometries": geometries}
+
+        return {
+            "type": "Topology",
+            "bbox": self.bbox,
+            "transform": {"scale": self.quantizer.scale, "translate": self.quantizer.translate},
+            "objects": objects,
+            "arcs": arcs
+        }
+
+
+def write_topojson_levels(layers, levels, output_dir, prefix):
+    """
+    Write one TopoJSON file per simplification level plus an index for the dashboard.
+    levels: [{"name": ..., "tolerance": degrees, "max_zoom": int}, ...]
+    """
+    topology = Topology(layers)
+    print(f"Built topology with {len(topology.arcs)} shared arcs.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    index = []
+    for level in levels:
+        filename = f"{prefix}.{level['name']}.topo.json"
+        path = os.path.join(output_dir, filename)
+        with open(path, 'w') as f:
+            json.dump(topology.to_dict(level['tolerance']), f, separators=(',', ':'))
+
+        size_kb = os.path.getsize(path) / 1024
+        print(f"  {filename}: {size_kb:.2f} KB (tolerance {level['tolerance']})")
+        index.append({"name": level['name'], "file": filename, "maxZoom": level['max_zoom']})
+
+    index_path = os.path.join(output_dir, f"{prefix}.index.json")
+    with open(index_path, 'w') as f:
+        json.dump({"levels": index, "objects": list(layers)}, f, separators=(',', ':'))
+    return index_path
@@ -0,0 +1,476 @@
+"""
+Month-sharded execution over a shared-filesystem work queue.
+
+`plan` splits a rebuild into one task per region and month. Archive months are
+extracted from the force's archive street CSV, along with the month's outcomes
+CSV as a separate outcomes partition; API months are fetched (or read from the
+raw cache), normalised, filtered to the boundary and given LSOAs. Either way
+the task writes one month partition and then geocodes that partition's new
+locations into a lookup shard. Any number of workers, as local processes or on
+other machines mounting the same directory, claim tasks with lock files:
+
+    data/queue/tasks/<id>.json     what to do
+    data/queue/claims/<id>.lock    created with O_EXCL by the worker running it and
+                                   touched every LEASE_SECONDS / 3 as a heartbeat
+    data/queue/done/<id>.json      written when the task has finished
+    data/queue/failed/<id>.json    error and attempt count; retried up to MAX_ATTEMPTS
+    data/queue/lookups/<id>.csv    postcode lookups found by the task
+
+A claim whose heartbeat is older than LEASE_SECONDS belongs to a dead worker
+and is broken by the next worker to see it. Every stage skips output that
+already exists and writes through a temp file, so a task that is re-run after a
+crash does no repeated work. `reduce` folds the lookup shards into the shared
+postcode cache, concatenates the street and outcomes partitions (as
+combine_leeds_data would have written them) and runs steps 4-9 (merge, enrich,
+outcomes, dashboard), where enrichment is then answered from the cache.
+
+    python src/work_queue.py plan --region leeds,bradford
+    python src/work_queue.py work --processes 8        # on every machine
+    python src/work_queue.py status
+    python src/work_queue.py reduce --region leeds,bradford
+"""
+
+import argparse
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from multiprocessing import Process
+
+from regions import data_file, get_region, parse_regions
+
+QUEUE_DIR = "data/queue"
+ARCHIVE_DIR = "data/archive"
+ARCHIVE_PARTITION_DIR = "data/processed/archive_partitions"
+ARCHIVE_OUTCOME_DIR = "data/processed/archive_outcome_partitions"
+LEASE_SECONDS = 600
+POLL_SECONDS = 5
+MAX_ATTEMPTS = 3
+ARCHIVE_RANGE = ("2018-01", "2022-10")
+API_RANGE = ("2022-11", "2025-12")
+
+
+def _dir(queue_dir, name):
+    return os.path.join(queue_dir, name)
+
+
+def _path(queue_dir, name, task_id, ext=".json"):
+    return os.path.join(queue_dir, name, task_id + ext)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- Queue -------------------------------------------------------------------
+
+def enqueue(tasks, queue_dir=QUEUE_DIR):
+    """Add tasks ({'id', ...}) that are not queued yet. Returns the number added."""
+    added = 0
+    for task in tasks:
+        path = _path(queue_dir, "tasks", task['id'])
+        if not os.path.exists(path):
+            _write_json(path, task)
+            added += 1
+    return added
+
+
+def list_tasks(queue_dir=QUEUE_DIR):
+    paths = sorted(glob.glob(os.path.join(_dir(queue_dir, "tasks"), "*.json")))
+    return [task for task in map(_read_json, paths) if task]
+
+
+def attempts(queue_dir, task_id):
+    return _read_json(_path(queue_dir, "failed", task_id), {}).get('attempts', 0)
+
+
+def is_done(queue_dir, task_id):
+    return os.path.exists(_path(queue_dir, "done", task_id))
+
+
+def _lock_state(lock_path):
+    """(owner record, mtime) of a claim's lock file, or None if there is none."""
+    try:
+        mtime = os.stat(lock_path).st_mtime
+    except FileNotFoundError:
+        return None
+    return _read_json(lock_path, {}), mtime
+
+
+def _restore_claim(moved, lock_path):
+    """Put back a live claim that was moved aside by mistake, unless a newer one has taken its place."""
+    try:
+        os.link(moved, lock_path)
+    except FileExistsError:
+        print(f"Warning: claim {lock_path} was replaced while being checked")
+    os.remove(moved)
+
+
+def claim(queue_dir, task_id, worker, lease=LEASE_SECONDS):
+    """
+    Take the lock for task_id. Returns True if this worker now owns the task.
+
+    Two workers can both see the same stale claim; if one breaks it and takes a
+    fresh claim before the other renames, the second rename moves the live
+    claim. So the moved file is compared with the one inspected, by owner and
+    heartbeat time, and put back unless it is the stale claim.
+    """
+    lock_path = _path(queue_dir, "claims", task_id, ".lock")
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            seen = _lock_state(lock_path)
+            if seen is None:
+                continue
+            if time.time() - seen[1] <= lease:
+                return False
+            broken = f"{lock_path}.stale-{worker.replace(':', '-')}"
+            try:
+                os.rename(lock_path, broken)
+            except FileNotFoundError:
+                return False
+            if _lock_state(broken) != seen:
+                _restore_claim(broken, lock_path)
+                return False
+            print(f"Breaking stale claim on {task_id}: {seen[0].get('worker')}")
+            os.remove(broken)
+            continue
+
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'worker': worker, 'claimed_at': time.time()}, f)
+        return True
+    return False
+
+
+def release(queue_dir, task_id, worker):
+    """Remove worker's claim on task_id. A claim that has since passed to another worker is left alone."""
+    lock_path = _path(queue_dir, "claims", task_id, ".lock")
+    owner = _read_json(lock_path, {}).get('worker')
+    if owner != worker:
+        if owner is not None:
+            print(f"Not releasing {task_id}: it is now claimed by {owner}")
+        return
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+class Heartbeat:
+    """Touches a claim's lock file while its task runs so other workers see it is alive."""
+
+    def __init__(self, lock_path, interval):
+        self.lock_path = lock_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def runnable(queue_dir=QUEUE_DIR):
+    """Tasks that are neither done nor out of attempts."""
+    return [t for t in list_tasks(queue_dir)
+            if not is_done(queue_dir, t['id']) and attempts(queue_dir, t['id']) < MAX_ATTEMPTS]
+
+
+def work(queue_dir=QUEUE_DIR, runner=None, worker=None, max_tasks=None, lease=LEASE_SECONDS,
+         poll=POLL_SECONDS):
+    """
+    Claim and run tasks until none are left. While the only remaining tasks are
+    claimed by other workers, keep polling so that tasks whose worker dies or fails
+    are picked up. Returns the number of tasks this worker completed.
+    """
+    runner = runner or run_task
+    worker = worker or worker_name()
+    completed = 0
+
+    while max_tasks is None or completed < max_tasks:
+        remaining = runnable(queue_dir)
+        if not remaining:
+            break
+
+        ran = False
+        for task in remaining:
+            if max_tasks is not None and completed >= max_tasks:
+                break
+            if not claim(queue_dir, task['id'], worker, lease):
+                continue
+            # Another worker may have finished it between listing and claiming
+            if is_done(queue_dir, task['id']):
+                release(queue_dir, task['id'], worker)
+                continue
+
+            ran = True
+            start = time.time()
+            print(f"[{worker}] Running {task['id']}...")
+            lock_path = _path(queue_dir, "claims", task['id'], ".lock")
+            try:
+                with Heartbeat(lock_path, lease / 3):
+                    result = runner(task, queue_dir) or {}
+            except Exception as e:
+                failures = attempts(queue_dir, task['id']) + 1
+                _write_json(_path(queue_dir, "failed", task['id']),
+                            {'attempts': failures, 'worker': worker, 'error': str(e),
+                             'traceback': traceback.format_exc()})
+                print(f"[{worker}] {task['id']} failed (attempt {failures}/{MAX_ATTEMPTS}): {e}")
+            else:
+                _write_json(_path(queue_dir, "done", task['id']),
+                            {'worker': worker, 'seconds': round(time.time() - start, 1), **result})
+                completed += 1
+                print(f"[{worker}] Finished {task['id']} in {time.time() - start:.1f}s")
+            finally:
+                release(queue_dir, task['id'], worker)
+
+        if not ran:
+            time.sleep(poll)
+
+    return completed
+
+
+def status(queue_dir=QUEUE_DIR):
+    """Counts of tasks by state."""
+    counts = {'pending': 0, 'claimed': 0, 'done': 0, 'failed': 0}
+    for task in list_tasks(queue_dir):
+        if is_done(queue_dir, task['id']):
+            counts['done'] += 1
+        elif attempts(queue_dir, task['id']) >= MAX_ATTEMPTS:
+            counts['failed'] += 1
+        elif os.path.exists(_path(queue_dir, "claims", task['id'], ".lock")):
+            counts['claimed'] += 1
+        else:
+            counts['pending'] += 1
+    return counts
+
+
+# --- Tasks -------------------------------------------------------------------
+
+def plan_tasks(regions, archive_range=ARCHIVE_RANGE, api_range=API_RANGE):
+    """One archive or API task per region and month."""
+    from fetch_data import month_range
+
+    tasks = []
+    for region in regions:
+        for kind, (start, end) in [("archive", archive_range), ("api", api_range)]:
+            for month in month_range(start, end):
+                tasks.append({'id': f"{kind}-{region['key']}-{month}", 'kind': kind,
+                              'region': region['key'], 'month': month})
+    return tasks
+
+
+def archive_partition_dir(region):
+    return os.path.join(ARCHIVE_PARTITION_DIR, region['key'])
+
+
+def archive_outcome_dir(region):
+    return os.path.join(ARCHIVE_OUTCOME_DIR, region['key'])
+
+
+def _archive_partition(region, month, path, dataset="street"):
+    from schema import read_dataset, write_dataset
+
+    source = os.path.join(ARCHIVE_DIR, month, f"{month}-{region['force']}-{dataset}.csv")
+    if not os.path.exists(source):
+        print(f"No archive file for {month} ({source}).")
+        return False
+    df = read_dataset(source, report=False)
+    df = df[df['LSOA name'].str.startswith(region['lsoa_prefix'], na=False)]
+    write_dataset(df, path)
+    return True
+
+
+# Boundaries and LSOA polygons are loaded once per worker process
+_region_geometry = {}
+
+
+def _api_partition(region, month, path):
+    import pandas as pd
+
+    from fetch_data import fetch_month, grid_points, month_output_file
+    from process_api_data import assign_lsoa, filter_boundary, load_boundary, load_lsoa_polygons, normalize_frame
+    from schema import apply_schema, write_dataset
+
+    raw_file = month_output_file(month, "data/raw", region)
+    if os.path.exists(raw_file):
+        df = pd.read_csv(raw_file)
+    else:
+        df = fetch_month(month, grid_points([region]))
+        if df is None:
+            # fetch_month logs and skips failed requests, so an empty month is
+            # treated as a failure and retried rather than recorded as done
+            raise RuntimeError(f"No API records for {region['key']} {month}")
+        os.makedirs(os.path.dirname(raw_file), exist_ok=True)
+        df.to_csv(raw_file + ".tmp", index=False)
+        os.replace(raw_file + ".tmp", raw_file)
+
+    if region['key'] not in _region_geometry:
+        _region_geometry[region['key']] = (load_boundary(region), load_lsoa_polygons(region))
+    boundary, lsoa_polys = _region_geometry[region['key']]
+
+    df = filter_boundary(normalize_frame(df, region), boundary, region)
+    write_dataset(apply_schema(assign_lsoa(df, lsoa_polys, region)), path)
+    return True
+
+
+def _geocode_partition(path, shard_path):
+    """Geocode the partition's locations missing from the shared cache into a lookup shard."""
+    import pandas as pd
+
+    from enrich_data import CACHE_COLUMNS, geocoded_lookups, load_enrichment_cache
+    from geocoding_client import PostcodesClient
+    from schema import read_dataset
+
+    cache = load_enrichment_cache()
+    coords = read_dataset(path, columns=['Latitude', 'Longitude'], report=False).drop_duplicates().dropna()
+    coords = [c for c in coords.itertuples(index=False, name=None) if c not in cache]
+
+    rows = []
+    if coords:
+        results, failed = PostcodesClient().reverse_geocode_escalating(coords)
+        for (lat, lon), v in geocoded_lookups(coords, results, failed).items():
+            rows.append((lat, lon, v['ward'], v['pcd'], v['radius']))
+        if failed:
+            # Left out of the shard, so enrich_data retries them during the reduce
+            print(f"{len(failed)} locations could not be geocoded.")
+
+    os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+    pd.DataFrame(rows, columns=CACHE_COLUMNS).to_csv(shard_path + ".tmp", index=False)
+    os.replace(shard_path + ".tmp", shard_path)
+    return len(rows)
+
+
+def run_task(task, queue_dir=QUEUE_DIR):
+    """Build one month partition and its lookup shard, skipping whichever already exist."""
+    from stream_pipeline import partition_file, region_partition_dir
+
+    region = get_region(task['region'])
+    if task['kind'] == "archive":
+        path, build = partition_file(task['month'], archive_partition_dir(region)), _archive_partition
+    elif task['kind'] == "api":
+        path, build = partition_file(task['month'], region_partition_dir(region)), _api_partition
+    else:
+        raise ValueError(f"Unknown task kind: {task['kind']}")
+
+    outcomes = None
+    if task['kind'] == "archive":
+        # Outcomes carry no locations, so they only need extracting for join_outcomes
+        outcomes = partition_file(task['month'], archive_outcome_dir(region))
+        if not os.path.exists(outcomes):
+            os.makedirs(os.path.dirname(outcomes), exist_ok=True)
+            if not _archive_partition(region, task['month'], outcomes, dataset="outcomes"):
+                outcomes = None
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Only a month missing from the archive download is done with no partition;
+        # API months raise instead, so the task is retried
+        if not build(region, task['month'], path):
+            return {'partition': None, 'outcomes': outcomes}
+
+    shard_path = _path(queue_dir, "lookups", task['id'], ".csv")
+    lookups = None
+    if not os.path.exists(shard_path):
+        lookups = _geocode_partition(path, shard_path)
+    return {'partition': path, 'outcomes': outcomes, 'lookups': lookups}
+
+
+def run_workers(processes, queue_dir=QUEUE_DIR, max_tasks=None):
+    """Run work() in several local processes."""
+    if processes <= 1:
+        return work(queue_dir, max_tasks=max_tasks)
+    workers = [Process(target=work, kwargs={'queue_dir': queue_dir, 'max_tasks': max_tasks})
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+
+
+def merge_lookup_shards(queue_dir=QUEUE_DIR):
+    """Fold every task's lookup shard into the shared postcode cache."""
+    from enrich_data import load_enrichment_cache, read_lookups, save_enrichment_cache
+
+    cache = load_enrichment_cache()
+    before = len(cache)
+    for path in sorted(glob.glob(os.path.join(_dir(queue_dir, "lookups"), "*.csv"))):
+        cache.update(read_lookups(path))
+    save_enrichment_cache(cache)
+    print(f"Added {len(cache) - before} locations to the postcode lookup cache.")
+
+
+def reduce(regions, queue_dir=QUEUE_DIR, end_step=None):
+    """Merge the partitions and shards, then run steps 4 onwards. Returns False if tasks are unfinished."""
+    from main import run_pipeline
+    from process_api_data import OUTPUT_NAME
+    from stream_pipeline import combine_partitions, region_partition_dir
+
+    counts = status(queue_dir)
+    if counts['pending'] or counts['claimed'] or counts['failed']:
+        print(f"Queue not finished: {counts}")
+        return False
+
+    merge_lookup_shards(queue_dir)
+    tasks = list_tasks(queue_dir)
+    for region in regions:
+        months = {kind: [t['month'] for t in tasks if t['region'] == region['key'] and t['kind'] == kind]
+                  for kind in ("archive", "api")}
+        combine_partitions(months["archive"], archive_partition_dir(region), data_file(region, "street_archive.csv"))
+        combine_partitions(months["archive"], archive_outcome_dir(region), data_file(region, "outcomes_combined.csv"))
+        combine_partitions(months["api"], region_partition_dir(region), data_file(region, OUTPUT_NAME))
+    return run_pipeline(start_step=4, end_step=end_step, regions=regions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline as month tasks on a shared work queue")
+    parser.add_argument("command", choices=["plan", "work", "status", "reduce"])
+    parser.add_argument("--queue", default=QUEUE_DIR, help="Queue directory on the shared filesystem")
+    parser.add_argument("--region", default="leeds", help="Comma-separated region keys (plan/reduce)")
+    parser.add_argument("--processes", type=int, default=1, help="Local worker processes (work)")
+    parser.add_argument("--max-tasks", type=int, default=None, help="Stop each worker after N tasks (work)")
+    parser.add_argument("--to", type=int, default=None, metavar="N", help="Last pipeline step to run (reduce)")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        tasks = plan_tasks(parse_regions(args.region))
+        print(f"Queued {enqueue(tasks, args.queue)} new task(s) of {len(tasks)} in {args.queue}")
+    elif args.command == "work":
+        run_workers(args.processes, args.queue, args.max_tasks)
+    elif args.command == "status":
+        print(status(args.queue))
+    else:
+        raise SystemExit(0 if reduce(parse_regions(args.region), args.queue, args.to) else 1)
@@ -1,6 +1,8 @@
 import pytest
 import requests
 import os
+import sys
+import numpy as np
 import pandas as pd
 from shapely.geometry import shape
 from shapely.prepared import prep
@@ -8,6 +10,9 @@ from shapely.prepared import prep
 LEEDS_BOUNDARY_URL = "https://nominatim.openstreetmap.org/search?q=Leeds,+West+Yorkshire,+United+Kingdom&polygon_geojson=1&format=json"
 PROCESSED_DATA_PATH = "data/processed/leeds_street_combined.csv"
 
+# Pipeline modules live in src/ and import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
 
 @pytest.fixture(scope="session")
 def leeds_boundary():
@@ -41,3 +46,45 @@ def processed_data():
         pytest.skip(f"Processed data not found at {PROCESSED_DATA_PATH}")
     
     return pd.read_csv(PROCESSED_DATA_PATH, low_memory=False)
+
+
+@pytest.fixture(scope="session")
+def manifest():
+    """Column statistics for the processed dataset, computed once if missing or stale."""
+    if not os.path.exists(PROCESSED_DATA_PATH):
+        pytest.skip(f"Processed data not found at {PROCESSED_DATA_PATH}")
+
+    from data_quality import ensure_manifest
+    return ensure_manifest(PROCESSED_DATA_PATH)
+
+
+@pytest.fixture
+def crime_sample():
+    """Factory for synthetic crimes scattered over the Leeds box.
+
+    ``crime_sample(n, seed, years, id_every, **columns)`` always builds Crime ID,
+    Month, Longitude and Latitude; every fifth Crime ID is missing unless
+    ``id_every`` says otherwise (None keeps them all). Each keyword column is
+    drawn from a list of values, from a ``{value: probability}`` dict, or set to
+    a constant; None drops a column.
+    """
+    def make(n=2000, seed=0, years=(2023,), id_every=5, **columns):
+        rng = np.random.default_rng(seed)
+        data = {
+            'Crime ID': [None if id_every and i % id_every == 0 else f"id{seed}-{i}" for i in range(n)],
+            'Month': [f"{y}-{m:02d}" for y, m in zip(rng.choice(years, n), rng.integers(1, 13, n))],
+            'Longitude': (rng.random(n) * 0.5 - 1.8).round(6),
+            'Latitude': (rng.random(n) * 0.27 + 53.69).round(6),
+            'Crime type': ['Burglary', 'Drugs', 'Robbery'],
+            'Ward Name': ['Armley', 'Pudsey', 'Unknown'],
+        }
+        data.update(columns)
+        for column, values in list(data.items()):
+            if values is None:
+                del data[column]
+            elif isinstance(values, dict):
+                data[column] = rng.choice(list(values), n, p=list(values.values()))
+            elif isinstance(values, list) and len(values) != n:
+                data[column] = rng.choice(values, n)
+        return pd.DataFrame(data)
+    return make
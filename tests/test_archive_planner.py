@@ -0,0 +1,82 @@
+"""Tests for the archive edition planner."""
+import json
+import zipfile
+
+import pandas as pd
+
+import archive_planner
+import download_archives
+from archive_planner import cover, edition_months, fetch_archive_months, plan_archives
+
+
+def monthly_editions(start, end):
+    return pd.date_range(start=start, end=end, freq='MS').strftime("%Y-%m").tolist()
+
+
+def write_edition(path, edition):
+    with zipfile.ZipFile(path, "w") as archive:
+        for month in edition_months(edition):
+            for force in ["west-yorkshire", "north-yorkshire"]:
+                archive.writestr(f"{month}/{month}-{force}-street.csv", f"Month\n{month}\n")
+
+
+class TestArchivePlanner:
+    """Verify the planner fetches the fewest, newest editions and records provenance."""
+
+    def test_minimal_newest_cover(self):
+        """58 archive months need two editions instead of one zip per month."""
+        months = monthly_editions("2018-01", "2022-10")
+        assignment, missing = cover(months, monthly_editions("2015-01", "2025-12"))
+
+        assert not missing
+        assert sorted(set(assignment.values())) == ["2020-12", "2023-12"]
+        assert assignment["2018-01"] == "2020-12"
+        assert assignment["2021-01"] == "2023-12"
+
+    def test_overlap_goes_to_newest_chosen_edition(self):
+        """Months inside two chosen editions come from the newer one."""
+        months = monthly_editions("2018-01", "2021-06")
+        assignment, _ = cover(months, ["2020-12", "2021-06"])
+
+        assert assignment["2018-06"] == "2020-12"
+        assert assignment["2018-07"] == "2021-06"
+        assert assignment["2021-06"] == "2021-06"
+
+    def test_plan_uses_disk(self, tmp_path):
+        """Extracted months are skipped and zips already on disk are used first."""
+        for month in monthly_editions("2018-01", "2018-06"):
+            (tmp_path / month).mkdir()
+            (tmp_path / month / f"{month}-west-yorkshire-street.csv").write_text("Month\n")
+        write_edition(tmp_path / "2020-06.zip", "2020-06")
+
+        plan = plan_archives("2018-01", "2022-10", available=monthly_editions("2015-01", "2025-12"),
+                             archive_dir=str(tmp_path))
+
+        assert len(plan['present']) == 6
+        assert set(plan['local'].values()) == {"2020-06"}
+        assert min(plan['local']) == "2018-07"
+        assert set(plan['download'].values()) == {"2023-06"}
+
+    def test_fetch_extracts_and_records_provenance(self, tmp_path, monkeypatch):
+        """Only the needed months of this force are extracted, with their edition recorded."""
+        downloaded = []
+
+        def fake_download(year, month, **kwargs):
+            edition = f"{year:04d}-{month:02d}"
+            downloaded.append(edition)
+            write_edition(tmp_path / f"{edition}.zip", edition)
+            return True
+
+        monkeypatch.setattr(download_archives, "ARCHIVE_DIR", tmp_path)
+        monkeypatch.setattr(archive_planner, "download_archive", fake_download)
+        monkeypatch.setattr(archive_planner, "load_checksums",
+                            lambda: {f"{e}.zip": "0" * 32 for e in monthly_editions("2015-01", "2025-12")})
+
+        fetch_archive_months("2018-01", "2022-10")
+
+        assert downloaded == ["2020-12", "2023-12"]
+        manifest = json.loads((tmp_path / "manifest.json").read_text())
+        assert len(manifest['months']) == 58
+        assert manifest['months']["2019-05"] == {'edition': "2020-12", 'files': ["2019-05-west-yorkshire-street.csv"]}
+        assert not (tmp_path / "2023-01").exists()
+        assert not list(tmp_path.glob("*.zip"))
@@ -0,0 +1,53 @@
+"""Tests for the tiered point-in-boundary index."""
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Point, Polygon
+from shapely.prepared import prep
+
+from boundary_index import BoundaryIndex
+from process_api_data import filter_boundary
+
+
+def wiggly_polygon(vertices=4000, seed=0):
+    """A dense, Leeds-sized ring with a hole, like an OSM district boundary."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    r = 0.12 * (1 + 0.15 * np.sin(7 * t) + 0.005 * rng.standard_normal(t.size))
+    hole = Point(-1.55, 53.82).buffer(0.02)
+    return Polygon(np.c_[-1.55 + 1.6 * r * np.cos(t), 53.82 + r * np.sin(t)]).difference(hole)
+
+
+class TestBoundaryIndex:
+    """Verify the index matches prepared contains exactly while rarely needing it."""
+
+    def test_matches_exact_containment(self):
+        """Random points, boundary vertices and NaNs agree with shapely's contains."""
+        polygon = wiggly_polygon()
+        index = BoundaryIndex(polygon)
+        rng = np.random.default_rng(1)
+        x = rng.uniform(-1.85, -1.25, 100_000)
+        y = rng.uniform(53.65, 54.0, 100_000)
+
+        assert index.inner is not None and index.outer is not None
+        np.testing.assert_array_equal(index.contains_xy(x, y), shapely.contains_xy(polygon, x, y))
+        assert index.last_stats['exact'] < 0.1 * x.size
+
+        bx, by = shapely.get_coordinates(polygon.boundary).T
+        assert not index.contains_xy(bx, by).any()
+        assert not index.contains_xy([np.nan], [53.8]).any()
+
+    def test_filter_boundary_unchanged(self):
+        """filter_boundary keeps the same rows as the per-point prepared test."""
+        polygon = wiggly_polygon(seed=2)
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({'Latitude': np.round(rng.uniform(53.65, 54.0, 5000), 4),
+                           'Longitude': np.round(rng.uniform(-1.85, -1.25, 5000), 4)})
+        df.loc[::97, 'Latitude'] = np.nan
+
+        prepared = prep(polygon)
+        expected = df[[not np.isnan(lat) and prepared.contains(Point(lon, lat))
+                       for lat, lon in zip(df['Latitude'], df['Longitude'])]]
+
+        pd.testing.assert_frame_equal(filter_boundary(df, BoundaryIndex(polygon)), expected)
+        pd.testing.assert_frame_equal(filter_boundary(df, prepared), expected)
@@ -0,0 +1,74 @@
+"""Tests for the indexed SQLite crime store."""
+import numpy as np
+import pytest
+
+from crime_store import build_store, open_store
+from delta_store import baseline, save_changes
+from schema import read_dataset
+
+
+class TestCrimeStore:
+    """Verify store queries agree with scanning the DataFrame."""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, crime_sample):
+        self.df = crime_sample(3000, id_every=None, **{
+            'Ward Name': ['Armley', 'Headingley & Hyde Park', 'Pudsey'],
+            'Polling District': ['AA', 'AB', None]})
+        self.df.loc[::97, 'Latitude'] = np.nan
+
+    def build(self, tmp_path):
+        csv_path = tmp_path / "combined.csv"
+        self.df.to_csv(csv_path, index=False)
+        return build_store(str(csv_path), str(tmp_path / "store.sqlite")), csv_path
+
+    def test_ward_month_type_query(self, tmp_path):
+        """'Burglary in Headingley in H1 2023 by month' matches a pandas groupby."""
+        store, _ = self.build(tmp_path)
+
+        result = store.query(ward="Headingley & Hyde Park", month_range=("2023-01", "2023-06"),
+                             types=["Burglary"], group_by=["month"])
+
+        df = self.df
+        mask = ((df['Ward Name'] == "Headingley & Hyde Park") & (df['Crime type'] == "Burglary")
+                & df['Month'].between("2023-01", "2023-06"))
+        expected = df[mask].groupby('Month').size()
+        assert result['month'].tolist() == expected.index.tolist()
+        assert result['count'].tolist() == expected.tolist()
+
+    def test_bbox_query(self, tmp_path):
+        """Grid-key pre-filtering never changes which points fall in the box."""
+        store, _ = self.build(tmp_path)
+        bbox = (-1.65, 53.75, -1.52, 53.83)
+
+        result = store.query(bbox=bbox, group_by=["crime_type"])
+
+        df = self.df
+        inside = df['Longitude'].between(bbox[0], bbox[2]) & df['Latitude'].between(bbox[1], bbox[3])
+        expected = df[inside].groupby('Crime type').size()
+        assert dict(zip(result['crime_type'], result['count'])) == expected.to_dict()
+
+    def test_results_are_cached_and_store_tracks_source(self, tmp_path):
+        """Repeated queries hit the cache; a changed CSV triggers a rebuild."""
+        store, csv_path = self.build(tmp_path)
+        store.query(types=["Drugs"])
+        store.query(types=["Drugs"])
+        assert store.cache_info().hits == 1
+
+        self.df.iloc[:10].to_csv(csv_path, index=False)
+        reopened = open_store(str(csv_path), str(tmp_path / "store.sqlite"))
+        assert reopened.query()['count'].tolist() == [10]
+
+    def test_store_tracks_deltas(self, tmp_path, monkeypatch):
+        """A committed delta rebuilds the store although the CSV is unchanged."""
+        monkeypatch.setattr("delta_store.COMPACT_FRACTION", 1.0)
+        store, csv_path = self.build(tmp_path)
+        store.close()
+        df = read_dataset(str(csv_path), report=False)
+        before = baseline(df, ['Ward Name'])
+        df['Ward Name'] = df['Ward Name'].astype(object)
+        df.loc[:4, 'Ward Name'] = "Roundhay"
+        save_changes(str(csv_path), df, before)
+
+        reopened = open_store(str(csv_path), str(tmp_path / "store.sqlite"))
+        assert reopened.query(ward="Roundhay")['count'].tolist() == [5]
@@ -0,0 +1,82 @@
+"""Tests for the dashboard aggregate query server."""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from dashboard_server import make_server
+from prepare_dashboard_data import aggregate_months, build_output
+
+
+class TestDashboardServer:
+    """Verify API answers match filtering the static dashboard points."""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, crime_sample):
+        aggregates = aggregate_months(crime_sample(3000, years=(2022, 2023, 2024), **{
+            'Crime ID': None,
+            'Ward Name': ['Armley', 'Little London & Woodhouse', 'Pudsey'],
+            'Polling District': ['AA', 'HRA', 'Unknown']}))
+        self.points = build_output(aggregates)
+        self.server = make_server(aggregates, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+
+        yield
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, path, headers=None):
+        request = urllib.request.Request(self.base + path, headers=headers or {})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read()), response.headers
+
+    def expected(self, type_idx, start, end, exclude_cc):
+        """Filter the static points like the dashboard's filterPoints()."""
+        hra = self.points['pd'].index('HRA')
+        return [p for p in self.points['p']
+                if p[2] == type_idx and start <= (p[3], p[4]) <= end
+                and not (exclude_cc and (p[6] == 1 or p[7] == hra))]
+
+    def test_filtered_totals_match_static_points(self):
+        """Cell and ward totals equal the client-side filter over crime_data.json."""
+        type_idx = self.points['t'].index('Drugs')
+        points = self.expected(type_idx, (2023, 3), (2024, 2), True)
+
+        cells, _ = self.get("/cells?type=Drugs&from=2023-03&to=2024-02&exclude_cc=1")
+        wards, _ = self.get("/wards?type=Drugs&from=2023-3&to=2024-02&exclude_cc=1")
+
+        cell_totals = {}
+        for p in points:
+            cell_totals[(p[0], p[1])] = cell_totals.get((p[0], p[1]), 0) + p[5]
+        ward_totals = {}
+        for p in points:
+            ward_totals[p[8]] = ward_totals.get(p[8], 0) + p[5]
+        assert {(lat, lon): c for lat, lon, c in cells} == cell_totals
+        assert {w: c for w, t, c in wards} == ward_totals
+        assert all(t == type_idx for _, t, _ in wards)
+
+    def test_ward_series_and_etag(self):
+        """Ward history covers every month; a repeated request revalidates with 304."""
+        ward_idx = self.points['w'].index('Pudsey')
+        series, headers = self.get("/ward_series?ward=Pudsey")
+
+        expected = {}
+        for p in self.points['p']:
+            if p[8] == ward_idx:
+                key = f"{p[3]}-{p[4]:02d}"
+                expected[key] = expected.get(key, 0) + p[5]
+        assert series == expected
+
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            self.get("/ward_series?ward=Pudsey", {"If-None-Match": headers["ETag"]})
+        assert exc.value.code == 304
+
+    def test_invalid_filters_are_rejected(self):
+        """Unknown crime types and malformed months return 400."""
+        for query in ["/cells?type=Arson", "/wards?from=2023-13", "/ward_series?ward=Nowhere"]:
+            with pytest.raises(urllib.error.HTTPError) as exc:
+                self.get(query)
+            assert exc.value.code == 400
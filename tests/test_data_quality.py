@@ -0,0 +1,72 @@
+"""Tests for dataset statistics manifests and quality rules."""
+import numpy as np
+import pytest
+
+from data_quality import combine_manifests, compute_manifest, ensure_manifest, load_manifest, validate
+from regions import REGIONS
+from schema import concat_datasets, read_dataset, write_dataset
+
+
+class TestDataQuality:
+    """Verify manifests match the data and rules evaluate against them."""
+
+    @pytest.fixture
+    def sample(self, crime_sample):
+        return lambda n=2000, seed=0: crime_sample(
+            n, seed, **{'Crime type': ['Burglary', 'Drugs'],
+                        'LSOA code': ['E01011264', 'E01011265'],
+                        'LSOA name': ['Leeds 001A', 'Leeds 001B'],
+                        'Ward Name': {'Armley': 0.49, 'Pudsey': 0.49, 'Unknown': 0.02},
+                        'Postcode District': ['LS1', 'LS2', 'LS6', 'LS28']})
+
+    def test_manifest_matches_full_scan(self, tmp_path, sample):
+        """Rates and value sets in the manifest equal counting the rows directly."""
+        df = sample()
+        df.loc[:9, 'Latitude'] = np.nan
+        path = str(tmp_path / "crimes.csv")
+        write_dataset(df, path)
+
+        manifest = load_manifest(path)
+        inside = df['Latitude'].between(53.69, 53.96) & df['Longitude'].between(-1.80, -1.29)
+        assert manifest['rows'] == len(df)
+        assert manifest['columns']['Ward Name']['unknown'] == (df['Ward Name'] == 'Unknown').sum()
+        assert manifest['columns']['Crime ID']['nulls'] == df['Crime ID'].isna().sum()
+        assert manifest['columns']['Postcode District']['values'] == df['Postcode District'].value_counts().to_dict()
+        assert set(manifest['bounds']) == {f"{key}_bbox" for key in REGIONS}
+        assert manifest['bounds']['leeds_bbox'] == inside.sum()
+        assert manifest['bounds_rows']['leeds_bbox'] == len(df.dropna(subset=['Latitude', 'Longitude']))
+        assert {m: s['rows'] for m, s in manifest['months'].items()} == df['Month'].value_counts().to_dict()
+        assert all(passed for _, passed, _ in validate(manifest))
+
+    def test_partition_manifests_combine(self, tmp_path, sample):
+        """Combining partition manifests equals the manifest of the concatenated file."""
+        parts = [sample(500, seed) for seed in range(3)]
+        manifests = [compute_manifest(part) for part in parts]
+
+        path = str(tmp_path / "combined.csv")
+        write_dataset(concat_datasets(parts), path)
+        combined = combine_manifests(manifests)
+
+        full = compute_manifest(read_dataset(path, report=False))
+        assert combined['months'] == full['months']
+        for column, stats in full['columns'].items():
+            if 'values' not in stats:
+                # Exact distinct counts need the value sets; combined keeps a lower bound
+                assert combined['columns'][column].pop('distinct') <= stats.pop('distinct')
+        assert combined['columns'] == full['columns']
+        assert combined['bounds'] == full['bounds']
+        assert combined['bounds_rows'] == full['bounds_rows']
+
+    def test_rules_fail_and_manifest_tracks_source(self, tmp_path, sample):
+        """A high Unknown rate fails its rule; rewriting the CSV invalidates the manifest."""
+        df = sample()
+        df.loc[:200, 'Ward Name'] = 'Unknown'
+        path = str(tmp_path / "crimes.csv")
+        write_dataset(df, path)
+
+        failed = [name for name, passed, _ in validate(load_manifest(path)) if not passed]
+        assert failed == ["unknown ward rate"]
+
+        df.iloc[:10].to_csv(path, index=False)
+        assert load_manifest(path) is None
+        assert ensure_manifest(path)['rows'] == 10
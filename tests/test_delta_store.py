@@ -0,0 +1,93 @@
+"""Tests for the base snapshot plus delta log storage."""
+import os
+
+import numpy as np
+import pandas as pd
+
+import delta_store
+from data_quality import ensure_manifest, load_manifest
+from delta_store import baseline, compact, save_changes, status
+from schema import read_dataset, write_dataset
+
+
+def dataset(n=2000):
+    return pd.DataFrame({
+        'Crime ID': [f"id{i}" if i % 5 else None for i in range(n)],
+        'Month': "2020-01",
+        'Longitude': -1.5 + np.arange(n) * 1e-4,
+        'Latitude': 53.8,
+        'Location': "On or near High Street",
+        'Crime type': "Burglary",
+        'Ward Name': "Unknown",
+    })
+
+
+def edit(df):
+    """The kind of change a correction stage makes: a few patches, deletions and an insert."""
+    edited = df.copy()
+    edited['Ward Name'] = edited['Ward Name'].astype(object)
+    edited.loc[[3, 5, 10, 15], 'Ward Name'] = "Headingley & Hyde Park"
+    edited = edited.drop([7, 20])
+    new = dataset(1).assign(**{'Crime ID': "new", 'Ward Name': "Gipton & Harehills"})
+    return pd.concat([edited, new.set_axis([len(df) + 1])])
+
+
+class TestDeltaStore:
+    """Verify snapshots match full rewrites while corrections only write their rows."""
+
+    def test_snapshot_matches_rewrite(self, tmp_path):
+        """Deltas are small, read back as the edited frame and leave version 0 readable."""
+        path = str(tmp_path / "street.csv")
+        write_dataset(dataset(), path)
+        original = read_dataset(path, report=False)
+        before = baseline(original, ['Ward Name'])
+        edited = edit(original)
+
+        save_changes(path, edited, before)
+
+        state = status(path)
+        assert state['pending'] == 3 and state['pending_bytes'] < 0.01 * state['base_bytes']
+        expected = edited.astype(object).reset_index(drop=True)
+        pd.testing.assert_frame_equal(read_dataset(path, report=False).astype(object), expected)
+        assert len(read_dataset(path, version=0, report=False)) == len(original)
+
+        # Column subsets and pandas options see the snapshot exactly as they would a plain CSV
+        subset = read_dataset(path, columns=['Crime ID', 'Ward Name'], report=False)
+        assert subset.columns.tolist() == ['Crime ID', 'Ward Name']
+        assert subset['Ward Name'].astype(object).tolist() == expected['Ward Name'].tolist()
+        assert read_dataset(path, nrows=8, report=False)['Ward Name'].tolist()[3:6] == [
+            "Headingley & Hyde Park", "Unknown", "Headingley & Hyde Park"]
+        chunks = read_dataset(path, columns=['Crime ID'], chunksize=500, report=False)
+        assert sum(len(chunk) for chunk in chunks) == len(expected)
+
+        # The CSV is untouched, but its manifest must not describe the pre-delta data
+        assert load_manifest(path) is None
+        assert ensure_manifest(path)['columns']['Ward Name']['values']['Headingley & Hyde Park'] == 4
+        assert load_manifest(path) is not None
+
+    def test_compaction_and_rewrites(self, tmp_path):
+        """Compaction folds deltas into the CSV; an outside rewrite becomes a new base."""
+        path = str(tmp_path / "street.csv")
+        write_dataset(dataset(), path)
+        original = read_dataset(path, report=False)
+        save_changes(path, edit(original), baseline(original, ['Ward Name']))
+        latest = read_dataset(path, report=False)
+
+        compact(path)
+        assert status(path)['pending'] == 0
+        pd.testing.assert_frame_equal(read_dataset(path, report=False).astype(object), latest.astype(object))
+        assert len(pd.read_csv(path)) == len(latest)
+        assert len(read_dataset(path, version=0, report=False)) == len(original)
+
+        write_dataset(dataset(10), path)
+        small = read_dataset(path, report=False)
+        assert small['Ward Name'].tolist() == ["Unknown"] * 10
+        changed = small.assign(**{'Ward Name': small['Ward Name'].astype(object)})
+        changed.loc[0, 'Ward Name'] = "Roundhay"
+        save_changes(path, changed, baseline(small, ['Ward Name']))
+
+        log = delta_store.load_log(path)
+        assert log['base']['version'] == log['head'] - 1
+        assert read_dataset(path, report=False)['Ward Name'].iloc[0] == "Roundhay"
+        assert len(read_dataset(path, version=log['base']['version'] - 1, report=False)) == len(latest)
+        assert os.path.exists(delta_store.store_dir(path))
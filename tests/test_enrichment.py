@@ -1,73 +1,107 @@
 """Tests for data enrichment quality."""
+import os
+
+import numpy as np
+import pandas as pd
 import pytest
 
+from data_quality import check_rule, get_rule
+
 
 class TestEnrichmentQuality:
     """Verify that enriched data meets quality standards."""
     
-    def test_ward_column_exists(self, processed_data):
+    def test_ward_column_exists(self, manifest):
         """Processed data should have Ward Name column."""
-        assert 'Ward Name' in processed_data.columns, \
+        assert 'Ward Name' in manifest['columns'], \
             "Ward Name column missing from processed data"
     
-    def test_postcode_column_exists(self, processed_data):
+    def test_postcode_column_exists(self, manifest):
         """Processed data should have Postcode District column."""
-        assert 'Postcode District' in processed_data.columns, \
+        assert 'Postcode District' in manifest['columns'], \
             "Postcode District column missing from processed data"
     
-    def test_lsoa_columns_exist(self, processed_data):
+    def test_lsoa_columns_exist(self, manifest):
         """Processed data should have LSOA code and name columns."""
-        assert 'LSOA code' in processed_data.columns, \
+        assert 'LSOA code' in manifest['columns'], \
             "LSOA code column missing"
-        assert 'LSOA name' in processed_data.columns, \
+        assert 'LSOA name' in manifest['columns'], \
             "LSOA name column missing"
     
-    def test_unknown_ward_rate_acceptable(self, processed_data):
+    def test_unknown_ward_rate_acceptable(self, manifest):
         """Unknown Ward rate should be below 5%."""
-        total = len(processed_data)
-        unknowns = len(processed_data[processed_data['Ward Name'] == 'Unknown'])
-        unknown_rate = unknowns / total
+        unknown_rate = manifest['columns']['Ward Name']['unknown'] / manifest['rows']
         
         assert unknown_rate < 0.05, \
             f"Unknown Ward rate {unknown_rate:.1%} exceeds 5% threshold"
+        assert check_rule(get_rule("unknown ward rate"), manifest)[0]
     
-    def test_unknown_postcode_rate_acceptable(self, processed_data):
+    def test_unknown_postcode_rate_acceptable(self, manifest):
         """Unknown Postcode District rate should be below 5%."""
-        total = len(processed_data)
-        unknowns = len(processed_data[processed_data['Postcode District'] == 'Unknown'])
-        unknown_rate = unknowns / total
+        unknown_rate = manifest['columns']['Postcode District']['unknown'] / manifest['rows']
         
         assert unknown_rate < 0.05, \
             f"Unknown Postcode rate {unknown_rate:.1%} exceeds 5% threshold"
+        assert check_rule(get_rule("unknown postcode rate"), manifest)[0]
     
-    def test_data_has_records(self, processed_data):
+    def test_data_has_records(self, manifest):
         """Processed data should contain records."""
-        assert len(processed_data) > 0, "Processed data is empty"
+        assert manifest['rows'] > 0, "Processed data is empty"
     
-    def test_required_columns_present(self, processed_data):
+    def test_required_columns_present(self, manifest):
         """All required columns should be present."""
-        required = [
-            'Crime ID', 'Month', 'Latitude', 'Longitude', 
-            'Crime type', 'LSOA code', 'LSOA name',
-            'Ward Name', 'Postcode District'
-        ]
+        passed, detail = check_rule(get_rule("required columns"), manifest)
         
-        missing = [col for col in required if col not in processed_data.columns]
-        
-        assert not missing, f"Missing required columns: {missing}"
+        assert passed, f"Missing required columns: {detail}"
     
-    def test_coordinates_in_valid_range(self, processed_data):
+    def test_coordinates_in_valid_range(self, manifest):
         """All coordinates should be within Leeds bounding box."""
-        df = processed_data.dropna(subset=['Latitude', 'Longitude'])
-        
-        # Leeds approximate bounds
-        MIN_LAT, MAX_LAT = 53.69, 53.96
-        MIN_LON, MAX_LON = -1.80, -1.29
-        
-        lat_valid = (df['Latitude'] >= MIN_LAT) & (df['Latitude'] <= MAX_LAT)
-        lon_valid = (df['Longitude'] >= MIN_LON) & (df['Longitude'] <= MAX_LON)
-        
-        valid_rate = (lat_valid & lon_valid).mean()
+        # Rows without coordinates are left out, as with dropna before the range check
+        valid_rate = manifest['bounds']['leeds_bbox'] / manifest['bounds_rows']['leeds_bbox']
         
         assert valid_rate > 0.95, \
             f"Only {valid_rate:.1%} of coordinates within Leeds bounds"
+        assert check_rule(get_rule("coordinates within Leeds"), manifest)[0]
+
+
+class TestPostcodeCache:
+    """Verify the shared postcode cache remembers misses but not failed requests."""
+
+    def test_misses_are_cached_and_failures_retried(self, tmp_path, monkeypatch):
+        """A location without a postcode at any radius is not looked up again; a failed one is."""
+        import enrich_data as enrich_module
+        from schema import read_dataset, write_dataset
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(enrich_module, "load_polling_districts", lambda: None)
+        matched, missed, failing = (53.80, -1.55), (53.70, -1.79), (53.90, -1.30)
+        sent = []
+
+        class StubClient:
+            def reverse_geocode_escalating(self, coords):
+                sent.append(sorted(coords))
+                results = {c: ({'admin_ward': "Armley", 'postcode': "LS12 1AA"}, 200)
+                           for c in coords if c == matched}
+                return results, [c for c in coords if c == failing]
+
+            def report(self):
+                pass
+
+        monkeypatch.setattr(enrich_module, "PostcodesClient", StubClient)
+        os.makedirs("data/processed")
+        path = "data/processed/leeds_street_combined.csv"
+        write_dataset(pd.DataFrame({'Crime ID': ["a", "b", "c"], 'Month': "2024-01",
+                                    'Latitude': [c[0] for c in (matched, missed, failing)],
+                                    'Longitude': [c[1] for c in (matched, missed, failing)],
+                                    'Crime type': "Burglary"}), path)
+
+        enrich_module.enrich_data()
+        enrich_module.enrich_data()
+
+        assert sent == [sorted([matched, missed, failing]), [failing]]
+        cache = enrich_module.load_enrichment_cache()
+        assert cache[missed]['ward'] == "Unknown" and np.isnan(cache[missed]['radius'])
+        assert failing not in cache
+        df = read_dataset(path, report=False)
+        assert df['Ward Name'].astype(object).tolist() == ["Armley", "Unknown", "Unknown"]
+        assert df['Enrichment Radius'].isna().tolist() == [False, True, True]
@@ -0,0 +1,71 @@
+"""Tests for dissolving polling districts into ward boundaries."""
+import json
+import os
+
+import pytest
+import shapely
+from shapely.geometry import box, mapping, shape
+
+import fetch_wards as wards_module
+from fetch_wards import dissolve_wards, fetch_wards, load_polling_districts, parse_polling_districts
+
+
+def polling_districts():
+    """Four adjacent districts: two in Armley and two in the MapServer's spelling of Cross Gates."""
+    cells = [("Armley", "AA1", 0), ("Armley", "AA2", 1),
+             ("Crossgates & Whinmoor", "CG1", 2), ("Crossgates & Whinmoor", "CG2", 3)]
+    features = [{"type": "Feature", "properties": {"WARD": ward, "POLLING_DI": code},
+                 "geometry": mapping(box(-1.6 + 0.01 * i, 53.8, -1.59 + 0.01 * i, 53.81))}
+                for ward, code, i in cells]
+    # As parsed from the MapServer's JSON: lists rather than shapely's tuples
+    return json.loads(json.dumps({"type": "FeatureCollection", "features": features}))
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class TestFetchWards:
+    """Verify the ward dissolve and the polling district cache."""
+
+    def test_dissolves_districts_into_wards(self):
+        """Districts of a ward merge into one polygon covering exactly their area."""
+        geoms, ward_names, codes = parse_polling_districts(polling_districts())
+        wards, dissolved = dissolve_wards(geoms, ward_names)
+
+        assert wards.tolist() == ["Armley", "Cross Gates & Whinmoor"]
+        assert codes.tolist() == ["AA1", "AA2", "CG1", "CG2"]
+        for ward, polygon in zip(wards, dissolved):
+            expected = shapely.union_all(geoms[ward_names == ward])
+            assert polygon.geom_type == "Polygon"
+            assert polygon.symmetric_difference(expected).area < 1e-3 * expected.area
+
+    def test_cache_round_trip(self, tmp_path, monkeypatch):
+        """A fetched response is cached and reused; the build then runs without the network."""
+        monkeypatch.chdir(tmp_path)
+        calls = []
+        monkeypatch.setattr(wards_module.requests, "get", lambda url, params=None, timeout=None:
+                            calls.append(url) or FakeResponse(polling_districts()))
+
+        assert load_polling_districts() == polling_districts()
+        assert os.path.exists(wards_module.POLLING_DISTRICTS_CACHE)
+
+        def offline(*args, **kwargs):
+            raise AssertionError("cached polling districts should not be re-fetched")
+
+        monkeypatch.setattr(wards_module.requests, "get", offline)
+        assert load_polling_districts() == polling_districts()
+        fetch_wards()
+
+        assert len(calls) == 1
+        with open("dashboard/data/leeds_wards.geojson") as f:
+            features = json.load(f)['features']
+        assert [feature['properties']['WARD_NAME'] for feature in features] == ["Armley", "Cross Gates & Whinmoor"]
+        assert shape(features[0]['geometry']).area == pytest.approx(0.02 * 0.01, rel=1e-2)
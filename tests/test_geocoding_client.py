@@ -0,0 +1,127 @@
+"""Tests for the adaptive postcodes.io batch client."""
+import geocoding_client
+from geocoding_client import AdaptiveLimiter, PostcodesClient, parse_ward_postcode
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Replays a fixed list of status codes, answering 200s with one postcode per point."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.calls += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            return FakeResponse(status, headers={"Retry-After": "0"})
+        result = [{"result": [{"admin_ward": "Armley", "postcode": "LS12 1AA"}]}
+                  for _ in json["geolocations"]]
+        return FakeResponse(200, {"result": result})
+
+
+class TestAdaptiveLimiter:
+    """Verify the AIMD concurrency cap."""
+
+    def test_grows_while_latency_is_healthy(self):
+        """Fast responses should raise the limit additively."""
+        limiter = AdaptiveLimiter(initial=2, maximum=8, target_latency=1.0)
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release(latency=0.1)
+
+        assert 2 < limiter.limit <= 8
+
+    def test_halves_on_throttle(self):
+        """A 429 should halve the limit but never go below the minimum."""
+        limiter = AdaptiveLimiter(initial=8, minimum=1)
+        limiter.acquire()
+        limiter.release(latency=0.1, throttled=True)
+        assert limiter.limit == 4
+
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        assert limiter.limit == 1
+
+
+class TestPostcodesClient:
+    """Verify retries and failure reporting."""
+
+    def test_retries_through_throttling(self, monkeypatch):
+        """Throttled and failed batches are retried until they succeed."""
+        monkeypatch.setattr(geocoding_client.time, "sleep", lambda s: None)
+        client = PostcodesClient(max_concurrency=1, backoff=0)
+        client.session = FakeSession([429, 503])
+
+        results, failed = client.reverse_geocode([(53.8, -1.5), (53.81, -1.51)], radius=200)
+
+        assert failed == []
+        assert client.throttled == 1 and client.retries == 2
+        assert parse_ward_postcode(results[(53.8, -1.5)]) == ("Armley", "LS12")
+
+    def test_reports_exhausted_batches(self, monkeypatch):
+        """Batches that never succeed are returned as failures, not empty results."""
+        monkeypatch.setattr(geocoding_client.time, "sleep", lambda s: None)
+        client = PostcodesClient(max_concurrency=1, max_retries=2, backoff=0)
+        client.session = FakeSession([500] * 3)
+
+        results, failed = client.reverse_geocode([(53.8, -1.5)], radius=200)
+
+        assert results == {}
+        assert failed == [(53.8, -1.5)]
+
+    def test_escalates_radius_only_for_unresolved(self):
+        """Points matched at a small radius are not re-queried at wider tiers."""
+        class RadiusSession(FakeSession):
+            def post(self, url, json=None, timeout=None):
+                self.calls += 1
+                result = [{"result": [{"admin_ward": "Armley", "postcode": "LS12 1AA"}]
+                           if g["latitude"] < 53.85 or g["radius"] >= 1000 else None}
+                          for g in json["geolocations"]]
+                self.sizes.append(len(json["geolocations"]))
+                return FakeResponse(200, {"result": result})
+
+        client = PostcodesClient(max_concurrency=1)
+        client.session = RadiusSession([])
+        client.session.sizes = []
+
+        resolved, failed = client.reverse_geocode_escalating([(53.8, -1.5), (53.9, -1.5)])
+
+        assert failed == []
+        assert resolved[(53.8, -1.5)][1] == 200
+        assert resolved[(53.9, -1.5)][1] == 1000
+        assert client.session.sizes == [2, 1, 1]
+
+    def test_failed_batches_retry_at_the_same_radius(self, monkeypatch):
+        """A batch failing at the first tier is retried there, and points failing twice are reported."""
+        monkeypatch.setattr(geocoding_client, "BATCH_SIZE", 1)
+
+        class FlakySession(FakeSession):
+            """The first request for each point fails, and every request for 54.0 fails."""
+            def post(self, url, json=None, timeout=None):
+                point = json["geolocations"][0]
+                self.requests.append((point["latitude"], point["radius"]))
+                if point["latitude"] == 54.0 or self.requests.count((point["latitude"], point["radius"])) == 1:
+                    return FakeResponse(500)
+                return super().post(url, json, timeout)
+
+        client = PostcodesClient(max_concurrency=1, max_retries=0, backoff=0)
+        client.session = FlakySession([])
+        client.session.requests = []
+
+        resolved, failed = client.reverse_geocode_escalating([(53.8, -1.5), (54.0, -1.5)])
+
+        assert resolved[(53.8, -1.5)][1] == 200
+        assert failed == [(54.0, -1.5)]
+        assert sorted(client.session.requests) == [(53.8, 200), (53.8, 200), (54.0, 200), (54.0, 200)]
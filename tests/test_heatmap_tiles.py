@@ -0,0 +1,70 @@
+"""Tests for static heatmap tile rendering."""
+import json
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from render_heatmap_tiles import DensityCanvas, encode_png, lonlat_to_pixels, render_heatmap_tiles, tile_range
+from schema import write_dataset
+
+
+class TestHeatmapTiles:
+    """Verify the density raster and tile encoding used for the dashboard."""
+
+    def test_tile_range_covers_leeds(self):
+        """Leeds City Centre should fall inside the rendered tile range."""
+        min_tx, min_ty, max_tx, max_ty = tile_range(12)
+        x, y = lonlat_to_pixels(-1.5492, 53.7997, 12)
+
+        assert min_tx <= x // 256 <= max_tx
+        assert min_ty <= y // 256 <= max_ty
+
+    def test_density_conserves_mass(self):
+        """Smoothing a point away from the edges should not gain or lose weight."""
+        canvas = DensityCanvas(11)
+        density = canvas.density(np.array([-1.55]), np.array([53.8]), np.array([5.0]))
+
+        assert abs(density.sum() - 5.0) < 1e-6
+
+    def test_density_peaks_at_point(self):
+        """The density maximum should sit on the pixel containing the point."""
+        canvas = DensityCanvas(12)
+        density = canvas.density(np.array([-1.55]), np.array([53.8]))
+        x, y = lonlat_to_pixels(-1.55, 53.8, 12)
+
+        row, col = np.unravel_index(density.argmax(), density.shape)
+
+        assert col == int(x - canvas.min_tx * 256)
+        assert row == int(y - canvas.min_ty * 256)
+
+    def test_png_encoding(self):
+        """Encoded tiles should be valid PNG streams with the raw pixels inside."""
+        rgba = np.zeros((2, 3, 4), dtype=np.uint8)
+        rgba[1, 2] = [255, 0, 0, 255]
+        png = encode_png(rgba)
+
+        assert png.startswith(b"\x89PNG\r\n\x1a\n")
+        idat_start = png.index(b"IDAT") + 4
+        idat_len = int.from_bytes(png[idat_start - 8:idat_start - 4], "big")
+        raw = zlib.decompress(png[idat_start:idat_start + idat_len])
+
+        assert len(raw) == 2 * (3 * 4 + 1)
+        assert raw[-4:] == bytes([255, 0, 0, 255])
+
+    def test_renders_a_single_crime_type(self, tmp_path, monkeypatch):
+        """A dataset with one crime type renders, though compact reads move the column into attrs."""
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("data/processed")
+        write_dataset(pd.DataFrame({
+            'Latitude': [53.8, 53.8, 53.81], 'Longitude': [-1.55, -1.55, -1.54],
+            'Month': ["2023-01", "2023-02", "2024-01"], 'Crime type': "Burglary",
+        }), "data/processed/leeds_street_combined.csv")
+
+        render_heatmap_tiles(min_zoom=10, max_zoom=10)
+
+        with open(os.path.join("dashboard", "tiles", "index.json")) as f:
+            index = json.load(f)
+        assert os.path.isdir(os.path.join("dashboard", "tiles", "2023", "burglary", "10"))
+        assert "Burglary" in json.dumps(index)
@@ -0,0 +1,72 @@
+"""Tests for the incremental outcomes join."""
+import pandas as pd
+
+import join_outcomes as join_module
+from join_outcomes import join_outcomes
+from regions import get_region
+from schema import read_dataset, write_dataset
+
+
+def outcomes(rows):
+    return pd.DataFrame(rows, columns=['Crime ID', 'Month', 'Falls within', 'Outcome type'])
+
+
+def write_inputs(tmp_path, outcome_rows):
+    processed = tmp_path / "data" / "processed"
+    processed.mkdir(parents=True, exist_ok=True)
+    write_dataset(outcomes(outcome_rows), str(processed / "leeds_outcomes_combined.csv"))
+    write_dataset(pd.DataFrame({
+        'Crime ID': ["a", "b", "c", None],
+        'Month': ["2019-01", "2019-01", "2019-02", "2019-02"],
+        'Crime type': ["Burglary", "Burglary", "Vehicle crime", "Anti-social behaviour"],
+        'Last outcome category': ["Under investigation", "Under investigation", "Under investigation", None],
+    }), str(processed / "leeds_street_combined.csv"))
+
+
+def read_master(tmp_path):
+    return read_dataset(str(tmp_path / "data/processed/leeds_street_combined.csv"), report=False)
+
+
+class TestJoinOutcomes:
+    """Verify the latest outcome and timeline are attached, re-reading only changed months."""
+
+    def test_attaches_latest_outcome_and_timeline(self, tmp_path, monkeypatch):
+        """Each crime gets its newest outcome; crimes without events keep theirs."""
+        monkeypatch.chdir(tmp_path)
+        write_inputs(tmp_path, [
+            ("a", "2019-03", "WY", "Offender given a caution"),
+            ("a", "2019-02", "WY", "Local resolution"),
+            ("b", "2019-02", "WY", "Investigation complete; no suspect identified"),
+        ])
+
+        join_outcomes(get_region("leeds"))
+        df = read_master(tmp_path)
+
+        assert df['Last outcome category'].tolist()[:3] == [
+            "Offender given a caution", "Investigation complete; no suspect identified", "Under investigation"]
+        assert df.loc[0, 'Outcome timeline'] == "2019-02: Local resolution | 2019-03: Offender given a caution"
+        assert df['Outcome timeline'].isna().tolist() == [False, False, True, True]
+
+    def test_only_changed_months_are_reindexed(self, tmp_path, monkeypatch):
+        """A new outcome month is streamed alone; an unchanged rerun skips the master."""
+        monkeypatch.chdir(tmp_path)
+        first = [("a", "2019-02", "WY", "Local resolution"), ("c", "2019-03", "WY", "Awaiting court outcome")]
+        write_inputs(tmp_path, first)
+        join_outcomes(get_region("leeds"))
+
+        streamed = []
+        stream_months = join_module.stream_months
+        monkeypatch.setattr(join_module, "stream_months",
+                            lambda path, months: streamed.append(list(months)) or stream_months(path, months))
+        write_inputs(tmp_path, first + [("c", "2019-05", "WY", "Offender sent to prison")])
+        join_outcomes(get_region("leeds"))
+
+        assert streamed == [["2019-05"]]
+        df = read_master(tmp_path)
+        assert df.loc[2, 'Last outcome category'] == "Offender sent to prison"
+        assert df.loc[2, 'Outcome timeline'] == "2019-03: Awaiting court outcome | 2019-05: Offender sent to prison"
+
+        master_mtime = (tmp_path / "data/processed/leeds_street_combined.csv").stat().st_mtime_ns
+        join_outcomes(get_region("leeds"))
+        assert streamed == [["2019-05"]]
+        assert (tmp_path / "data/processed/leeds_street_combined.csv").stat().st_mtime_ns == master_mtime
@@ -3,6 +3,8 @@ import pytest
 import requests
 import pandas as pd
 
+from data_quality import check_rule, get_rule
+
 
 class TestLocationValidation:
     """Validate that sample locations are correctly identified as Leeds."""
@@ -44,29 +46,31 @@ class TestLocationValidation:
         assert leeds_rate >= 0.8, \
             f"Only {leeds_rate:.0%} of sampled locations confirmed as Leeds"
     
-    def test_known_leeds_postcodes_present(self, processed_data):
+    def test_known_leeds_postcodes_present(self, manifest):
         """Common Leeds postcode districts should be present."""
-        if 'Postcode District' not in processed_data.columns:
+        if 'Postcode District' not in manifest['columns']:
             pytest.skip("Postcode District column not present")
         
         leeds_postcodes = ['LS1', 'LS2', 'LS6', 'LS7', 'LS8']
-        present = processed_data['Postcode District'].unique()
+        present = manifest['columns']['Postcode District']['values']
         
         found = [pc for pc in leeds_postcodes if pc in present]
         
         assert len(found) >= 3, \
             f"Expected at least 3 Leeds postcodes, found: {found}"
+        assert check_rule(get_rule("common Leeds postcodes"), manifest)[0]
     
-    def test_no_invalid_postcodes(self, processed_data):
+    def test_no_invalid_postcodes(self, manifest):
         """Non-Leeds postcodes should not be present (except Unknown)."""
-        if 'Postcode District' not in processed_data.columns:
+        if 'Postcode District' not in manifest['columns']:
             pytest.skip("Postcode District column not present")
         
         # Non-Leeds West Yorkshire postcodes that shouldn't appear
         invalid = ['BD', 'HX', 'WF', 'HD']
-        present = processed_data['Postcode District'].unique()
+        present = manifest['columns']['Postcode District']['values']
         
         found_invalid = [pc for pc in invalid if pc in present]
         
         assert not found_invalid, \
             f"Found non-Leeds postcodes: {found_invalid}"
+        assert check_rule(get_rule("no non-Leeds postcodes"), manifest)[0]
@@ -0,0 +1,36 @@
+"""Tests for the pipeline step registry in main.py."""
+import os
+import subprocess
+import sys
+
+from main import PIPELINE_STEPS, STREAM_STEP, missing_inputs, resolve
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+class TestStepRegistry:
+    """Verify lazy step resolution and input planning."""
+
+    def test_every_step_resolves(self):
+        """Each "module:function" reference names a callable in an importable module."""
+        for step in PIPELINE_STEPS + [STREAM_STEP]:
+            assert callable(resolve(step)), step["func"]
+
+    def test_list_does_not_import_stages(self):
+        """--list only reads the registry, so no stage module (or pandas) is loaded."""
+        code = ("import sys, main; sys.argv = ['main.py', '--list']\n"
+                "try:\n    main.main()\nexcept SystemExit:\n    pass\n"
+                "print(sorted(m for m in ('pandas', 'shapely', 'fetch_data') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip().splitlines()[-1] == "[]"
+
+    def test_missing_inputs_skips_outputs_of_earlier_steps(self, tmp_path):
+        """Inputs produced earlier in the run are not reported; absent ones are."""
+        existing = tmp_path / "a.csv"
+        existing.write_text("x\n")
+        steps = [
+            {"num": 1, "inputs": [str(existing)], "outputs": [str(tmp_path / "b.csv")]},
+            {"num": 2, "inputs": [str(tmp_path / "b.csv"), str(tmp_path / "c_*.csv")], "outputs": []},
+        ]
+        assert missing_inputs(steps) == {2: [str(tmp_path / "c_*.csv")]}
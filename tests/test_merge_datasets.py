@@ -0,0 +1,118 @@
+"""Tests for the chunked, external-memory merge."""
+import numpy as np
+import pandas as pd
+
+from merge_datasets import append_months, dedup_content, merge_datasets
+from schema import read_dataset, write_dataset
+
+
+def crimes(n, seed, id_prefix, source):
+    rng = np.random.default_rng(seed)
+    ids = [f"{id_prefix}{i}" for i in rng.integers(0, n // 2, n)]
+    return pd.DataFrame({
+        'Crime ID': [None if i % 5 == 0 else cid for i, cid in enumerate(ids)],
+        'Month': [f"2024-{m:02d}" for m in rng.integers(1, 7, n)],
+        'Longitude': rng.random(n).round(6) - 1.6,
+        'Latitude': rng.random(n).round(6) + 53.7,
+        'Crime type': 'Burglary',
+        'Source': source,
+    })
+
+
+def in_memory_merge(archive, api):
+    combined = pd.concat([archive, api], ignore_index=True)
+    mask_id = combined['Crime ID'].notna()
+    dedup = combined[mask_id].drop_duplicates(subset=['Crime ID'], keep='last')
+    return pd.concat([dedup, combined[~mask_id]], ignore_index=True)
+
+
+def canonical(df):
+    return df.astype(str).sort_values(list(df.columns)).reset_index(drop=True)
+
+
+class TestMergeDatasets:
+    """Verify the chunked merge matches an all-in-memory merge."""
+
+    def test_matches_in_memory_merge(self, tmp_path):
+        """Small chunks, shared IDs across sources and ID-less rows all merge identically."""
+        archive = crimes(3000, 0, "c", "archive")
+        api = crimes(2000, 1, "c", "api").drop(columns=['Source'])
+        archive_file, api_file = tmp_path / "archive.csv", tmp_path / "api.csv"
+        archive.to_csv(archive_file, index=False)
+        api.to_csv(api_file, index=False)
+        output = tmp_path / "combined.csv"
+
+        merge_datasets(archive_file=str(archive_file), api_file=str(api_file),
+                       output_file=str(output), chunk_rows=700)
+
+        merged = pd.read_csv(output, dtype=str)
+        in_memory = in_memory_merge(pd.read_csv(archive_file, dtype=str), pd.read_csv(api_file, dtype=str))
+
+        assert merged['Month'].is_monotonic_increasing
+        assert merged['Crime ID'].dropna().is_unique
+        pd.testing.assert_frame_equal(canonical(merged), canonical(in_memory))
+        assert not list(tmp_path.glob("merge_*"))
+
+
+def asb(rows):
+    df = pd.DataFrame(rows, columns=['Month', 'Longitude', 'Latitude', 'Location', 'Crime type'])
+    df.insert(0, 'Crime ID', None)
+    return df
+
+
+class TestContentDedup:
+    """Verify hash-based deduplication of ID-less rows."""
+
+    def test_overlapping_sources_keep_max_multiplicity(self, tmp_path):
+        """A row twice in the archive and once in the API is kept twice, not three times or once."""
+        row = ['2024-01', '-1.550000', '53.800000', 'On or near Park Lane', 'Anti-social behaviour']
+        other = ['2024-01', '-1.560000', '53.810000', 'On or near Mill Hill', 'Anti-social behaviour']
+        archive = asb([row, row, other])
+        # The API writes coordinates without trailing zeros
+        api = asb([['2024-01', '-1.55', '53.8', 'On or near Park Lane', 'Anti-social behaviour'], other, other])
+        archive.to_csv(tmp_path / "archive.csv", index=False)
+        api.to_csv(tmp_path / "api.csv", index=False)
+        output = tmp_path / "combined.csv"
+
+        merge_datasets(archive_file=str(tmp_path / "archive.csv"), api_file=str(tmp_path / "api.csv"),
+                       output_file=str(output))
+
+        merged = pd.read_csv(output)
+        assert merged['Location'].value_counts().to_dict() == {
+            'On or near Park Lane': 2, 'On or near Mill Hill': 2}
+
+    def test_incremental_against_existing_partition(self):
+        """Only copies beyond those already in the partition are appended."""
+        row = ['2024-01', -1.55, 53.8, 'On or near Park Lane', 'Anti-social behaviour']
+        existing = asb([row])
+        new = pd.concat([asb([row, row]), pd.DataFrame({'Crime ID': ['abc'], 'Month': ['2024-01']})],
+                        ignore_index=True)
+
+        appended = dedup_content(new, existing)
+
+        assert len(appended) == 2
+        assert appended['Crime ID'].tolist()[-1] == 'abc'
+
+    def test_append_month_to_merged_dataset(self, tmp_path):
+        """Appending a streamed month keeps extra copies, replaces known IDs and skips duplicates."""
+        row = ['2024-01', -1.55, 53.8, 'On or near Park Lane', 'Anti-social behaviour']
+        merged = pd.concat([asb([row]), pd.DataFrame({
+            'Crime ID': ['abc'], 'Month': ['2024-01'], 'Longitude': [-1.5], 'Latitude': [53.79],
+            'Location': ['On or near Mill Hill'], 'Crime type': ['Burglary'],
+            'Last outcome category': ['Under investigation']})], ignore_index=True)
+        output = str(tmp_path / "combined.csv")
+        write_dataset(merged, output)
+
+        update = merged.copy()
+        update.loc[1, 'Last outcome category'] = 'Local resolution'
+        partition = pd.concat([update, asb([row]), pd.DataFrame({'Crime ID': ['new'], 'Month': ['2024-01']})],
+                              ignore_index=True)
+        write_dataset(partition, str(tmp_path / "2024-01.csv"))
+
+        assert append_months({'2024-01': str(tmp_path / "2024-01.csv")}, output_file=output) == 2
+
+        result = read_dataset(output, report=False).astype(object)
+        assert len(result) == 4
+        assert result['Crime ID'].isna().sum() == 2
+        assert result.loc[result['Crime ID'] == 'abc', 'Last outcome category'].tolist() == ['Local resolution']
+        assert 'new' in result['Crime ID'].tolist()
@@ -0,0 +1,69 @@
+"""Tests for the in-process metrics and OpenMetrics exporter."""
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from metrics import HTTP_LATENCY, HTTP_REQUESTS, MetricsExporter, Registry, counter, gauge, histogram, \
+    instrument_requests
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(int(self.path.strip("/")))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMetrics:
+    """Verify metric updates and their OpenMetrics text exposition."""
+
+    def test_render_openmetrics(self):
+        """Counters get _total, histograms cumulative buckets, and the text ends with # EOF."""
+        registry = Registry()
+        rows = counter("stage_rows", "Rows", ["stage"], registry=registry)
+        depth = gauge("queue_depth", "Depth", registry=registry)
+        latency = histogram("latency_seconds", "Latency", ["host"], buckets=(0.1, 1.0), registry=registry)
+
+        rows.inc(5, stage="geocode")
+        rows.inc(2, stage="geocode")
+        depth.set(3)
+        for value in (0.05, 0.5, 0.7, 5.0):
+            latency.observe(value, host="api.postcodes.io")
+
+        lines = registry.render().splitlines()
+        assert 'stage_rows_total{stage="geocode"} 7' in lines
+        assert "queue_depth 3" in lines
+        assert 'latency_seconds_bucket{host="api.postcodes.io",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{host="api.postcodes.io",le="1.0"} 3' in lines
+        assert 'latency_seconds_bucket{host="api.postcodes.io",le="+Inf"} 4' in lines
+        assert 'latency_seconds_count{host="api.postcodes.io"} 4' in lines
+        assert lines[-1] == "# EOF"
+        with pytest.raises(ValueError):
+            rows.inc(stage="geocode", host="x")
+
+    def test_http_calls_and_exporter(self, tmp_path):
+        """Instrumented requests are counted by host and status and reach the exported file."""
+        server = HTTPServer(("127.0.0.1", 0), StatusHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        instrument_requests()
+        instrument_requests()
+
+        path = str(tmp_path / "metrics.prom")
+        exporter = MetricsExporter(path, interval=60).start()
+        before_ok = HTTP_REQUESTS.value(host="127.0.0.1", code=200)
+        before_calls = HTTP_LATENCY.value(host="127.0.0.1")[0]
+        requests.get(f"{url}/200")
+        requests.get(f"{url}/429")
+        exporter.stop()
+        server.shutdown()
+
+        assert HTTP_REQUESTS.value(host="127.0.0.1", code=200) == before_ok + 1
+        assert HTTP_REQUESTS.value(host="127.0.0.1", code=429) >= 1
+        assert HTTP_LATENCY.value(host="127.0.0.1")[0] == before_calls + 2
+        with open(path) as f:
+            assert 'http_requests_total{host="127.0.0.1",code="429"}' in f.read()
@@ -0,0 +1,62 @@
+"""Tests for region profiles and work shared between regions."""
+import numpy as np
+import pandas as pd
+
+import combine_leeds_data as combine_module
+from combine_leeds_data import combine_leeds_data
+from fetch_data import grid_points, split_by_region
+from regions import get_region, parse_regions
+
+
+class TestRegions:
+    """Verify several districts share their force's work and keep separate outputs."""
+
+    def test_grids_keep_each_box_and_share_points(self):
+        """Each region keeps its own grid; points common to overlapping grids are queried once."""
+        leeds, bradford = get_region("leeds"), get_region("bradford")
+        lats, lons = np.arange(53.69, 53.96, 0.02), np.arange(-1.80, -1.29, 0.02)
+
+        assert grid_points([leeds]) == [(round(lat, 4), round(lon, 4)) for lat in lats for lon in lons]
+        assert set(grid_points([leeds])) | set(grid_points([bradford])) == set(grid_points([leeds, bradford]))
+
+        shifted = {**leeds, 'key': "shifted", 'bbox': (53.79, 54.06, -1.70, -1.19)}
+        union = grid_points([leeds, shifted])
+        assert len(union) == len(set(union)) < len(grid_points([leeds])) + len(grid_points([shifted]))
+
+    def test_split_by_region(self):
+        """Raw API records go to every region whose box contains them."""
+        raw = pd.DataFrame({'id': [1, 2, 3], 'location': [
+            {'latitude': "53.80", 'longitude': "-1.55"},   # Leeds
+            {'latitude': "53.79", 'longitude': "-1.75"},   # Leeds/Bradford overlap
+            {'latitude': "53.79", 'longitude': "-1.95"},   # Bradford
+        ]})
+        split = split_by_region(raw, parse_regions("leeds,bradford"))
+
+        assert split['leeds']['id'].tolist() == [1, 2]
+        assert split['bradford']['id'].tolist() == [2, 3]
+
+    def test_archive_parsed_once_per_force(self, tmp_path, monkeypatch):
+        """One force file per month is read once and split by LSOA name into each region."""
+        month_dir = tmp_path / "data" / "archive" / "2018-01"
+        month_dir.mkdir(parents=True)
+        pd.DataFrame({
+            'Crime ID': ["a", "b", "c"], 'Month': "2018-01",
+            'Latitude': [53.80, 53.79, 53.68], 'Longitude': [-1.55, -1.75, -1.50],
+            'Crime type': "Burglary",
+            'LSOA code': ["E01000001", "E01000002", "E01000003"],
+            'LSOA name': ["Leeds 001A", "Bradford 002B", "Wakefield 003C"],
+        }).to_csv(month_dir / "2018-01-west-yorkshire-street.csv", index=False)
+
+        reads = []
+        read_dataset = combine_module.read_dataset
+        monkeypatch.setattr(combine_module, "read_dataset", lambda path, **kw: reads.append(path) or
+                            read_dataset(path, **kw))
+        monkeypatch.setattr(combine_module, "START_DATE", "2018-01")
+        monkeypatch.setattr(combine_module, "END_DATE", "2018-01")
+        monkeypatch.chdir(tmp_path)
+
+        combine_leeds_data(parse_regions("leeds,bradford"))
+
+        assert len(reads) == 1
+        assert pd.read_csv(tmp_path / "data/processed/leeds_street_archive.csv")['Crime ID'].tolist() == ["a"]
+        assert pd.read_csv(tmp_path / "data/processed/bradford_street_archive.csv")['Crime ID'].tolist() == ["b"]
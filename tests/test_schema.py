@@ -0,0 +1,63 @@
+"""Tests for the shared dataset schema."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from schema import concat_datasets, month_labels, read_dataset, with_constants, write_dataset
+
+
+class TestSchema:
+    """Verify dtype-aware reading and writing of the crime datasets."""
+
+    @pytest.fixture
+    def sample(self, crime_sample):
+        return lambda n=2000, seed=0: crime_sample(
+            n, seed, years=tuple(range(2018, 2025)), id_every=4, **{
+                'Reported by': "West Yorkshire Police",
+                'Falls within': "West Yorkshire Police",
+                'Crime type': ['Burglary', 'Drugs', 'Anti-social behaviour']})
+
+    def test_round_trip_is_lossless(self, tmp_path, sample):
+        """Reading with the schema and writing back reproduces the file byte for byte."""
+        path = tmp_path / "crimes.csv"
+        sample().to_csv(path, index=False)
+        original = path.read_bytes()
+
+        df = read_dataset(str(path), report=False)
+        write_dataset(df, str(path))
+
+        assert isinstance(df['Crime type'].dtype, pd.CategoricalDtype)
+        assert df['Latitude'].dtype == np.float64
+        assert path.read_bytes() == original
+
+    def test_compact_is_smaller_and_read_only(self, tmp_path, sample):
+        """Compact frames use period codes, float32 and attrs for constants."""
+        path = tmp_path / "crimes.csv"
+        df = sample()
+        df.to_csv(path, index=False)
+
+        compact = read_dataset(str(path), compact=True, report=False)
+
+        assert compact['Month'].dtype == np.int32
+        assert (month_labels(compact['Month']) == df['Month'].to_numpy()).all()
+        assert compact.attrs['constants'] == {'Reported by': "West Yorkshire Police",
+                                              'Falls within': "West Yorkshire Police"}
+        assert compact.memory_usage(deep=True).sum() * 3 < df.memory_usage(deep=True).sum()
+        with pytest.raises(ValueError):
+            write_dataset(compact, str(path))
+
+        restored = with_constants(compact)
+        assert restored['Falls within'].astype(object).unique().tolist() == ["West Yorkshire Police"]
+        assert restored.dropna(subset=['Reported by']).groupby('Reported by', observed=True).size().tolist() == [len(df)]
+
+    def test_concat_keeps_categories(self, tmp_path, sample):
+        """Frames with different categories concatenate to one categorical column."""
+        a, b = sample(50, 1), sample(50, 2)
+        a['Ward Name'], b['Ward Name'] = 'Armley', 'Pudsey'
+        a.to_csv(tmp_path / "a.csv", index=False)
+        b.to_csv(tmp_path / "b.csv", index=False)
+
+        combined = concat_datasets([read_dataset(str(tmp_path / f), report=False) for f in ["a.csv", "b.csv"]])
+
+        assert isinstance(combined['Ward Name'].dtype, pd.CategoricalDtype)
+        assert combined['Ward Name'].tolist() == ['Armley'] * 50 + ['Pudsey'] * 50
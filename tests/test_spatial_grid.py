@@ -0,0 +1,35 @@
+"""Tests for the fixed project-wide spatial grid."""
+import numpy as np
+
+from spatial_grid import CELL_LAT, CELL_LON, cell_centres, cell_indices
+
+
+class TestSpatialGrid:
+    """Verify grid cells are stable and independent of the data extent."""
+
+    def test_indices_independent_of_other_points(self):
+        """Adding an outlying point should not move any existing cell."""
+        lats = np.array([53.7997, 53.8194, 53.8383])
+        lons = np.array([-1.5492, -1.5761, -1.5003])
+
+        rows, cols = cell_indices(lats, lons)
+        rows_out, cols_out = cell_indices(np.append(lats, 52.0), np.append(lons, -3.0))
+
+        assert rows.tolist() == rows_out[:3].tolist()
+        assert cols.tolist() == cols_out[:3].tolist()
+
+    def test_outlying_points_not_clipped(self):
+        """Points outside the bounding box should get their own cells, not edge cells."""
+        rows, cols = cell_indices(np.array([53.0, 54.5]), np.array([-2.5, -1.0]))
+
+        assert rows[0] < 0 and cols[0] < 0
+        assert rows[1] >= 80
+
+    def test_centre_inside_cell(self):
+        """Each cell centre should lie within half a cell of the original point."""
+        lat, lon = 53.7997, -1.5492
+        rows, cols = cell_indices(np.array([lat]), np.array([lon]))
+        c_lat, c_lon = cell_centres(rows, cols)
+
+        assert abs(c_lat[0] - lat) <= CELL_LAT / 2 + 1e-4
+        assert abs(c_lon[0] - lon) <= CELL_LON / 2 + 1e-4
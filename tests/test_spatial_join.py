@@ -0,0 +1,54 @@
+"""Tests for the STRtree-backed point-in-polygon join."""
+import numpy as np
+from shapely.geometry import Point, box
+
+import spatial_join
+from spatial_join import points_in_polygons
+
+
+def brute_force(lons, lats, polygons):
+    return np.array([
+        next((i for i, p in enumerate(polygons) if p.contains(Point(x, y))), -1)
+        for x, y in zip(lons, lats)
+    ])
+
+
+class TestSpatialJoin:
+    """Verify bulk containment matches a per-point scan."""
+
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        self.polygons = [box(i * 0.1, j * 0.1, (i + 1) * 0.1, (j + 1) * 0.1)
+                         for i in range(5) for j in range(5)]
+        self.lons = rng.random(2000) * 0.6 - 0.05
+        self.lats = rng.random(2000) * 0.6 - 0.05
+
+    def test_matches_brute_force(self):
+        """Serial STRtree join should agree with checking every polygon."""
+        result = points_in_polygons(self.lons, self.lats, self.polygons, workers=1)
+
+        assert (result == brute_force(self.lons, self.lats, self.polygons)).all()
+
+    def test_parallel_matches_serial(self, monkeypatch):
+        """Chunked multi-process join should give the same answer as the serial one."""
+        monkeypatch.setattr(spatial_join, "PARALLEL_THRESHOLD", 100)
+        parallel = points_in_polygons(self.lons, self.lats, self.polygons, workers=2, chunk_size=500)
+        serial = points_in_polygons(self.lons, self.lats, self.polygons, workers=1)
+
+        assert (parallel == serial).all()
+
+    def test_missing_coordinates_never_match(self):
+        """NaN coordinates should come back as -1."""
+        result = points_in_polygons([np.nan, 0.05], [0.05, np.nan], self.polygons, workers=1)
+
+        assert result.tolist() == [-1, -1]
+
+    def test_nearest_snaps_within_distance(self):
+        """Points just outside a polygon should snap to it; distant points should not."""
+        polygons = [box(-1.56, 53.79, -1.55, 53.80), box(-1.54, 53.79, -1.53, 53.80)]
+        # ~70m east of the first box, ~0.7km from the second
+        near = spatial_join.nearest_polygons([-1.549], [53.795], polygons, max_distance_m=150)
+        far = spatial_join.nearest_polygons([-1.545], [53.795], polygons, max_distance_m=150)
+
+        assert near.tolist() == [0]
+        assert far.tolist() == [-1]
@@ -0,0 +1,78 @@
+"""Tests for the quantised TopoJSON boundary encoder."""
+import numpy as np
+from shapely.geometry import Polygon
+
+from topojson_export import Topology
+
+
+def decode(topo, layer):
+    """Rebuild shapely polygons from a TopoJSON object (Polygon geometries only)."""
+    sx, sy = topo['transform']['scale']
+    tx, ty = topo['transform']['translate']
+    arcs = []
+    for arc in topo['arcs']:
+        pts = np.cumsum(np.array(arc), axis=0) * [sx, sy] + [tx, ty]
+        arcs.append([tuple(p) for p in pts])
+
+    def ring(ids):
+        out = []
+        for i in ids:
+            pts = arcs[i] if i >= 0 else arcs[~i][::-1]
+            out.extend(pts if not out else pts[1:])
+        return out
+
+    return [Polygon(ring(g['arcs'][0]), [ring(h) for h in g['arcs'][1:]])
+            for g in topo['objects'][layer]['geometries']]
+
+
+def neighbours():
+    """Two polygons sharing a long, noisy boundary."""
+    rng = np.random.default_rng(0)
+    xs = np.linspace(0, 1, 200)
+    ys = 0.5 + 0.01 * rng.normal(size=200)
+    line = list(zip(xs, ys))
+    lower = Polygon([(0, 0), (1, 0)] + line[::-1])
+    upper = Polygon(line + [(1, 1), (0, 1)])
+    return lower, upper
+
+
+class TestTopojsonExport:
+    """Verify shared arcs, quantisation and topology-preserving simplification."""
+
+    def test_shared_boundary_stored_once(self):
+        """The common edge of two neighbours should be a single arc."""
+        lower, upper = neighbours()
+        topology = Topology({'w': [({'n': 'a'}, lower), ({'n': 'b'}, upper)]})
+
+        assert len(topology.arcs) == 3
+        assert max(len(a) for a in topology.arcs) == 200
+
+    def test_arcs_are_integer_deltas(self):
+        """Arcs should be encoded as integer deltas from the first point."""
+        lower, upper = neighbours()
+        topo = Topology({'w': [({'n': 'a'}, lower), ({'n': 'b'}, upper)]}).to_dict()
+
+        for arc in topo['arcs']:
+            assert all(isinstance(v, int) for point in arc for v in point)
+
+    def test_simplified_neighbours_have_no_gaps(self):
+        """Simplified polygons should still tile the original area exactly."""
+        lower, upper = neighbours()
+        topology = Topology({'w': [({'n': 'a'}, lower), ({'n': 'b'}, upper)]})
+
+        for tolerance in (0.0, 0.005, 0.05):
+            a, b = decode(topology.to_dict(tolerance), 'w')
+            assert a.is_valid and b.is_valid
+            assert a.intersection(b).area < 1e-9
+            assert abs(a.union(b).area - 1.0) < 1e-6
+
+    def test_holes_and_layers(self):
+        """A hole filled by a polygon in another layer should reuse the same arc."""
+        outer = Polygon([(0, 0), (2, 0), (2, 2), (0, 2)], [[(0.5, 0.5), (1.5, 0.5), (1.5, 1.5), (0.5, 1.5)]])
+        inner = Polygon([(0.5, 0.5), (1.5, 0.5), (1.5, 1.5), (0.5, 1.5)])
+        topology = Topology({'outer': [({'n': 'o'}, outer)], 'inner': [({'n': 'i'}, inner)]})
+        topo = topology.to_dict()
+
+        assert len(topology.arcs) == 2
+        assert abs(decode(topo, 'outer')[0].area - 3.0) < 1e-4
+        assert abs(decode(topo, 'inner')[0].area - 1.0) < 1e-4
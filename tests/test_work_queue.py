@@ -0,0 +1,142 @@
+"""Tests for the shared-filesystem work queue."""
+import os
+import threading
+import time
+
+import work_queue
+from work_queue import claim, enqueue, release, status, work
+
+
+def tasks(n):
+    return [{'id': f"api-leeds-2024-{i:02d}", 'kind': "api", 'region': "leeds", 'month': f"2024-{i:02d}"}
+            for i in range(1, n + 1)]
+
+
+class TestWorkQueue:
+    """Verify lock-file claims, stale-claim recovery and retries."""
+
+    def test_each_task_runs_once_across_workers(self, tmp_path):
+        """Concurrent workers split the queue without running any task twice."""
+        queue_dir = str(tmp_path)
+        assert enqueue(tasks(12), queue_dir) == 12
+        assert enqueue(tasks(12), queue_dir) == 0
+
+        runs = []
+        lock = threading.Lock()
+
+        def runner(task, _):
+            time.sleep(0.01)
+            with lock:
+                runs.append(task['id'])
+
+        workers = [threading.Thread(target=work, args=(queue_dir, runner, f"w{i}"), kwargs={'poll': 0.01})
+                   for i in range(4)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+        assert sorted(runs) == [t['id'] for t in tasks(12)]
+        assert status(queue_dir) == {'pending': 0, 'claimed': 0, 'done': 12, 'failed': 0}
+
+    def test_stale_claim_is_broken(self, tmp_path):
+        """A claim without a recent heartbeat is taken over; a live one is not."""
+        queue_dir = str(tmp_path)
+        assert claim(queue_dir, "t1", "dead")
+        assert not claim(queue_dir, "t1", "other", lease=60)
+
+        lock_path = os.path.join(queue_dir, "claims", "t1.lock")
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+        assert claim(queue_dir, "t1", "other", lease=60)
+        assert not claim(queue_dir, "t1", "third", lease=60)
+
+    def test_claim_broken_by_another_worker_is_kept(self, tmp_path, monkeypatch):
+        """A worker that loses the race to break a stale claim leaves the winner's claim in place."""
+        queue_dir = str(tmp_path)
+        assert claim(queue_dir, "t1", "dead")
+        lock_path = os.path.join(queue_dir, "claims", "t1.lock")
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+
+        lock_state = work_queue._lock_state
+        raced = []
+
+        def racing(path):
+            seen = lock_state(path)
+            if not raced:
+                # Another worker breaks the same stale claim and takes the task first
+                raced.append(path)
+                os.remove(lock_path)
+                assert claim(queue_dir, "t1", "fast", lease=60)
+            return seen
+
+        monkeypatch.setattr(work_queue, "_lock_state", racing)
+        assert not claim(queue_dir, "t1", "slow", lease=60)
+        assert work_queue._read_json(lock_path)['worker'] == "fast"
+        assert os.listdir(os.path.dirname(lock_path)) == ["t1.lock"]
+
+        release(queue_dir, "t1", "slow")
+        assert os.path.exists(lock_path)
+        release(queue_dir, "t1", "fast")
+        assert not os.path.exists(lock_path)
+
+    def test_failed_tasks_retry_then_stop(self, tmp_path, monkeypatch):
+        """A failing task is retried until MAX_ATTEMPTS and then left as failed."""
+        monkeypatch.setattr(work_queue, "MAX_ATTEMPTS", 2)
+        queue_dir = str(tmp_path)
+        enqueue(tasks(2), queue_dir)
+        calls = []
+
+        def runner(task, _):
+            calls.append(task['id'])
+            if task['id'].endswith("01"):
+                raise RuntimeError("boom")
+
+        assert work(queue_dir, runner, "w", poll=0.01) == 1
+        assert calls.count("api-leeds-2024-01") == 2
+        assert status(queue_dir) == {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 1}
+
+    def test_empty_api_month_fails_but_missing_archive_is_done(self, tmp_path, monkeypatch):
+        """An API month that yields nothing is retried; a month absent from the archive is not."""
+        import fetch_data
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(fetch_data, "fetch_month", lambda month, points=None: None)
+        queue_dir = str(tmp_path / "queue")
+        enqueue(tasks(1) + [{'id': "archive-leeds-2019-01", 'kind': "archive", 'region': "leeds",
+                             'month': "2019-01"}], queue_dir)
+
+        assert work(queue_dir, worker="w", poll=0.01) == 1
+        assert work_queue.attempts(queue_dir, "api-leeds-2024-01") == work_queue.MAX_ATTEMPTS
+        assert "No API records" in work_queue._read_json(
+            os.path.join(queue_dir, "failed", "api-leeds-2024-01.json"))['error']
+        assert work_queue._read_json(os.path.join(queue_dir, "done", "archive-leeds-2019-01.json"))['partition'] is None
+
+    def test_reduce_builds_outcomes_from_archive_tasks(self, tmp_path, monkeypatch):
+        """Archive tasks extract each month's outcomes too, and reduce combines them for join_outcomes."""
+        import pandas as pd
+
+        import main
+        from regions import data_file, get_region
+
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(work_queue, "_geocode_partition", lambda path, shard_path: 0)
+        monkeypatch.setattr(main, "run_pipeline", lambda **kwargs: True)
+        leeds = get_region("leeds")
+        for month in ("2019-01", "2019-02"):
+            os.makedirs(os.path.join("data/archive", month))
+            for dataset, column in (("street", 'Crime type'), ("outcomes", 'Outcome type')):
+                pd.DataFrame({'Crime ID': ["a", "b"], 'Month': month, 'LSOA name': ["Leeds 001A", "Bradford 001A"],
+                              column: "x"}).to_csv(
+                    os.path.join("data/archive", month, f"{month}-{leeds['force']}-{dataset}.csv"), index=False)
+
+        queue_dir = str(tmp_path / "queue")
+        enqueue(work_queue.plan_tasks([leeds], ("2019-01", "2019-02"), ("2019-03", "2019-02")), queue_dir)
+        assert work(queue_dir, worker="w", poll=0.01) == 2
+        assert work_queue.reduce([leeds], queue_dir)
+
+        outcomes = pd.read_csv(data_file(leeds, "outcomes_combined.csv"))
+        assert outcomes['Month'].tolist() == ["2019-01", "2019-02"]
+        assert outcomes['Outcome type'].tolist() == ["x", "x"]
+        assert len(pd.read_csv(data_file(leeds, "street_archive.csv"))) == 2